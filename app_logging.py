@@ -0,0 +1,110 @@
+"""
+Application Logging
+
+Leveled, structured logging for the app, replacing ad-hoc print() calls.
+Request threads only put records on an in-memory queue (QueueHandler); a
+single QueueListener thread formats and writes them, so a slow stdout never
+blocks a request.
+
+Hot-path diagnostics are logged at DEBUG, which is off by default. Call
+sites guard loops with `logger.isEnabledFor(logging.DEBUG)` and pass
+arguments %-style, so a disabled record costs one level check. DEBUG and
+INFO records can also be sampled, keeping a fraction of them under load;
+WARNING and above are always kept.
+
+Configuration (environment variables):
+    LOG_LEVEL         DEBUG | INFO (default) | WARNING | ERROR
+    LOG_FORMAT        'text' (default) | 'json' (one JSON object per line, with any `extra` fields)
+    LOG_SAMPLE_RATE   fraction of DEBUG/INFO records kept, 0..1 (default: 1)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').strip().upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').strip().lower()
+try:
+    LOG_SAMPLE_RATE = min(1.0, max(0.0, float(os.getenv('LOG_SAMPLE_RATE', '1'))))
+except Exception:
+    LOG_SAMPLE_RATE = 1.0
+
+ROOT_LOGGER = 'aiweb'
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, plus `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a random `rate` fraction of records below WARNING."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging():
+    """Attach the queue handler and start the writer thread (once per process)."""
+    global _listener
+    if _listener is not None:
+        return
+    with _configure_lock:
+        if _listener is not None:
+            return
+        stream_handler = logging.StreamHandler(sys.stdout)
+        if LOG_FORMAT == 'json':
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(name)s] %(message)s'))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        if LOG_SAMPLE_RATE < 1.0:
+            queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.addHandler(queue_handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+        _listener.start()
+        # Flush queued records on exit
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for one module (a child of the app's root logger)."""
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
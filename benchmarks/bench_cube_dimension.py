@@ -0,0 +1,77 @@
+"""
+calculate_cube_dimension benchmark.
+
+Checks the closed-form solver against the original nested np.arange scan
+over a sweep of volumes (results must be identical), then compares
+per-call and batched throughput.
+
+Usage:
+    python benchmarks/bench_cube_dimension.py [--volumes 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import calculate_cube_dimension, max_size, min_size  # noqa: E402
+
+
+def legacy_calculate_cube_dimension(volume):
+    """The grid scan as it was before the closed-form solver."""
+    min_volume = min_size[0] * min_size[1] * min_size[2]
+    max_volume = max_size[0] * max_size[1] * max_size[2]
+    if volume < min_volume: return min_size[0] * 10.0, min_size[1] * 10.0, min_size[2] * 10.0
+    if volume > max_volume: return max_size[0] * 10.0, max_size[1] * 10.0, max_size[2] * 10.0
+    for x in np.arange(min_size[0], max_size[0] + 0.1, 0.1):
+        for y in np.arange(min_size[1], max_size[1] + 0.1, 0.1):
+            z = volume / (x * y)
+            if min_size[2] <= z <= max_size[2]:
+                return x * 10.0, y * 10.0, z * 10.0
+    return 0, 0, 0
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--volumes', type=int, default=2000)
+    args = parser.parse_args()
+
+    max_volume = max_size[0] * max_size[1] * max_size[2]
+    rng = np.random.default_rng(0)
+    volumes = np.concatenate([
+        np.linspace(0, max_volume * 1.05, args.volumes),
+        rng.uniform(0, max_volume, args.volumes),
+        [min_size[0] * min_size[1] * min_size[2], max_volume, 228.8, 0.0],
+    ])
+
+    legacy, legacy_time = timed(lambda: [legacy_calculate_cube_dimension(v) for v in volumes])
+    scalar, scalar_time = timed(lambda: [calculate_cube_dimension(v) for v in volumes])
+    batch, batch_time = timed(calculate_cube_dimension, volumes)
+
+    mismatches = sum(
+        1 for old, new in zip(legacy, scalar)
+        if not np.array_equal(np.asarray(old, dtype=np.float64), np.asarray(new, dtype=np.float64))
+    )
+    batch_rows = np.stack(batch, axis=1)
+    mismatches += int(np.sum(~np.all(batch_rows == np.asarray(legacy, dtype=np.float64), axis=1)))
+
+    n = len(volumes)
+    print(f"volumes checked: {n}, mismatches vs legacy: {mismatches}")
+    print(f"{'legacy grid scan':<24} {n / legacy_time:>12,.0f} calls/sec")
+    print(f"{'closed form (scalar)':<24} {n / scalar_time:>12,.0f} calls/sec")
+    print(f"{'closed form (batch)':<24} {n / batch_time:>12,.0f} volumes/sec")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Food parser throughput benchmark.
+
+Compares the original per-call-regex parser with food_parser.parse_item
+(cold and memoized) and measures whole-meal splitting.
+
+Usage:
+    python benchmarks/bench_food_parser.py [--iterations 20000]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from food_parser import WORD_NUMBER_MAP, parse_item, parse_meal  # noqa: E402
+
+INPUTS = [
+    "100g chicken breast", "1 medium apple", "two eggs", "2 eggs", "1 cup rice",
+    "1 1/2 cups oats", "½ cup milk", "3 oz salmon", "a banana", "250 ml orange juice",
+    "2 tbsp peanut butter", "1 large egg", "200 g greek yogurt", "half avocado",
+    "1/2 cup milk", "3/4 lb beef", "100g", ".5 cup rice", "half a cup of milk",
+]
+MEALS = [
+    "2 eggs, a banana and 100g rice",
+    "1 cup oatmeal; 1 medium apple & 2 tbsp peanut butter",
+    "200g chicken breast + 1 1/2 cups brown rice and a large orange",
+    "coffee with half and half",
+    "toast and a cup of coffee",
+]
+
+
+def legacy_parse_food_input(food_input):
+    """The parser as it was before food_parser.py (regexes compiled per call)."""
+    cleaned = food_input.strip()
+    match = re.match(r'^(\d+(?:\.\d+)?)\s*([a-zA-Z]+)?\s+(.+)$', cleaned)
+    if match:
+        quantity = float(match.group(1))
+        raw_unit = (match.group(2) or '').lower()
+        food_name = match.group(3).strip()
+        if raw_unit:
+            unit = raw_unit
+        else:
+            countable_keywords = ['egg', 'eggs', 'apple', 'apples', 'banana', 'bananas', 'orange', 'oranges']
+            unit = 'unit' if any(k in food_name.lower() for k in countable_keywords) else 'g'
+        return food_name, quantity, unit
+    word_match = re.match(r'^(?P<num_word>[a-zA-Z]+)\s+(?P<food>.+)$', cleaned.lower())
+    if word_match:
+        num_word = word_match.group('num_word')
+        food_name = word_match.group('food').strip()
+        if num_word in WORD_NUMBER_MAP:
+            return food_name, float(WORD_NUMBER_MAP[num_word]), 'unit'
+    return cleaned, 1.0, 'unit'
+
+
+def bench(name, fn, inputs, iterations, clear=None):
+    start = time.perf_counter()
+    count = 0
+    while count < iterations:
+        if clear is not None:
+            clear()
+        for text in inputs:
+            fn(text)
+        count += len(inputs)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {count / elapsed:>12,.0f} parses/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    bench('legacy parse_food_input', legacy_parse_food_input, INPUTS, args.iterations)
+    bench('parse_item (cold)', parse_item, INPUTS, args.iterations, clear=parse_item.cache_clear)
+    bench('parse_item (memoized)', parse_item, INPUTS, args.iterations)
+
+    def cold_meals():
+        parse_meal.cache_clear()
+        parse_item.cache_clear()
+
+    bench('parse_meal (cold)', parse_meal, MEALS, args.iterations, clear=cold_meals)
+    bench('parse_meal (memoized)', parse_meal, MEALS, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+"""
+Benchmark suite with baseline regression checks.
+
+Runs the hot paths against fixed workloads and reports ops/sec and p50/p99
+latency per benchmark:
+
+- recommend():            diet (0-3) x preference (0/1) x person x meal, with
+                          and without the recommendation cache
+- calculate_cube_dimension: volume sweep over the whole range, per call and batched
+- mesh_generation:        new STL blocks written to a local mesh store
+- mesh_stl_bytes:         STL regeneration as served by /download-stl
+- parse_food_input / parse_meal: the parser inputs of bench_food_parser.py
+                          plus the foodseg sample items, from a cold cache
+- get_food_nutrition:     recorded USDA documents (fixtures/usda_foods.json)
+                          replayed instead of the data.gov API, cold
+                          (extraction) and warm (macro table hit)
+
+Meal workloads come from the foodseg samples in static/foodseg. Nothing
+touches the network, GCS or the shared caches: the run uses an in-memory
+food cache and a temporary mesh directory.
+
+Each benchmark runs one untimed warm-up round, then timed rounds until
+--min-time has been spent in the measured calls. Every call is timed on
+its own, so sub-microsecond calls include a little timer overhead. The
+suite runs --repeats times and every figure reported is the median over
+the repeats.
+
+Baselines are machine specific, so none is shipped with the repo: record
+one with --save-baseline on the machine (or CI runner class) that runs the
+comparison, e.g. on the target branch before testing a change. With --check
+the run exits with status 1 when a benchmark's median ops/sec drops or its
+median p99 rises past the allowed change, and with status 2 when the
+baseline is missing or was recorded in a different environment (Python,
+numpy, platform, CPU) - a gate that cannot compare must not pass.
+
+The allowed change is calibrated per benchmark: at least --tolerance
+(--p99-tolerance for p99), widened to NOISE_FACTOR times the spread seen
+between repeats of the baseline or of this run, whichever is larger.
+Benchmarks dominated by allocation and file I/O (mesh_generation,
+mesh_stl_bytes) have too noisy a tail for a p99 gate and are only checked
+on ops/sec.
+
+Usage:
+    python benchmarks/run_benchmarks.py                                        # run and print results
+    python benchmarks/run_benchmarks.py --baseline base.json --save-baseline   # record a baseline
+    python benchmarks/run_benchmarks.py --baseline base.json --check           # fail on regressions
+    python benchmarks/run_benchmarks.py --only recommend --min-time 2 --repeats 3
+"""
+
+import argparse
+import atexit
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+FIXTURES_PATH = os.path.join(BENCH_DIR, 'fixtures', 'usda_foods.json')
+FOODSEG_DIR = os.path.join(REPO_DIR, 'static', 'foodseg')
+
+# Allowed change is at least this many times the relative spread (max - min
+# over median) between repeats of the same benchmark
+NOISE_FACTOR = 2.0
+
+# Allowed p99 increase per benchmark where it differs from --p99-tolerance;
+# None disables the p99 check (the tail of mesh writes follows the allocator
+# and the filesystem more than the code)
+P99_TOLERANCES = {
+    'mesh_generation': None,
+    'mesh_stl_bytes': None,
+}
+
+# Isolate the run before the app is imported: in-memory food cache, no local
+# USDA index, meshes and manifest in a scratch directory
+_SCRATCH = tempfile.mkdtemp(prefix='aiweb-bench-')
+atexit.register(shutil.rmtree, _SCRATCH, ignore_errors=True)
+os.environ['FOOD_CACHE_BACKEND'] = 'memory'
+os.environ['USDA_INDEX_PATH'] = os.path.join(_SCRATCH, 'no_usda_index.sqlite3')
+os.environ['MESH_MODE'] = 'all'
+os.environ['MESH_STORAGE'] = 'local'
+os.environ['MESH_LOCAL_DIR'] = _SCRATCH
+os.environ['MESH_MANIFEST_PATH'] = os.path.join(_SCRATCH, 'meshes_manifest.sqlite3')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np  # noqa: E402
+
+import main  # noqa: E402
+from bench_food_parser import INPUTS, MEALS  # noqa: E402
+from food_macros import MacroTable  # noqa: E402
+from food_parser import parse_item, parse_meal  # noqa: E402
+from ingredient_catalogue import get_ingredient_catalogue  # noqa: E402
+
+# (gender, age, height cm, weight kg, activity level)
+PERSONS = [
+    (0, 30, 178, 75, 1),
+    (1, 45, 162, 60, 2),
+]
+
+
+class FixtureClient:
+    """Answers `/food/{fdcId}` requests from recorded USDA documents instead of data.gov."""
+
+    def __init__(self, foods):
+        self.foods = {str(food['fdcId']): food for food in foods}
+        self.requests = 0
+
+    def make_request(self, endpoint, **kwargs):
+        self.requests += 1
+        return self.foods.get(endpoint.rstrip('/').rsplit('/', 1)[-1])
+
+    def get_foods(self, endpoint, fdc_ids, **kwargs):
+        self.requests += 1
+        return {str(i): self.foods[str(i)] for i in fdc_ids if str(i) in self.foods}
+
+
+def load_fixtures():
+    with open(FIXTURES_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_foodseg_meals():
+    """Nutrition totals and items of every foodseg sample."""
+    meals = []
+    for path in sorted(glob.glob(os.path.join(FOODSEG_DIR, '*', '*_nutrition.json'))):
+        with open(path, encoding='utf-8') as f:
+            meals.append(json.load(f))
+    return meals
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list."""
+    index = min(len(sorted_values) - 1, max(0, int(np.ceil(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure(fn, items, min_time, min_rounds, setup=None):
+    """
+    Call fn(item) for every item, round after round, and summarize per-call latency.
+
+    Args:
+        fn: Function under test
+        items: Workload; one call per item and round
+        min_time: Seconds of measured calls to collect
+        min_rounds: Timed rounds to run at least
+        setup: Called before every round, untimed (e.g. to clear caches)
+
+    Returns:
+        {'ops', 'ops_per_sec', 'p50_us', 'p99_us'}
+    """
+    clock = time.perf_counter_ns
+    if setup is not None:
+        setup()
+    for item in items:
+        fn(item)
+
+    latencies = []
+    total = 0
+    rounds = 0
+    while rounds < min_rounds or total < min_time * 1e9:
+        if setup is not None:
+            setup()
+        for item in items:
+            start = clock()
+            fn(item)
+            latencies.append(clock() - start)
+        total = sum(latencies)
+        rounds += 1
+
+    latencies.sort()
+    return {
+        'ops': len(latencies),
+        'ops_per_sec': round(len(latencies) / (total / 1e9), 1),
+        'p50_us': round(percentile(latencies, 50) / 1000.0, 2),
+        'p99_us': round(percentile(latencies, 99) / 1000.0, 2),
+    }
+
+
+def median_result(runs):
+    """Per-field median of several measure() results of one benchmark, with the spread between them."""
+    def spread(values):
+        median = float(np.median(values))
+        return round((max(values) - min(values)) / median, 3) if median else 0.0
+
+    ops_per_sec = [run['ops_per_sec'] for run in runs]
+    p99 = [run['p99_us'] for run in runs]
+    return {
+        'ops': int(sum(run['ops'] for run in runs)),
+        'ops_per_sec': round(float(np.median(ops_per_sec)), 1),
+        'p50_us': round(float(np.median([run['p50_us'] for run in runs])), 2),
+        'p99_us': round(float(np.median(p99)), 2),
+        'ops_per_sec_spread': spread(ops_per_sec),
+        'p99_spread': spread(p99),
+    }
+
+
+def build_benchmarks():
+    """[(name, fn, items, setup), ...] in run order."""
+    fixtures = load_fixtures()
+    main.data_gov_client = FixtureClient(fixtures['foods'])
+    meals = load_foodseg_meals()
+    benchmarks = []
+
+    # recommend(): every diet x preference for each person and meal (plus an empty day)
+    intakes = [(0.0, 0.0, 0.0)] + [(meal['carbs'], meal['protein'], meal['fat']) for meal in meals]
+    cases = [(gender, age, height, weight, carbs, protein, fat, activity, diet, preference)
+             for gender, age, height, weight, activity in PERSONS
+             for carbs, protein, fat in intakes
+             for diet in range(4)
+             for preference in (0, 1)]
+    recommendation_cache = main._recommendation_cache
+
+    def without_recommendation_cache():
+        main._recommendation_cache = None
+
+    def with_recommendation_cache():
+        main._recommendation_cache = recommendation_cache
+
+    benchmarks.append(('recommend', lambda case: main.recommend(*case), cases, without_recommendation_cache))
+    if recommendation_cache is not None:
+        benchmarks.append(('recommend_cached', lambda case: main.recommend(*case), cases, with_recommendation_cache))
+
+    # calculate_cube_dimension: below, across and above the placeable volume range
+    volumes = np.concatenate([
+        np.linspace(0, main.MAX_VOLUME * 1.05, 500),
+        np.random.default_rng(0).uniform(main.MIN_VOLUME, main.MAX_VOLUME, 500),
+    ])
+    benchmarks.append(('cube_dimension', main.calculate_cube_dimension, volumes.tolist(), None))
+    benchmarks.append(('cube_dimension_batch_1000', main.calculate_cube_dimension, [volumes], None))
+
+    # Mesh generation: distinct blocks of catalogue ingredients, generated and stored anew every round
+    catalogue = get_ingredient_catalogue()
+    rng = np.random.default_rng(1)
+    specs = []
+    for i in range(200):
+        k = int(rng.integers(len(catalogue.names)))
+        density = float(catalogue.density[k])
+        weight = float(rng.uniform(main.MIN_VOLUME, main.MAX_VOLUME) * density)
+        specs.append((f"bench_{i}_{catalogue.names[k]}.stl", round(weight, 2), density))
+
+    def reset_meshes():
+        uploader = main.get_mesh_uploader()
+        while uploader.stats()['pending']:
+            time.sleep(0.01)
+        main._mesh_state.clear()
+        for path in glob.glob(os.path.join(_SCRATCH, 'bench_*.stl')):
+            os.remove(path)
+
+    benchmarks.append(('mesh_generation', lambda spec: main.mesh_generation(*spec), specs, reset_meshes))
+    benchmarks.append(('mesh_stl_bytes', lambda spec: main.mesh_stl_bytes(*spec), specs, None))
+
+    # Parsing: bench_food_parser inputs plus the foodseg items as the vision pipeline reports them
+    texts = list(INPUTS) + [f"{item['weight_g']:.0f}g {item['food_name']}"
+                            for meal in meals for item in meal['food_items']]
+    meal_texts = list(MEALS) + [', '.join(f"{item['weight_g']:.0f}g {item['food_name']}" for item in meal['food_items'])
+                                for meal in meals]
+
+    def cold_parser():
+        parse_meal.cache_clear()
+        parse_item.cache_clear()
+
+    benchmarks.append(('parse_food_input', main.parse_food_input, texts, cold_parser))
+    benchmarks.append(('parse_meal', parse_meal, meal_texts, cold_parser))
+
+    # get_food_nutrition over the parsed workload, resolved to fixture documents
+    queries = fixtures['queries']
+    lookups = []
+    for text in texts:
+        food_name, quantity, unit = main.parse_food_input(text)
+        fdc_id = queries.get(food_name.lower())
+        if fdc_id is not None:
+            lookups.append((fdc_id, quantity, unit))
+
+    def cold_nutrition():
+        main._macro_table = MacroTable(capacity=1024)
+        main._nutrition_cache.backend.clear()
+
+    benchmarks.append(('get_food_nutrition_cold', lambda lookup: main.get_food_nutrition(*lookup), lookups,
+                       cold_nutrition))
+    benchmarks.append(('get_food_nutrition_warm', lambda lookup: main.get_food_nutrition(*lookup), lookups, None))
+    return benchmarks
+
+
+def compare(results, baseline, tolerance, p99_tolerance):
+    """Regression messages for results that fell outside the noise-calibrated tolerances of the baseline."""
+    def calibrated(field, minimum):
+        return max(minimum, NOISE_FACTOR * max(base.get(field, 0.0), result.get(field, 0.0)))
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        allowed = min(0.95, calibrated('ops_per_sec_spread', tolerance))
+        if result['ops_per_sec'] < base['ops_per_sec'] * (1 - allowed):
+            regressions.append(f"{name}: {result['ops_per_sec']:,.1f} ops/sec, baseline {base['ops_per_sec']:,.1f} "
+                               f"(-{1 - result['ops_per_sec'] / base['ops_per_sec']:.0%}, allowed -{allowed:.0%})")
+        allowed = P99_TOLERANCES.get(name, p99_tolerance)
+        if allowed is not None:
+            allowed = calibrated('p99_spread', allowed)
+        if allowed is not None and result['p99_us'] > base['p99_us'] * (1 + allowed):
+            regressions.append(f"{name}: p99 {result['p99_us']:,.2f} us, baseline {base['p99_us']:,.2f} us "
+                               f"(+{result['p99_us'] / base['p99_us'] - 1:.0%}, allowed +{allowed:.0%})")
+    return regressions
+
+
+def print_table(results, baseline):
+    print(f"{'benchmark':<28} {'ops':>8} {'ops/sec':>14} {'p50 (us)':>12} {'p99 (us)':>12} {'vs baseline':>12}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = f"{result['ops_per_sec'] / base['ops_per_sec'] - 1:+.1%}" if base else '-'
+        print(f"{name:<28} {result['ops']:>8} {result['ops_per_sec']:>14,.1f} {result['p50_us']:>12,.2f} "
+              f"{result['p99_us']:>12,.2f} {change:>12}")
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--baseline', help='baseline file to compare against / write (machine specific)')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with status 1 on regressions, 2 if the baseline is missing or from another '
+                             'environment')
+    parser.add_argument('--only', action='append', default=[], help='run benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=1.0, help='seconds of measured calls per benchmark')
+    parser.add_argument('--min-rounds', type=int, default=3, help='timed rounds per benchmark at least')
+    parser.add_argument('--repeats', type=int, default=5, help='suite runs; medians over them are reported')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='allowed ops/sec drop at least (fraction; widened by the measured noise)')
+    parser.add_argument('--p99-tolerance', type=float, default=0.5,
+                        help='allowed p99 increase at least (fraction; widened by the measured noise)')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+    if (args.check or args.save_baseline) and not args.baseline:
+        parser.error('--check and --save-baseline need --baseline')
+
+    benchmarks = [benchmark for benchmark in build_benchmarks()
+                  if not args.only or any(pattern in benchmark[0] for pattern in args.only)]
+    # Whole-suite passes rather than back-to-back repeats, so slow drift
+    # (thermal, other load) spreads over every benchmark alike
+    runs = {name: [] for name, _, _, _ in benchmarks}
+    for _ in range(max(1, args.repeats)):
+        for name, fn, items, setup in benchmarks:
+            runs[name].append(measure(fn, items, args.min_time, args.min_rounds, setup))
+    results = {name: median_result(name_runs) for name, name_runs in runs.items()}
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'environment': environment(),
+              'repeats': max(1, args.repeats), 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    baseline = {}
+    mismatched = []
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            saved = json.load(f)
+        baseline = saved.get('results', {})
+        saved_environment = saved.get('environment', {})
+        mismatched = [key for key, value in report['environment'].items() if saved_environment.get(key) != value]
+        if not args.save_baseline and mismatched:
+            print(("error" if args.check else "warning") + ": baseline was recorded in a different environment ("
+                  + ', '.join(f"{key}: {saved_environment.get(key)!r} != {report['environment'][key]!r}"
+                              for key in mismatched)
+                  + "); timings are not comparable", file=sys.stderr)
+
+    print_table(results, {} if args.save_baseline else baseline)
+
+    if args.save_baseline:
+        # Keep baseline entries of benchmarks left out with --only (when from this environment)
+        report['results'] = dict({} if mismatched else baseline, **results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not args.check:
+        return 0
+    if not baseline:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return 2
+    if mismatched:
+        print(f"\nCannot check against {args.baseline}: it is from another environment; "
+              f"record one here with --save-baseline")
+        return 2
+    regressions = compare(results, baseline, args.tolerance, args.p99_tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
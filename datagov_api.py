@@ -8,13 +8,451 @@ API Key can be obtained from: https://api.data.gov/
 """
 
 import requests
+import asyncio
 import os
-from typing import Dict, Any, Optional
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Callable, Iterable, Optional, Tuple
+from requests.adapters import HTTPAdapter
+
+from app_logging import get_logger
+from metrics import stage_timer
+
+try:
+    import httpx  # optional: enables HTTP/2 and native async requests
+except ImportError:
+    httpx = None
+
+logger = get_logger('datagov')
 
 # Data.gov API Configuration
 DATA_GOV_API_KEY = os.getenv('DATA_GOV_API_KEY', 'DEMO_KEY')  # Get from environment or use DEMO_KEY
 DATA_GOV_BASE_URL = "https://api.data.gov"
 
+# FoodData Central accepts at most 20 FDC IDs per multi-food request
+FDC_MAX_IDS_PER_REQUEST = 20
+
+
+def _env_number(name: str, default, cast=float):
+    try:
+        return cast(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+# Rate-limit governor: hourly quota assumed until the API reports one (DEMO_KEY allows 30/hour)
+DATA_GOV_RATE_LIMIT = _env_number('DATA_GOV_RATE_LIMIT', 30 if DATA_GOV_API_KEY == 'DEMO_KEY' else 1000, int)
+# Fraction of the quota kept for user-facing requests; low-priority traffic is shed below it
+DATA_GOV_LOW_PRIORITY_RESERVE = _env_number('DATA_GOV_LOW_PRIORITY_RESERVE', 0.2)
+# Retries for 429/5xx/timeouts with jittered exponential backoff (seconds)
+DATA_GOV_MAX_RETRIES = _env_number('DATA_GOV_MAX_RETRIES', 2, int)
+DATA_GOV_BACKOFF_BASE = _env_number('DATA_GOV_BACKOFF_BASE', 0.5)
+DATA_GOV_BACKOFF_MAX = _env_number('DATA_GOV_BACKOFF_MAX', 10.0)
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+# HTTP transport: connection pool sizing, separate connect/read timeouts (seconds) and optional HTTP/2
+DATA_GOV_POOL_CONNECTIONS = _env_number('DATA_GOV_POOL_CONNECTIONS', 4, int)   # distinct hosts kept pooled
+DATA_GOV_POOL_MAXSIZE = _env_number('DATA_GOV_POOL_MAXSIZE', 16, int)          # keep-alive connections per host
+DATA_GOV_CONNECT_TIMEOUT = _env_number('DATA_GOV_CONNECT_TIMEOUT', 3.05)
+DATA_GOV_READ_TIMEOUT = _env_number('DATA_GOV_READ_TIMEOUT', 10.0)
+DATA_GOV_HTTP2 = os.getenv('DATA_GOV_HTTP2', '0') not in ['0', 'false', 'False', '']
+
+
+class RequestsTransport:
+    """
+    Default HTTP transport: a requests.Session with a sized urllib3 pool.
+    
+    The pool blocks when all `pool_maxsize` connections to a host are busy
+    instead of opening throw-away connections, so keep-alive reuse stays high
+    under concurrency.
+    """
+    
+    def __init__(
+        self,
+        pool_connections: int = DATA_GOV_POOL_CONNECTIONS,
+        pool_maxsize: int = DATA_GOV_POOL_MAXSIZE,
+        connect_timeout: float = DATA_GOV_CONNECT_TIMEOUT,
+        read_timeout: float = DATA_GOV_READ_TIMEOUT
+    ):
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   max_retries=0, pool_block=True)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.timeout = (connect_timeout, read_timeout)
+    
+    def request(self, method: str, url: str, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Keep-alive reuse metrics summed over all host pools."""
+        new_connections = requests_sent = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            new_connections += pool.num_connections
+            requests_sent += pool.num_requests
+        return {
+            'transport': 'requests',
+            'http_version': 'HTTP/1.1',
+            'requests': requests_sent,
+            'new_connections': new_connections,
+            'reused_connections': max(0, requests_sent - new_connections),
+        }
+    
+    def close(self):
+        self.session.close()
+
+
+class HTTPXTransport:
+    """
+    Optional httpx-based transport with HTTP/2 (requires `pip install httpx[http2]`).
+    
+    One multiplexed HTTP/2 connection per host avoids head-of-line blocking
+    on the pool. httpx errors are re-raised as the equivalent requests
+    exceptions so the client's error handling is transport-agnostic.
+    """
+    
+    def __init__(
+        self,
+        pool_maxsize: int = DATA_GOV_POOL_MAXSIZE,
+        connect_timeout: float = DATA_GOV_CONNECT_TIMEOUT,
+        read_timeout: float = DATA_GOV_READ_TIMEOUT,
+        http2: bool = True
+    ):
+        self.limits = httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.http2 = http2
+        self.client = httpx.Client(http2=http2, limits=self.limits, timeout=self.timeout)
+        # event loop -> (AsyncClient, lifetime guard). Entries are removed explicitly: by the
+        # guard when its loop shuts down, by aclose(), or when a closed loop is found
+        self._async_clients: Dict[asyncio.AbstractEventLoop, Tuple[Any, Any]] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def _record(self, response):
+        with self._lock:
+            self._counts[response.http_version] = self._counts.get(response.http_version, 0) + 1
+    
+    @staticmethod
+    def _translate(e: Exception) -> Exception:
+        if isinstance(e, httpx.TimeoutException):
+            return requests.exceptions.Timeout(str(e))
+        if isinstance(e, httpx.TransportError):
+            return requests.exceptions.ConnectionError(str(e))
+        return e
+    
+    def request(self, method: str, url: str, **kwargs):
+        kwargs.pop('timeout', None)
+        try:
+            response = self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            raise self._translate(e) from e
+        self._record(response)
+        return response
+    
+    async def _close_with_loop(self, loop, client):
+        """
+        Async generator that closes `client` when the event loop shuts down.
+        
+        The loop finalizes live async generators in shutdown_asyncgens(), which
+        asyncio.run() calls before closing the loop.
+        """
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._async_clients.pop(loop, None)
+            await client.aclose()
+    
+    async def _async_client(self):
+        """The AsyncClient of the running event loop, created on first use."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._async_clients.get(loop)
+            if entry is None:
+                # Loops closed without shutdown_asyncgens() never ran their guard
+                for closed in [other for other in self._async_clients if other.is_closed()]:
+                    del self._async_clients[closed]
+        if entry is not None:
+            return entry[0]
+        client = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout)
+        guard = self._close_with_loop(loop, client)
+        await guard.__anext__()
+        with self._lock:
+            self._async_clients[loop] = (client, guard)
+        return client
+    
+    async def request_async(self, method: str, url: str, **kwargs):
+        """Native async request on an AsyncClient bound to the running event loop."""
+        kwargs.pop('timeout', None)
+        client = await self._async_client()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            raise self._translate(e) from e
+        self._record(response)
+        return response
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            'transport': 'httpx',
+            'http_version': 'HTTP/2' if self.http2 else 'HTTP/1.1',
+            'requests': sum(counts.values()),
+            'responses_by_http_version': counts,
+        }
+    
+    def close(self):
+        self.client.close()
+    
+    async def aclose(self):
+        """Close the running event loop's AsyncClient (a later request opens a new one)."""
+        with self._lock:
+            entry = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[1].aclose()
+
+
+def create_transport():
+    """Build the transport selected by DATA_GOV_HTTP2 (falls back to requests without httpx)."""
+    if DATA_GOV_HTTP2:
+        if httpx is not None:
+            try:
+                return HTTPXTransport()
+            except Exception as e:
+                logger.warning("HTTP/2 transport unavailable (%s); using requests.", e)
+        else:
+            logger.warning("DATA_GOV_HTTP2 is set but httpx is not installed; using requests.")
+    return RequestsTransport()
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one execution.
+    
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for it and receive the same result (or exception).
+    """
+    
+    class _Call:
+        __slots__ = ('event', 'result', 'error', 'waiters')
+        
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+            self.waiters = 0
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, 'SingleFlight._Call'] = {}
+        self.coalesced = 0
+    
+    def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        """
+        Run `fn` unless an identical call is already in flight, then share its result.
+        
+        Args:
+            key: Hashable identity of the call
+            fn: Zero-argument function performing the call
+        
+        Returns:
+            The result of the (possibly shared) call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = SingleFlight._Call()
+                leader = True
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+    
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class RateLimitGovernor:
+    """
+    Process-wide token bucket mirroring the data.gov hourly quota.
+    
+    The bucket refills continuously at `limit / 3600` tokens per second and is
+    re-synchronised from the X-RateLimit-Limit / X-RateLimit-Remaining headers
+    of every response. A 429 empties it until the Retry-After time.
+    
+    Priorities:
+    - 'high' (user-facing): may wait briefly for a token
+    - 'low' (prefetch): shed immediately when the bucket is below the reserve
+    """
+    
+    def __init__(
+        self,
+        limit: int = DATA_GOV_RATE_LIMIT,
+        low_priority_reserve: float = DATA_GOV_LOW_PRIORITY_RESERVE,
+        max_wait: float = 2.0,
+        window: float = 3600.0
+    ):
+        self.limit = max(1, limit)
+        self.window = window
+        self.low_priority_reserve = low_priority_reserve
+        self.max_wait = max_wait
+        self.tokens = float(self.limit)
+        self.remaining = None
+        self.blocked_until = 0.0
+        self.shed = 0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now: float):
+        rate = self.limit / self.window
+        self.tokens = min(float(self.limit), self.tokens + (now - self._updated) * rate)
+        self._updated = now
+    
+    def _try_acquire(self, priority: str) -> float:
+        """Take a token if available. Returns 0 on success, else the seconds until one could be."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            floor = self.low_priority_reserve * self.limit if priority == 'low' else 0
+            if self.tokens >= 1 + floor:
+                self.tokens -= 1
+                return 0.0
+            return (1 + floor - self.tokens) * self.window / self.limit
+    
+    def _reject(self, priority: str) -> bool:
+        with self._lock:
+            if priority == 'low':
+                self.shed += 1
+            else:
+                self.throttled += 1
+        return False
+    
+    def acquire(self, priority: str = 'high') -> bool:
+        """
+        Take one token for an upstream request.
+        
+        Returns:
+            True if the request may proceed, False if it should be dropped
+        """
+        deadline = time.monotonic() + (self.max_wait if priority != 'low' else 0)
+        while True:
+            wait = self._try_acquire(priority)
+            if wait == 0:
+                return True
+            if priority == 'low' or time.monotonic() + wait > deadline:
+                return self._reject(priority)
+            time.sleep(wait)
+    
+    async def acquire_async(self, priority: str = 'high') -> bool:
+        """Async variant of acquire that waits without blocking the event loop."""
+        deadline = time.monotonic() + (self.max_wait if priority != 'low' else 0)
+        while True:
+            wait = self._try_acquire(priority)
+            if wait == 0:
+                return True
+            if priority == 'low' or time.monotonic() + wait > deadline:
+                return self._reject(priority)
+            await asyncio.sleep(wait)
+    
+    def update(self, limit: Optional[str], remaining: Optional[str]):
+        """Synchronise with the quota reported by the API."""
+        try:
+            limit_val = int(limit) if limit else None
+            remaining_val = int(remaining) if remaining else None
+        except ValueError:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            if limit_val:
+                self.limit = limit_val
+            if remaining_val is not None:
+                self.remaining = remaining_val
+                self.tokens = float(min(remaining_val, self.limit))
+    
+    def on_rate_limited(self, retry_after: Optional[float]):
+        """Empty the bucket after a 429 and block until Retry-After (if given)."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.remaining = 0
+            if retry_after is not None:
+                # The server says when to try again: block until then, then allow one probe
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+                self.tokens = 1.0
+            else:
+                self.tokens = 0.0
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'limit': self.limit,
+                'remaining': self.remaining,
+                'tokens': round(self.tokens, 2),
+                'blocked_for': max(0.0, round(self.blocked_until - time.monotonic(), 2)),
+                'shed': self.shed,
+                'throttled': self.throttled,
+            }
+
+
+_governors: Dict[str, RateLimitGovernor] = {}
+_governors_lock = threading.Lock()
+
+
+def get_rate_limit_governor(api_key: str) -> RateLimitGovernor:
+    """Return the process-wide governor for an API key (quotas are per key)."""
+    with _governors_lock:
+        if api_key not in _governors:
+            _governors[api_key] = RateLimitGovernor()
+        return _governors[api_key]
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
 class DataGovAPIClient:
     """
     Client for interacting with data.gov APIs.
@@ -25,16 +463,25 @@ class DataGovAPIClient:
     3. HTTP Basic Auth: key@domain.com
     """
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, transport=None):
         """
         Initialize the Data.gov API client.
         
         Args:
             api_key: Your data.gov API key. If None, uses DATA_GOV_API_KEY env variable or DEMO_KEY
+            transport: HTTP transport (RequestsTransport, HTTPXTransport or compatible).
+                Defaults to the one selected by DATA_GOV_HTTP2.
         """
         self.api_key = api_key or DATA_GOV_API_KEY
         self.base_url = DATA_GOV_BASE_URL
-        self.session = requests.Session()
+        self.transport = transport or create_transport()
+        self.session = getattr(self.transport, 'session', None)
+        # Threads are started on the first prefetch
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix='datagov-prefetch')
+        self._async_in_flight: Dict[Any, Any] = {}
+        self._single_flight = SingleFlight()
+        self.governor = get_rate_limit_governor(self.api_key)
+        self.max_retries = DATA_GOV_MAX_RETRIES
         
     def _get_headers(self) -> Dict[str, str]:
         """Get headers with API key included (preferred method)."""
@@ -54,74 +501,274 @@ class DataGovAPIClient:
         endpoint: str,
         method: str = 'GET',
         use_query_param: bool = False,
+        coalesce: Optional[bool] = None,
+        priority: str = 'high',
         **kwargs
     ) -> Optional[Dict[str, Any]]:
         """
         Make a request to a data.gov API endpoint.
         
+        Concurrent identical requests (same priority, method, URL, params and
+        JSON body) are coalesced: only one goes upstream and every caller gets
+        its result.
+        
+        Requests pass through the process-wide rate-limit governor. Rate-limited
+        (429), 5xx and timed-out requests are retried with jittered exponential
+        backoff, honouring Retry-After.
+        
         Args:
             endpoint: The full URL or relative path to the API endpoint
             method: HTTP method (GET, POST, PUT, DELETE)
             use_query_param: If True, pass API key as query parameter instead of header
+            coalesce: Share in-flight identical requests. Defaults to True for GET
+                and for POST requests with a JSON body (e.g. multi-food lookups)
+            priority: 'high' for user-facing requests, 'low' for background work
+                (prefetch) that is shed instead of retried when quota runs low
             **kwargs: Additional request parameters (params, json, data, etc.)
         
         Returns:
             JSON response as dictionary, or None if request failed
         """
+        if coalesce is None:
+            coalesce = method.upper() == 'GET' or (method.upper() == 'POST' and 'json' in kwargs)
+        key = self._request_key(endpoint, method, use_query_param, priority, kwargs) if coalesce else None
+        if key is None:
+            return self._send(endpoint, method, use_query_param, priority, **kwargs)
+        return self._single_flight.do(
+            key, lambda: self._send(endpoint, method, use_query_param, priority, **kwargs)
+        )
+    
+    async def make_request_async(
+        self,
+        endpoint: str,
+        method: str = 'GET',
+        use_query_param: bool = False,
+        coalesce: Optional[bool] = None,
+        priority: str = 'high',
+        **kwargs
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Async variant of make_request for use in an asyncio server.
+        
+        With the httpx transport requests are issued natively on the event
+        loop; otherwise the blocking request runs in a worker thread. Identical
+        concurrent requests on the same loop are coalesced.
+        
+        Args:
+            Same as make_request
+        
+        Returns:
+            JSON response as dictionary, or None if request failed
+        """
+        if not hasattr(self.transport, 'request_async'):
+            return await asyncio.to_thread(
+                self.make_request, endpoint, method, use_query_param, coalesce, priority, **kwargs
+            )
+        
+        if coalesce is None:
+            coalesce = method.upper() == 'GET' or (method.upper() == 'POST' and 'json' in kwargs)
+        key = self._request_key(endpoint, method, use_query_param, priority, kwargs) if coalesce else None
+        if key is None:
+            return await self._send_async(endpoint, method, use_query_param, priority, **kwargs)
+        
+        key = (id(asyncio.get_running_loop()),) + key
+        task = self._async_in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._send_async(endpoint, method, use_query_param, priority, **kwargs))
+            self._async_in_flight[key] = task
+            task.add_done_callback(lambda _: self._async_in_flight.pop(key, None))
+        else:
+            self._single_flight.coalesced += 1
+        return await asyncio.shield(task)
+    
+    def close(self):
+        """Stop the prefetch threads (queued prefetches still run) and close the transport."""
+        self._background.shutdown(wait=True)
+        self.transport.close()
+    
+    async def aclose(self):
+        """Close the async HTTP client of the running event loop, if the transport keeps one."""
+        if hasattr(self.transport, 'aclose'):
+            await self.transport.aclose()
+    
+    @staticmethod
+    def _request_key(endpoint: str, method: str, use_query_param: bool, priority: str,
+                     kwargs: Dict[str, Any]) -> Optional[Tuple]:
+        """
+        Identity of a request for coalescing, or None if it cannot be computed.
+        
+        The priority is part of the key: a low-priority flight can be shed by the
+        governor, so high-priority callers must never wait on one.
+        """
+        try:
+            return (
+                priority,
+                method.upper(),
+                endpoint,
+                use_query_param,
+                json.dumps(kwargs.get('params'), sort_keys=True, default=str),
+                json.dumps(kwargs.get('json'), sort_keys=True, default=str),
+            )
+        except Exception:
+            return None
+    
+    def _prepare(self, endpoint: str, use_query_param: bool, kwargs: Dict[str, Any]) -> str:
+        """Resolve the URL and attach authentication to the request kwargs."""
+        # Construct full URL if relative path provided
+        url = endpoint if endpoint.startswith('http') else f"{self.base_url}{endpoint}"
+        
+        # Set authentication method
+        if use_query_param:
+            # Add API key as query parameter
+            params = self._get_params(**kwargs.get('params', {}))
+            kwargs['params'] = params
+        else:
+            # Use X-Api-Key header (preferred)
+            headers = kwargs.get('headers', {})
+            headers.update(self._get_headers())
+            kwargs['headers'] = headers
+        return url
+    
+    def _handle_response(self, response) -> Tuple[bool, Optional[Dict[str, Any]], Optional[float]]:
+        """
+        Interpret a response.
+        
+        Returns:
+            (done, result, retry_after): done=False means the request may be retried
+        """
+        # Check for rate limit headers
+        rate_limit = response.headers.get('X-RateLimit-Limit')
+        rate_remaining = response.headers.get('X-RateLimit-Remaining')
+        
+        if rate_limit and rate_remaining:
+            logger.debug("Rate limit: %s/%s requests remaining", rate_remaining, rate_limit)
+            self.governor.update(rate_limit, rate_remaining)
+        
+        # Handle errors
+        if response.status_code == 429:
+            logger.warning("Rate limit exceeded. Please wait before making more requests.")
+            retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+            self.governor.on_rate_limited(retry_after)
+            return False, None, retry_after
+        elif response.status_code in RETRYABLE_STATUS:
+            logger.warning("Upstream error %s.", response.status_code)
+            return False, None, _parse_retry_after(response.headers.get('Retry-After'))
+        elif response.status_code == 403:
+            logger.error("API key invalid, disabled, or unauthorized.")
+            return True, None, None
+        elif response.status_code == 400:
+            logger.error("Invalid request or HTTPS required.")
+            return True, None, None
+        elif response.status_code == 404:
+            logger.error("API endpoint not found.")
+            return True, None, None
+        
         try:
-            # Construct full URL if relative path provided
-            url = endpoint if endpoint.startswith('http') else f"{self.base_url}{endpoint}"
+            response.raise_for_status()
+            return True, response.json(), None
+        except Exception as e:
+            logger.error("HTTP Error %s: %s: %s", response.status_code, type(e).__name__, e)
+            return True, None, None
+    
+    @staticmethod
+    def _is_retryable_error(e: Exception) -> bool:
+        """Report a transport exception; True if the request may be retried."""
+        if isinstance(e, requests.exceptions.Timeout):
+            logger.warning("Request timeout. Please try again.")
+            return True
+        if isinstance(e, requests.exceptions.ConnectionError):
+            logger.warning("Connection failed. Check your internet connection.")
+            return True
+        logger.error("%s: %s", type(e).__name__, e)
+        return False
+    
+    def _send(
+        self,
+        endpoint: str,
+        method: str = 'GET',
+        use_query_param: bool = False,
+        priority: str = 'high',
+        **kwargs
+    ) -> Optional[Dict[str, Any]]:
+        """Perform one upstream request with governor and retries (see make_request)."""
+        url = self._prepare(endpoint, use_query_param, kwargs)
+        
+        # Background traffic never retries: it is cheaper to drop it
+        attempts = 1 if priority == 'low' else self.max_retries + 1
+        for attempt in range(attempts):
+            if not self.governor.acquire(priority):
+                logger.warning("Rate-limit governor dropped %s-priority request to %s", priority, url)
+                return None
             
-            # Set authentication method
-            if use_query_param:
-                # Add API key as query parameter
-                params = self._get_params(**kwargs.get('params', {}))
-                kwargs['params'] = params
+            retry_after = None
+            try:
+                with stage_timer('upstream_request'):
+                    response = self.transport.request(method, url, **kwargs)
+            except Exception as e:
+                if not self._is_retryable_error(e):
+                    return None
             else:
-                # Use X-Api-Key header (preferred)
-                headers = kwargs.get('headers', {})
-                headers.update(self._get_headers())
-                kwargs['headers'] = headers
-            
-            # Make the request
-            response = self.session.request(method, url, timeout=10, **kwargs)
+                done, result, retry_after = self._handle_response(response)
+                if done:
+                    return result
             
-            # Check for rate limit headers
-            rate_limit = response.headers.get('X-RateLimit-Limit')
-            rate_remaining = response.headers.get('X-RateLimit-Remaining')
-            
-            if rate_limit and rate_remaining:
-                print(f"Rate Limit: {rate_remaining}/{rate_limit} requests remaining")
-            
-            # Handle errors
-            if response.status_code == 429:
-                print("ERROR: Rate limit exceeded. Please wait before making more requests.")
-                return None
-            elif response.status_code == 403:
-                print("ERROR: API key invalid, disabled, or unauthorized.")
-                return None
-            elif response.status_code == 400:
-                print("ERROR: Invalid request or HTTPS required.")
-                return None
-            elif response.status_code == 404:
-                print("ERROR: API endpoint not found.")
+            delay = self._retry_delay(attempt, attempts, retry_after)
+            if delay is None:
+                break
+            time.sleep(delay)
+        return None
+    
+    async def _send_async(
+        self,
+        endpoint: str,
+        method: str = 'GET',
+        use_query_param: bool = False,
+        priority: str = 'high',
+        **kwargs
+    ) -> Optional[Dict[str, Any]]:
+        """Async counterpart of _send using the transport's request_async."""
+        url = self._prepare(endpoint, use_query_param, kwargs)
+        
+        attempts = 1 if priority == 'low' else self.max_retries + 1
+        for attempt in range(attempts):
+            if not await self.governor.acquire_async(priority):
+                logger.warning("Rate-limit governor dropped %s-priority request to %s", priority, url)
                 return None
             
-            response.raise_for_status()
-            return response.json()
+            retry_after = None
+            try:
+                with stage_timer('upstream_request'):
+                    response = await self.transport.request_async(method, url, **kwargs)
+            except Exception as e:
+                if not self._is_retryable_error(e):
+                    return None
+            else:
+                done, result, retry_after = self._handle_response(response)
+                if done:
+                    return result
             
-        except requests.exceptions.Timeout:
-            print("ERROR: Request timeout. Please try again.")
-            return None
-        except requests.exceptions.ConnectionError:
-            print("ERROR: Connection failed. Check your internet connection.")
-            return None
-        except requests.exceptions.HTTPError as e:
-            print(f"ERROR: HTTP Error {response.status_code}: {e}")
+            delay = self._retry_delay(attempt, attempts, retry_after)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+        return None
+    
+    def _retry_delay(self, attempt: int, attempts: int, retry_after: Optional[float]) -> Optional[float]:
+        """Delay before the next attempt, or None if no attempt should follow."""
+        if attempt + 1 >= attempts:
             return None
-        except Exception as e:
-            print(f"ERROR: {type(e).__name__}: {e}")
+        delay = self._backoff_delay(attempt, retry_after)
+        if delay is None:
+            logger.error("Retry-After (%.0fs) exceeds the retry budget; giving up.", retry_after)
             return None
+        logger.info("Retrying in %.2fs (attempt %d/%d)", delay, attempt + 2, attempts)
+        return delay
+    
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """Full-jitter exponential backoff; Retry-After wins when given. None = do not retry."""
+        if retry_after is not None:
+            return retry_after if retry_after <= DATA_GOV_BACKOFF_MAX else None
+        return random.uniform(0, min(DATA_GOV_BACKOFF_MAX, DATA_GOV_BACKOFF_BASE * (2 ** attempt)))
     
     def search_food_nutrition(
         self,
@@ -150,6 +797,85 @@ class DataGovAPIClient:
         
         return self.make_request(endpoint, params=params)
     
+    def get_foods(
+        self,
+        endpoint: str,
+        fdc_ids: Iterable[Any],
+        batch_size: int = FDC_MAX_IDS_PER_REQUEST,
+        priority: str = 'high',
+        **payload
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch details for many foods using the multi-ID `POST /foods` endpoint.
+        
+        IDs are de-duplicated and grouped into as few requests as the API allows.
+        
+        Args:
+            endpoint: Full URL of the FoodData Central `foods` endpoint
+            fdc_ids: FDC IDs to fetch
+            batch_size: Maximum IDs per request (FDC allows 20)
+            priority: Governor priority ('high' or 'low')
+            **payload: Extra JSON body fields (e.g. format='abridged', nutrients=[...])
+        
+        Returns:
+            Dictionary mapping str(fdcId) to the food document. IDs that failed
+            or were not found are missing from the result.
+        """
+        ids = list(dict.fromkeys(str(i) for i in fdc_ids if i is not None))
+        results = {}
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            body = {'fdcIds': [int(i) if i.isdigit() else i for i in chunk]}
+            body.update(payload)
+            response = self.make_request(endpoint, method='POST', priority=priority, json=body)
+            for food in response or []:
+                if isinstance(food, dict) and food.get('fdcId') is not None:
+                    results[str(food['fdcId'])] = food
+        return results
+    
+    def prefetch_foods(
+        self,
+        endpoint: str,
+        fdc_ids: Iterable[Any],
+        callback: Callable[[Dict[str, Dict[str, Any]]], None],
+        **payload
+    ) -> Optional[Future]:
+        """
+        Fetch food details in the background and hand them to `callback`.
+        
+        Intended for warming caches with the top-N search hits so that a later
+        detail lookup is served locally. Runs at low priority, so it is dropped
+        rather than retried when the remaining quota is low.
+        
+        Args:
+            endpoint: Full URL of the FoodData Central `foods` endpoint
+            fdc_ids: FDC IDs to fetch
+            callback: Called with the `get_foods` result on the background thread
+            **payload: Extra JSON body fields
+        
+        Returns:
+            Future of the background task, or None if there was nothing to fetch
+        """
+        ids = [i for i in fdc_ids if i is not None]
+        if not ids:
+            return None
+        def task():
+            try:
+                callback(self.get_foods(endpoint, ids, priority='low', **payload))
+            except Exception as e:
+                logger.error("Prefetch failed: %s: %s", type(e).__name__, e)
+        
+        return self._background.submit(task)
+    
+    def connection_stats(self) -> Dict[str, Any]:
+        """
+        HTTP connection metrics: requests sent, new vs. reused keep-alive
+        connections (requests transport) and HTTP versions (httpx transport).
+        """
+        stats = self.transport.stats() if hasattr(self.transport, 'stats') else {}
+        stats['coalesced'] = self._single_flight.coalesced
+        return stats
+    
     def test_connection(self) -> bool:
         """
         Test the API connection with a simple request.
@@ -0,0 +1,488 @@
+"""
+Food Data Cache Module
+
+Pluggable cache layer for USDA FoodData Central responses (search results and
+food details). Entries carry a per-entry TTL and the cache is bounded by a
+byte budget with least-recently-used eviction.
+
+Expired entries are kept for an extra `stale_ttl` grace period so callers can
+serve them immediately (stale-while-revalidate) while FoodCache.revalidate
+refreshes them in the background, e.g. when the upstream API is rate limited.
+
+Backends:
+1. MemoryCacheBackend: in-process LRU (lost on restart, private to one worker)
+2. SQLiteCacheBackend: on-disk SQLite file in WAL mode, shared by every
+   gunicorn worker on the host and kept across restarts/deploys
+
+Configuration (environment variables):
+    FOOD_CACHE_BACKEND     'sqlite' (default) | 'memory'
+    FOOD_CACHE_PATH        SQLite file path (default: <tempdir>/food_cache.sqlite3)
+    FOOD_CACHE_MAX_BYTES   byte budget shared by all namespaces (default: 64 MB)
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app_logging import get_logger
+
+logger = get_logger('food_cache')
+
+FOOD_CACHE_BACKEND = os.getenv('FOOD_CACHE_BACKEND', 'sqlite').strip().lower()
+FOOD_CACHE_PATH = os.getenv('FOOD_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'food_cache.sqlite3'))
+try:
+    FOOD_CACHE_MAX_BYTES = max(1024, int(os.getenv('FOOD_CACHE_MAX_BYTES', str(64 * 1024 * 1024))))
+except Exception:
+    FOOD_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'))
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU cache bounded by total serialized size in bytes.
+
+    Values are kept as Python objects; their size is estimated from the
+    compact JSON encoding so the budget matches the SQLite backend.
+    """
+
+    def __init__(self, max_bytes: int = FOOD_CACHE_MAX_BYTES, max_entries: Optional[int] = None):
+        """
+        Args:
+            max_bytes: Total size budget for all entries
+            max_entries: Optional cap on the number of entries
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, size, expires_at, stale_until)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        if entry is None or entry[1]:
+            return None
+        return entry[0]
+
+    def get_entry(self, key: str, with_expiry: bool = False) -> Optional[Tuple]:
+        """
+        Return (value, is_stale), or None if missing or past its stale grace period.
+
+        With `with_expiry`, return (value, is_stale, expires_at) instead.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at, stale_until = entry
+            if stale_until is not None and stale_until <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            stale = expires_at is not None and expires_at <= now
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return (value, stale, expires_at) if with_expiry else (value, stale)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None,
+            stale_ttl: float = 0):
+        if size is None:
+            size = len(_encode(value))
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + ttl if ttl else None
+        stale_until = expires_at + stale_ttl if expires_at is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at, stale_until)
+            self._bytes += size
+            while self._entries and (
+                self._bytes > self.max_bytes
+                or (self.max_entries is not None and len(self._entries) > self.max_entries)
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        size = self._entries.pop(key)[1]
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'memory',
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class SQLiteCacheBackend:
+    """
+    SQLite-backed LRU cache shared by all processes on the host.
+
+    The database runs in WAL mode so readers never block the single writer.
+    Each thread gets its own connection. Recency is tracked in an indexed
+    `accessed_at` column and refreshed at most every `touch_interval` seconds
+    per entry, so hot keys do not turn every cache hit into a write.
+
+    Writes stay cheap as the cache fills: triggers keep the total entry size
+    in a `cache_meta` row, so the budget check reads one row, and the sweep
+    of expired entries (indexed on `stale_until`) runs at most every
+    `purge_interval` seconds per process. Expired entries found by a read are
+    deleted right away.
+    """
+
+    def __init__(self, path: str = FOOD_CACHE_PATH, max_bytes: int = FOOD_CACHE_MAX_BYTES,
+                 touch_interval: float = 30.0, purge_interval: float = 60.0):
+        """
+        Args:
+            path: SQLite database file
+            max_bytes: Total size budget for all entries
+            touch_interval: Minimum seconds between LRU timestamp updates for one entry
+            purge_interval: Minimum seconds between sweeps of expired entries
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._local = threading.local()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL,"
+                " stale_until REAL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+            if 'stale_until' not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN stale_until REAL")
+                conn.execute("UPDATE cache SET stale_until = expires_at")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_stale_until ON cache (stale_until)")
+            # Running total of entry sizes, kept by triggers so every process sees the same figure
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_meta (name, value) "
+                "SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM cache"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache BEGIN"
+                " UPDATE cache_meta SET value = value + NEW.size WHERE name = 'total_bytes'; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS cache_size_update AFTER UPDATE OF size ON cache BEGIN"
+                " UPDATE cache_meta SET value = value + NEW.size - OLD.size WHERE name = 'total_bytes'; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache BEGIN"
+                " UPDATE cache_meta SET value = value - OLD.size WHERE name = 'total_bytes'; END"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        if entry is None or entry[1]:
+            return None
+        return entry[0]
+
+    def get_entry(self, key: str, with_expiry: bool = False) -> Optional[Tuple]:
+        """
+        Return (value, is_stale), or None if missing or past its stale grace period.
+
+        With `with_expiry`, return (value, is_stale, expires_at) instead.
+        """
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at, stale_until, accessed_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        value, expires_at, stale_until, accessed_at = row
+        if stale_until is not None and stale_until <= now:
+            conn.execute("DELETE FROM cache WHERE key = ? AND stale_until <= ?", (key, now))
+            self.misses += 1
+            return None
+        if now - accessed_at >= self.touch_interval:
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        stale = expires_at is not None and expires_at <= now
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return (json.loads(value), stale, expires_at) if with_expiry else (json.loads(value), stale)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None,
+            stale_ttl: float = 0):
+        encoded = _encode(value)
+        size = len(encoded)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        stale_until = expires_at + stale_ttl if expires_at is not None else None
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # An upsert (not INSERT OR REPLACE) so the size triggers see the replaced row
+            conn.execute(
+                "INSERT INTO cache (key, value, size, expires_at, stale_until, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "expires_at = excluded.expires_at, stale_until = excluded.stale_until, "
+                "accessed_at = excluded.accessed_at",
+                (key, encoded, size, expires_at, stale_until, now),
+            )
+            self._evict(conn, now)
+
+    def _total_bytes(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM cache_meta WHERE name = 'total_bytes'").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop entries past their stale grace period (rate limited), then least-recently-used ones until under budget."""
+        if now - self._last_purge >= self.purge_interval:
+            self._last_purge = now
+            conn.execute("DELETE FROM cache WHERE stale_until <= ?", (now,))
+        total = self._total_bytes(conn)
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM cache ORDER BY accessed_at ASC"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        entries = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        total = self._total_bytes(conn)
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class FoodCache:
+    """
+    Namespaced view over a cache backend with a default TTL.
+
+    Several namespaces (e.g. 'search' and 'food') share one backend and
+    therefore one byte budget.
+    """
+
+    def __init__(self, backend, namespace: str, ttl: Optional[float] = None, stale_ttl: float = 0):
+        """
+        Args:
+            backend: MemoryCacheBackend or SQLiteCacheBackend
+            namespace: Key prefix separating this cache from others on the backend
+            ttl: Default time-to-live in seconds (None = no expiry)
+            stale_ttl: How long expired entries may still be served as stale
+        """
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        # Lookups in this namespace (the backend's counters cover all namespaces)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _key(self, key: Any) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: Any) -> Optional[Any]:
+        entry = self.get_entry(key)
+        if entry is None or entry[1]:
+            return None
+        return entry[0]
+
+    def get_entry(self, key: Any, with_expiry: bool = False) -> Optional[Tuple]:
+        """
+        Return (value, is_stale) including expired entries still within their grace period.
+
+        With `with_expiry`, return (value, is_stale, expires_at) instead.
+        """
+        entry = self.backend.get_entry(self._key(key), with_expiry=with_expiry)
+        with self._refresh_lock:
+            if entry is None:
+                self.misses += 1
+            elif entry[1]:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None, stale_ttl: Optional[float] = None):
+        self.backend.set(
+            self._key(key), value,
+            ttl if ttl is not None else self.ttl,
+            stale_ttl=stale_ttl if stale_ttl is not None else self.stale_ttl,
+        )
+
+    def delete(self, key: Any):
+        self.backend.delete(self._key(key))
+
+    def stats(self) -> Dict[str, Any]:
+        """Lookup counts for this namespace."""
+        with self._refresh_lock:
+            return {'namespace': self.namespace, 'hits': self.hits, 'stale_hits': self.stale_hits,
+                    'misses': self.misses}
+
+    def revalidate(self, key: Any, refresh: Callable[[], Any]) -> bool:
+        """
+        Run `refresh` in the background unless a refresh of this key is already running.
+
+        `refresh` is responsible for storing the new value (it usually is the
+        same function that fills the cache on a miss).
+
+        Returns:
+            True if a refresh was scheduled
+        """
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+
+        def task():
+            try:
+                refresh()
+            except Exception as e:
+                logger.warning("Background refresh of %s failed: %s", self._key(key), e)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        _get_refresh_executor().submit(task)
+        return True
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key) is not None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_refresh_executor = None
+
+
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    global _refresh_executor
+    if _refresh_executor is None:
+        with _backend_lock:
+            if _refresh_executor is None:
+                _refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='food-cache-refresh')
+    return _refresh_executor
+
+
+def get_cache_backend():
+    """
+    Return the process-wide cache backend selected by FOOD_CACHE_BACKEND.
+
+    Falls back to the in-memory backend if the SQLite file cannot be opened
+    (e.g. read-only filesystem).
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if FOOD_CACHE_BACKEND == 'sqlite':
+                    try:
+                        _backend = SQLiteCacheBackend(FOOD_CACHE_PATH, FOOD_CACHE_MAX_BYTES)
+                    except Exception as e:
+                        logger.warning("Failed to open SQLite food cache at %s: %s. Using in-memory cache.", FOOD_CACHE_PATH, e)
+                        _backend = MemoryCacheBackend(FOOD_CACHE_MAX_BYTES)
+                else:
+                    _backend = MemoryCacheBackend(FOOD_CACHE_MAX_BYTES)
+    return _backend
+
+
+def get_food_cache(namespace: str, ttl: Optional[float] = None, stale_ttl: float = 0) -> FoodCache:
+    """
+    Factory function to get a namespaced food cache on the shared backend.
+
+    Args:
+        namespace: Cache namespace (e.g. 'search', 'food')
+        ttl: Default time-to-live in seconds for entries in this namespace
+        stale_ttl: Grace period during which expired entries are served as stale
+
+    Returns:
+        FoodCache instance
+    """
+    return FoodCache(get_cache_backend(), namespace, ttl, stale_ttl)
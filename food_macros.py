@@ -0,0 +1,179 @@
+"""
+Compact Food Macro Table
+
+Macro extraction (carbs/protein/fat per serving) runs once per FDC ID. The
+results are kept in a fixed-size NumPy structured array indexed by FDC ID
+instead of the full USDA JSON document, which is ~100x larger.
+
+The persistent food cache stores the same compact record (see
+FoodMacros.to_list) so cache reads skip the extraction as well. Per-food
+portion weights (grams per 'medium', 'cup', ...) from USDA `foodPortions`
+travel with the record for unit conversion.
+
+Table rows carry the expiry of the cache entry they were read from, so the
+table never serves a food past its TTL: an expired row is a miss and the
+caller goes back to the shared cache, which knows about stale-while-
+revalidate.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from unit_conversion import extract_portion_weights
+
+MACRO_DTYPE = np.dtype([
+    ('fdc_id', np.int64),
+    ('carbs', np.float64),
+    ('protein', np.float64),
+    ('fat', np.float64),
+    ('serving_size', np.float64),
+    ('expires_at', np.float64),
+])
+
+
+class FoodMacros:
+    """
+    Per-serving macros of one FDC food. `portions` maps canonical units to
+    grams; `stale` marks values served past their cache TTL.
+    """
+
+    __slots__ = ('fdc_id', 'description', 'carbs', 'protein', 'fat', 'serving_size', 'portions', 'stale')
+
+    def __init__(self, fdc_id, description: str, carbs: float, protein: float, fat: float,
+                 serving_size: float = 100, portions: Optional[Dict[str, float]] = None):
+        self.fdc_id = fdc_id
+        self.description = description
+        self.carbs = carbs
+        self.protein = protein
+        self.fat = fat
+        self.serving_size = serving_size
+        self.portions = portions or {}
+        self.stale = False
+
+    def to_list(self) -> List[Any]:
+        """Compact JSON-serializable form for the persistent cache."""
+        return [self.description, self.carbs, self.protein, self.fat, self.serving_size, self.portions]
+
+    @classmethod
+    def from_list(cls, fdc_id, values: List[Any]) -> 'FoodMacros':
+        # Records cached before portion weights were added have 5 fields
+        return cls(fdc_id, *values)
+
+    def __repr__(self) -> str:
+        return (f"FoodMacros({self.fdc_id}, {self.description!r}, carbs={self.carbs}, "
+                f"protein={self.protein}, fat={self.fat}, serving_size={self.serving_size})")
+
+
+def extract_macros(fdc_id, food_data: Dict[str, Any]) -> FoodMacros:
+    """
+    Extract carbs/protein/fat and serving size from a USDA food document.
+
+    Matching rules:
+    - carbs: first nutrient whose name contains 'carbohydrate' and
+      'by difference' or 'total'
+    - protein: first nutrient whose name contains 'protein'
+    - fat: first nutrient whose name contains 'fat'/'lipid' and 'total'
+    - serving size: `servingSize` when given in grams, else 100 g
+    - portions: grams per unit from `foodPortions` (see extract_portion_weights)
+    """
+    carbs = protein = fat = 0
+    for nutrient in food_data.get('foodNutrients', ()):
+        nutrient_name = nutrient.get('nutrient', {}).get('name', '').lower()
+        # Try different value fields based on data type
+        value = nutrient.get('amount') or nutrient.get('value', 0)
+
+        if 'carbohydrate' in nutrient_name:
+            if carbs == 0 and ('by difference' in nutrient_name or 'total' in nutrient_name):
+                carbs = value
+        elif 'protein' in nutrient_name:
+            if protein == 0:
+                protein = value
+        elif 'fat' in nutrient_name or 'lipid' in nutrient_name:
+            if fat == 0 and 'total' in nutrient_name:
+                fat = value
+
+    serving_size = 100  # default assumption
+    if 'servingSizeUnit' in food_data and 'servingSize' in food_data:
+        try:
+            if food_data.get('servingSizeUnit', 'g').lower() == 'g':
+                serving_size = float(food_data['servingSize'])
+        except Exception:
+            serving_size = 100
+
+    return FoodMacros(fdc_id, food_data.get('description', ''), carbs, protein, fat, serving_size,
+                      extract_portion_weights(food_data))
+
+
+class MacroTable:
+    """
+    Fixed-capacity, array-backed table of FoodMacros keyed by FDC ID.
+
+    Rows live in one NumPy structured array; descriptions and portion
+    weights in parallel lists. When full, the oldest row slot is reused (FIFO), so memory is
+    bounded at roughly `capacity * (48 bytes + description)`. Rows past their
+    `expires_at` read as missing.
+    """
+
+    def __init__(self, capacity: int = 50000):
+        self.capacity = capacity
+        self._rows = np.zeros(capacity, dtype=MACRO_DTYPE)
+        self._descriptions: List[str] = [''] * capacity
+        self._portions: List[Dict[str, float]] = [{}] * capacity
+        self._keys: List[Optional[str]] = [None] * capacity
+        self._index: Dict[str, int] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(fdc_id) -> str:
+        return str(fdc_id)
+
+    def get(self, fdc_id) -> Optional[FoodMacros]:
+        # Under the lock: put() may reuse the slot for another food between the reads below
+        with self._lock:
+            slot = self._index.get(self._key(fdc_id))
+            if slot is None:
+                return None
+            carbs, protein, fat, serving_size, expires_at = self._rows[slot][
+                ['carbs', 'protein', 'fat', 'serving_size', 'expires_at']].item()
+            description = self._descriptions[slot]
+            portions = self._portions[slot]
+        if expires_at <= time.time():
+            return None
+        return FoodMacros(fdc_id, description, carbs, protein, fat, serving_size, portions)
+
+    def put(self, macros: FoodMacros, expires_at: Optional[float] = None):
+        """
+        Store macros for their FDC ID.
+
+        Args:
+            macros: Values to store (callers must not store stale values)
+            expires_at: Unix time after which the row reads as missing (None = never)
+        """
+        key = self._key(macros.fdc_id)
+        with self._lock:
+            slot = self._index.get(key)
+            if slot is None:
+                slot = self._next % self.capacity
+                self._next += 1
+                if self._keys[slot] is not None:
+                    self._index.pop(self._keys[slot], None)
+            try:
+                fdc_int = int(macros.fdc_id)
+            except (TypeError, ValueError):
+                fdc_int = -1
+            self._rows[slot] = (fdc_int, macros.carbs, macros.protein, macros.fat, macros.serving_size,
+                                np.inf if expires_at is None else expires_at)
+            self._descriptions[slot] = macros.description
+            self._portions[slot] = macros.portions
+            self._keys[slot] = key
+            self._index[key] = slot
+
+    def __contains__(self, fdc_id) -> bool:
+        return self.get(fdc_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._index)
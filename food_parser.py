@@ -0,0 +1,163 @@
+"""
+Food Input Parser
+
+Turns chat input into structured food items:
+
+    "2 eggs, a banana and 100g rice"
+        -> ParsedFood('2 eggs', 2.0, 'unit', 'eggs')
+           ParsedFood('a banana', 1.0, 'unit', 'banana')
+           ParsedFood('100g rice', 100.0, 'g', 'rice')
+
+Quantities may be integers, decimals (".5"), fractions, mixed numbers ("1 1/2"),
+Unicode fractions ("½", "1½") or number words ("two", "a", "half"). All
+patterns are compiled once at import and results are memoized, since chat
+users repeat the same inputs all day.
+"""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+from unit_conversion import UNIT_ALIASES
+
+WORD_NUMBER_MAP = {
+    'a': 1,
+    'an': 1,
+    'one': 1,
+    'two': 2,
+    'three': 3,
+    'four': 4,
+    'five': 5,
+    'six': 6,
+    'seven': 7,
+    'eight': 8,
+    'nine': 9,
+    'ten': 10,
+    'half': 0.5,
+    'dozen': 12,
+}
+
+UNICODE_FRACTIONS = {
+    '½': 0.5, '⅓': 1 / 3, '⅔': 2 / 3, '¼': 0.25, '¾': 0.75,
+    '⅕': 0.2, '⅛': 0.125, '⅜': 0.375, '⅝': 0.625, '⅞': 0.875,
+}
+
+# Without an explicit unit, these foods are counted rather than weighed
+COUNTABLE_KEYWORDS = ('egg', 'eggs', 'apple', 'apples', 'banana', 'bananas', 'orange', 'oranges')
+
+_FRACTION_CHARS = ''.join(UNICODE_FRACTIONS)
+# A digit run directly followed by '/' is the numerator of a fraction, never the whole part
+_QUANTITY = (
+    r'(?P<whole>(?:\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?|\.\d+)(?![\d.,]|\s*/))?\s*'
+    r'(?:(?P<num>\d+)\s*/\s*(?P<den>\d+)|(?P<ufrac>[' + _FRACTION_CHARS + r']))?'
+)
+_QUANTITY_RE = re.compile(r'^' + _QUANTITY + r'\s*(?P<rest>.+)$')
+_WORD_NUMBER_RE = re.compile(r'^(?P<word>[a-z]+)\s+(?P<rest>.+)$')
+_HALF_ARTICLE_RE = re.compile(r'^an?\s+(?=\S)')
+_UNIT_RE = re.compile(r'^(?P<unit>[a-zA-Z]+)\.?\s+(?:of\s+)?(?P<food>.+)$')
+# Articles and "half" only count as a quantity in front of another word (after 'and': a unit)
+_ARTICLES = ('a', 'an', 'half')
+_COUNT_WORDS = '|'.join(sorted((w for w in WORD_NUMBER_MAP if w not in _ARTICLES), key=len, reverse=True))
+_UNITS = '|'.join(sorted(UNIT_ALIASES, key=len, reverse=True))
+_NEXT_QUANTITY = r'\.?\d|[' + _FRACTION_CHARS + r']|(?:' + _COUNT_WORDS + r')\s+[a-z]'
+# Item separators: newlines, and commas (not thousands separators), semicolons, '&', '+'
+# and 'and' only when a quantity follows ("mac and cheese", "chicken, grilled" and
+# "salt & pepper chicken" stay one item). After 'and', "a"/"an"/"half" must be followed
+# by a unit ("and a cup of tea" splits, "half and half" and "toast and a coffee" do not).
+# static/chatbot.js uses the same rule.
+_SPLIT_RE = re.compile(
+    r'\s*(?:\n'
+    r'|(?:,(?!\d{3}(?!\d))|;|&|\+)\s*(?=' + _NEXT_QUANTITY + r'|(?:a|an|half)\s+(?!and\b)[a-z])'
+    r'|\band\b\s*(?=' + _NEXT_QUANTITY + r'|(?:a|an|half)\s+(?:a\s+)?(?:' + _UNITS + r')\b))\s*',
+    re.IGNORECASE,
+)
+
+
+class ParsedFood(NamedTuple):
+    """One parsed food item: the source text, amount, unit and food name."""
+    text: str
+    quantity: float
+    unit: str
+    food_name: str
+
+
+def _parse_quantity(match) -> Optional[float]:
+    whole, num, den, ufrac = match.group('whole', 'num', 'den', 'ufrac')
+    if whole is None and num is None and ufrac is None:
+        return None
+    quantity = float(whole.replace(',', '')) if whole else 0.0
+    if num is not None:
+        if int(den) == 0:
+            return None
+        if whole and '.' in whole:
+            return None
+        quantity += int(num) / int(den)
+    elif ufrac is not None:
+        quantity += UNICODE_FRACTIONS[ufrac]
+    return quantity
+
+
+def _food_name(text: str) -> str:
+    """The food name, or '' when the text is empty or only a unit ("g", "cups"; "eggs" is a food)."""
+    text = text.strip()
+    word = text.rstrip('.').lower()
+    return '' if word in UNIT_ALIASES and word not in COUNTABLE_KEYWORDS else text
+
+
+def _split_unit(rest: str) -> Tuple[Optional[str], str]:
+    """Split a leading known unit off the food text ("cups of rice" -> ('cups', 'rice'))."""
+    match = _UNIT_RE.match(rest)
+    if match and match.group('unit').lower() in UNIT_ALIASES:
+        return match.group('unit').lower(), _food_name(match.group('food'))
+    return None, _food_name(rest)
+
+
+@lru_cache(maxsize=4096)
+def parse_item(text: str) -> ParsedFood:
+    """
+    Parse one "quantity unit food" phrase (memoized).
+
+    Examples: "100g chicken breast", "1 1/2 cups rice", "½ cup milk",
+    "1 medium apple", "two eggs". A word after the quantity is only taken as
+    the unit when it is a known unit alias; otherwise it is part of the food
+    name ("2 boiled eggs").
+
+    Returns:
+        ParsedFood; input without a quantity counts as 1 unit. food_name is
+        '' when the input names no food ("100g", "2 cups"), and callers
+        reject such items.
+    """
+    cleaned = text.strip()
+
+    # Numeric quantity (e.g., "100g chicken breast", "1 1/2 cups rice")
+    match = _QUANTITY_RE.match(cleaned)
+    quantity = _parse_quantity(match) if match else None
+    if quantity is not None:
+        unit, food_name = _split_unit(match.group('rest'))
+        if unit is None:
+            # No explicit unit: decide between grams vs counted items
+            unit = 'unit' if any(k in food_name.lower() for k in COUNTABLE_KEYWORDS) else 'g'
+        return ParsedFood(cleaned, quantity, unit, food_name)
+
+    # Word-number + food name (e.g., "two eggs", "a banana", "a cup of milk")
+    word_match = _WORD_NUMBER_RE.match(cleaned.lower())
+    if word_match and word_match.group('word') in WORD_NUMBER_MAP:
+        rest = word_match.group('rest')
+        if word_match.group('word') == 'half':
+            rest = _HALF_ARTICLE_RE.sub('', rest)  # "half a cup of milk"
+        unit, food_name = _split_unit(rest)
+        return ParsedFood(cleaned, float(WORD_NUMBER_MAP[word_match.group('word')]), unit or 'unit', food_name)
+
+    # Fallback: treat as a single unit
+    return ParsedFood(cleaned, 1.0, 'unit', _food_name(cleaned))
+
+
+@lru_cache(maxsize=1024)
+def parse_meal(text: str) -> Tuple[ParsedFood, ...]:
+    """
+    Split a whole meal ("2 eggs, a banana and 100g rice") into parsed items (memoized).
+
+    Returns:
+        Tuple of ParsedFood in input order; empty segments are dropped
+    """
+    return tuple(parse_item(part) for part in _SPLIT_RE.split(text) if part and part.strip())
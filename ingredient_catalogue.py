@@ -0,0 +1,80 @@
+"""
+Ingredient Catalogue
+
+Ingredients offered by the recommender are defined in a JSON data file
+(INGREDIENTS_PATH, default ./ingredients.json):
+
+    {"ingredients": [
+        {"name": "Red Lentils",
+         "per_100g": {"carbs": 11.2, "protein": 6.6, "fat": 0.61},
+         "density": 1.182,
+         "excluded_preferences": [0]},
+        ...
+    ]}
+
+`excluded_preferences` lists the diet preferences (0 = meat-based,
+1 = plant-based) the ingredient must not be offered to. The catalogue keeps
+nutrients as one (n_ingredients, 3) matrix so the solver can slice it
+directly.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app_logging import get_logger
+
+logger = get_logger('ingredient_catalogue')
+
+INGREDIENTS_PATH = os.getenv(
+    "INGREDIENTS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingredients.json"),
+)
+
+MACROS = ('carbs', 'protein', 'fat')
+
+
+class IngredientCatalogue:
+    """Matrix-backed list of ingredients: names, nutrients per gram, densities and exclusions."""
+
+    def __init__(self, ingredients: List[Dict[str, Any]]):
+        if not ingredients:
+            raise ValueError("Ingredient catalogue is empty")
+        self.names: List[str] = [item['name'] for item in ingredients]
+        # Each row is [carbohydrates, proteins, fats] per gram
+        self.W = np.array(
+            [[float(item['per_100g'].get(macro, 0)) for macro in MACROS] for item in ingredients]
+        ) * 0.01
+        self.density = np.array([float(item['density']) for item in ingredients])
+        self._excluded = [frozenset(int(p) for p in item.get('excluded_preferences', ())) for item in ingredients]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def allowed(self, preference: int) -> List[int]:
+        """Indices of the ingredients that may be offered for a diet preference."""
+        return [i for i, excluded in enumerate(self._excluded) if preference not in excluded]
+
+    @classmethod
+    def from_file(cls, path: str) -> 'IngredientCatalogue':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['ingredients'] if isinstance(data, dict) else data)
+
+
+_catalogue: Optional[IngredientCatalogue] = None
+_catalogue_lock = threading.Lock()
+
+
+def get_ingredient_catalogue() -> IngredientCatalogue:
+    """Get (or load) the shared ingredient catalogue from INGREDIENTS_PATH."""
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                _catalogue = IngredientCatalogue.from_file(INGREDIENTS_PATH)
+                logger.info("Loaded %d ingredients from %s", len(_catalogue), INGREDIENTS_PATH)
+    return _catalogue
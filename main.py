@@ -1,15 +1,34 @@
-from flask import Flask, render_template, redirect, request, abort, send_file, url_for, jsonify
-from google.cloud import storage
-from google.auth.exceptions import DefaultCredentialsError
+from flask import Flask, Response, g, render_template, redirect, request, abort, send_file, url_for, jsonify
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import wrap_file
+import logging
 import numpy as np
-from scipy.optimize import minimize, NonlinearConstraint, nnls, linprog
-from itertools import combinations
 import os
 import json
+import math
 import io
-import requests
-import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app_logging import get_logger
+from profiling import init_profiling
+from metrics import CONTENT_TYPE, REGISTRY, REQUEST_SECONDS, REQUESTS_IN_FLIGHT, REQUESTS_TOTAL, cache_families, stage_timer
 from datagov_api import get_datagov_client
+from food_cache import MemoryCacheBackend, get_food_cache
+from usda_index import get_local_index
+from food_macros import FoodMacros, MacroTable, extract_macros
+from unit_conversion import convert_quantity_to_grams, convert_many
+from food_parser import parse_item, parse_meal
+from nutrient_solver import search_combinations
+from ingredient_catalogue import get_ingredient_catalogue
+from stl_writer import cube_stl, cube_stl_buffer, cube_stls
+from mesh_tokens import (content_mesh_hash, content_mesh_name, make_mesh_token, parse_mesh_token,
+                         require_mesh_token_secret)
+from mesh_manifest import get_mesh_manifest
+from mesh_storage import (MESH_BUCKET, MESH_DOWNLOAD_CHUNK, MESH_STORAGE, get_mesh_store, get_mesh_uploader,
+                          get_storage_client, open_blob_stream)
+
+# Leveled, queue-backed logger (LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE; see app_logging.py)
+logger = get_logger('main')
 
 # export GOOGLE_APPLICATION_CREDENTIALS="food-ai-455507-e2a9c115814e.json"     
 json_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "food-ai-455507-e2a9c115814e.json"))
@@ -21,58 +40,61 @@ DIAG_MODE = os.getenv("DIAG_MODE", "0") not in ["0", "false", "False", ""]
 
 # Mesh generation mode and solution limits for memory/time-constrained environments (e.g., Render)
 # MESH_MODE: 'all' (default) | 'first' (only first solution) | 'none' (disable STL generation)
+#            | 'lazy' (no generation; responses carry signed mesh tokens and /download-stl builds the STL on request)
 MESH_MODE = os.getenv("MESH_MODE", "all").strip().lower()
+if MESH_MODE == 'lazy':
+    # Tokens must verify on every worker and after restarts
+    require_mesh_token_secret()
 # MAX_SOLUTIONS: cap how many solution options we compute/return
 try:
     MAX_SOLUTIONS = max(1, int(os.getenv("MAX_SOLUTIONS", "2")))
 except Exception:
     MAX_SOLUTIONS = 2
+# INGREDIENTS_PER_SOLUTION: how many catalogue ingredients each recommended combination uses
+try:
+    INGREDIENTS_PER_SOLUTION = max(1, int(os.getenv("INGREDIENTS_PER_SOLUTION", "2")))
+except Exception:
+    INGREDIENTS_PER_SOLUTION = 2
+# RECOMMEND_CACHE_SIZE: how many recommendations to memoize per process (0 disables)
+try:
+    RECOMMEND_CACHE_SIZE = max(0, int(os.getenv("RECOMMEND_CACHE_SIZE", "1024")))
+except Exception:
+    RECOMMEND_CACHE_SIZE = 1024
+# RECOMMEND_CACHE_QUANTUM: grams the nutrient gap is rounded to, so near-identical profiles share an entry
+try:
+    RECOMMEND_CACHE_QUANTUM = max(0.0, float(os.getenv("RECOMMEND_CACHE_QUANTUM", "1")))
+except Exception:
+    RECOMMEND_CACHE_QUANTUM = 1.0
 
-# Mesh storage backend: 'gcs' (default) to upload to Google Cloud Storage, or 'local' to keep files in /tmp and serve directly
-MESH_STORAGE = os.getenv("MESH_STORAGE", "gcs").strip().lower()
+# MESH_CACHE_MAX_AGE: Cache-Control max-age (seconds) for token-addressed STL downloads, which never change
+try:
+    MESH_CACHE_MAX_AGE = max(0, int(os.getenv("MESH_CACHE_MAX_AGE", str(365 * 24 * 3600))))
+except Exception:
+    MESH_CACHE_MAX_AGE = 365 * 24 * 3600
 
-def _manifest_path():
-    import tempfile
-    return os.path.join(tempfile.gettempdir(), "meshes_manifest.json")
+# Mesh storage backend (MESH_STORAGE): 'gcs' (default) to upload to Google Cloud Storage, or 'local' to keep files in
+# /tmp and serve directly. Meshes are written in the background by a bounded upload pool (see mesh_storage.py).
+_mesh_store = get_mesh_store()
+_mesh_uploader = get_mesh_uploader()
 
-def _load_manifest():
-    try:
-        path = _manifest_path()
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"[WARN] Failed to load mesh manifest: {e}")
-    return {}
+# MESH_EXISTS_CACHE_SIZE / MESH_EXISTS_CACHE_TTL: mesh names remembered as already recorded/stored, and for how long
+# (seconds) before storage is checked again
+try:
+    MESH_EXISTS_CACHE_SIZE = max(1, int(os.getenv("MESH_EXISTS_CACHE_SIZE", "10000")))
+except Exception:
+    MESH_EXISTS_CACHE_SIZE = 10000
+try:
+    MESH_EXISTS_CACHE_TTL = max(1.0, float(os.getenv("MESH_EXISTS_CACHE_TTL", "3600")))
+except Exception:
+    MESH_EXISTS_CACHE_TTL = 3600.0
+
+_mesh_manifest = get_mesh_manifest()
 
-def _save_manifest(manifest):
-    try:
-        path = _manifest_path()
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(manifest, f)
-    except Exception as e:
-        print(f"[WARN] Failed to save mesh manifest: {e}")
- 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = "./static/uploads"
-bucket_name = "food-ai"
-
-def upload_to_gcs(bucket_name, source_file_name, destination_blob_name):
-    try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(source_file_name)
-        # Make the blob publicly readable
-        blob.make_public()
-        return True
-    except DefaultCredentialsError:
-        return False
-    except Exception as e:
-        print(f"Error uploading to GCS: {e}")
-        return False
-
-    # print(f"File {source_file_name} uploaded to {destination_blob_name}.")
+# Opt-in profiling of slow requests (PROFILE_SAMPLE_RATE / PROFILE_TOKEN; see profiling.py)
+init_profiling(app)
+bucket_name = MESH_BUCKET
 
 # USDA FoodData Central API functions using data.gov API client
 # API key is now securely stored in environment variable: DATA_GOV_API_KEY
@@ -80,74 +102,92 @@ def upload_to_gcs(bucket_name, source_file_name, destination_blob_name):
 data_gov_client = get_datagov_client()  # Uses X-Api-Key header authentication
 USDA_API_URL = "https://api.nal.usda.gov/fdc/v1"
 
-# Simple cache to reduce API calls and avoid rate limits
-_search_cache = {}
-_nutrition_cache = {}
-
-WORD_NUMBER_MAP = {
-    'a': 1,
-    'an': 1,
-    'one': 1,
-    'two': 2,
-    'three': 3,
-    'four': 4,
-    'five': 5,
-    'six': 6,
-    'seven': 7,
-    'eight': 8,
-    'nine': 9,
-    'ten': 10,
-    'half': 0.5,
-    'dozen': 12,
-}
+# Shared, bounded cache to reduce API calls and avoid rate limits.
+# Backed by SQLite by default so it survives restarts and is shared by all workers (see food_cache.py).
+# USDA_SEARCH_CACHE_TTL / USDA_FOOD_CACHE_TTL: entry lifetimes in seconds
+try:
+    USDA_SEARCH_CACHE_TTL = float(os.getenv("USDA_SEARCH_CACHE_TTL", str(24 * 3600)))
+except Exception:
+    USDA_SEARCH_CACHE_TTL = 24 * 3600
+try:
+    USDA_FOOD_CACHE_TTL = float(os.getenv("USDA_FOOD_CACHE_TTL", str(30 * 24 * 3600)))
+except Exception:
+    USDA_FOOD_CACHE_TTL = 30 * 24 * 3600
+
+# USDA_STALE_TTL: how long expired entries may still be served (stale-while-revalidate) when refreshes fail
+try:
+    USDA_STALE_TTL = float(os.getenv("USDA_STALE_TTL", str(7 * 24 * 3600)))
+except Exception:
+    USDA_STALE_TTL = 7 * 24 * 3600
+# USDA_NEGATIVE_CACHE_TTL: how long "no foods found" results are cached (stops repeated misspellings hitting the API)
+try:
+    USDA_NEGATIVE_CACHE_TTL = float(os.getenv("USDA_NEGATIVE_CACHE_TTL", "600"))
+except Exception:
+    USDA_NEGATIVE_CACHE_TTL = 600
+
+_search_cache = get_food_cache('search', ttl=USDA_SEARCH_CACHE_TTL, stale_ttl=USDA_STALE_TTL)
+_nutrition_cache = get_food_cache('macros', ttl=USDA_FOOD_CACHE_TTL, stale_ttl=USDA_STALE_TTL)
+# Per-process, array-backed table of extracted macros keyed by FDC ID
+_macro_table = MacroTable()
+
+# Batch food lookups: max items per request and concurrent upstream lookups per worker
+try:
+    MAX_BATCH_ITEMS = max(1, int(os.getenv("MAX_BATCH_ITEMS", "20")))
+except Exception:
+    MAX_BATCH_ITEMS = 20
+try:
+    FOOD_LOOKUP_WORKERS = max(1, int(os.getenv("FOOD_LOOKUP_WORKERS", "6")))
+except Exception:
+    FOOD_LOOKUP_WORKERS = 6
+_lookup_executor = ThreadPoolExecutor(max_workers=FOOD_LOOKUP_WORKERS, thread_name_prefix="food-lookup")
+# USDA_PREFETCH_TOP_N: how many search hits after the first to prefetch in the background (0 disables)
+try:
+    USDA_PREFETCH_TOP_N = max(0, int(os.getenv("USDA_PREFETCH_TOP_N", "3")))
+except Exception:
+    USDA_PREFETCH_TOP_N = 3
 
 def parse_food_input(food_input):
     """
-    Parse user input like "100g chicken breast", "1 medium apple", or "two eggs".
+    Parse user input like "100g chicken breast", "1 1/2 cups rice", or "two eggs".
     Returns: (food_name, quantity, unit)
     """
-    cleaned = food_input.strip()
-
-    # Pattern: number + optional unit + food name (e.g., "100g chicken breast")
-    match = re.match(r'^(\d+(?:\.\d+)?)\s*([a-zA-Z]+)?\s+(.+)$', cleaned)
-    if match:
-        quantity = float(match.group(1))
-        raw_unit = (match.group(2) or '').lower()
-        food_name = match.group(3).strip()
-
-        # If no explicit unit, decide between grams vs counted items
-        if raw_unit:
-            unit = raw_unit
-        else:
-            countable_keywords = ['egg', 'eggs', 'apple', 'apples', 'banana', 'bananas', 'orange', 'oranges']
-            unit = 'unit' if any(k in food_name.lower() for k in countable_keywords) else 'g'
-
-        return food_name, quantity, unit
-
-    # Pattern: word-number + food name (e.g., "two eggs", "a banana")
-    word_match = re.match(r'^(?P<num_word>[a-zA-Z]+)\s+(?P<food>.+)$', cleaned.lower())
-    if word_match:
-        num_word = word_match.group('num_word')
-        food_name = word_match.group('food').strip()
-        if num_word in WORD_NUMBER_MAP:
-            return food_name, float(WORD_NUMBER_MAP[num_word]), 'unit'
-
-    # Fallback: treat as a single unit
-    return cleaned, 1.0, 'unit'
+    with stage_timer('parse_food_input'):
+        item = parse_item(food_input)
+    return item.food_name, item.quantity, item.unit
 
 def search_usda_food(food_name):
     """
     Search for food in USDA FoodData Central using data.gov API client.
     Uses X-Api-Key header authentication (recommended by data.gov).
     Implements caching to reduce API calls and avoid rate limits.
+    Queries the offline USDA index first (if built) and only falls back to the API on a miss.
     """
-    # Check cache first
+    # Check local index first (no network round trip)
+    local_index = get_local_index()
+    if local_index is not None:
+        local_results = local_index.search(food_name, page_size=10)
+        if local_results:
+            logger.debug("Local index: %d results for '%s'", len(local_results['foods']), food_name)
+            return local_results
+
+    # Check cache next; expired entries are served as stale while refreshing in the background
     cache_key = food_name.lower().strip()
-    if cache_key in _search_cache:
-        print(f"[CACHE HIT] Using cached results for '{food_name}'")
-        return _search_cache[cache_key]
-    
+    with stage_timer('cache_lookup'):
+        entry = _search_cache.get_entry(cache_key)
+    if entry is not None:
+        cached, stale = entry
+        if not stale:
+            logger.debug("Cache hit: search results for '%s'", food_name)
+            return cached
+        logger.info("Cache stale: serving search results for '%s' while refreshing", food_name)
+        _search_cache.revalidate(cache_key, lambda: _fetch_usda_search(food_name, cache_key))
+        return dict(cached, stale=True)
+
     # Make API request if not cached
+    return _fetch_usda_search(food_name, cache_key)
+
+def _fetch_usda_search(food_name, cache_key):
+    """Query the USDA search API and cache the response ("no foods found" only briefly)."""
     response = data_gov_client.make_request(
         endpoint=f"{USDA_API_URL}/foods/search",
         params={
@@ -158,11 +198,143 @@ def search_usda_food(food_name):
     
     # Store in cache
     if response:
-        _search_cache[cache_key] = response
-        print(f"[CACHED] Stored results for '{food_name}'")
+        if response.get('foods'):
+            _search_cache.set(cache_key, response)
+            logger.debug("Cached search results for '%s'", food_name)
+        else:
+            _search_cache.set(cache_key, response, ttl=USDA_NEGATIVE_CACHE_TTL, stale_ttl=0)
+            logger.debug("Cached empty search result for '%s' for %.0fs", food_name, USDA_NEGATIVE_CACHE_TTL)
     
     return response
 
+def _store_macros(fdc_id, food_data):
+    """Extract macros from a USDA food document and store them in the table and shared cache."""
+    with stage_timer('nutrient_extraction'):
+        macros = extract_macros(fdc_id, food_data)
+    logger.debug("Extracted FDC ID %s '%s': carbs=%s, protein=%s, fat=%s, serving=%sg",
+                 fdc_id, macros.description, macros.carbs, macros.protein, macros.fat, macros.serving_size)
+    # Taken before the cache write so the table row never outlives the cache entry
+    expires_at = time.time() + USDA_FOOD_CACHE_TTL if USDA_FOOD_CACHE_TTL else None
+    _nutrition_cache.set(fdc_id, macros.to_list())
+    _macro_table.put(macros, expires_at)
+    return macros
+
+def _get_known_macros(fdc_id):
+    """
+    Macros from the in-process table, shared cache or local index; None if an API call is needed.
+    Table rows expire with the shared cache entry they came from; stale values are never put
+    in the table, so every request past the TTL goes through the cache and its revalidation.
+    """
+    macros = _macro_table.get(fdc_id)
+    if macros is not None:
+        return macros
+
+    with stage_timer('cache_lookup'):
+        entry = _nutrition_cache.get_entry(fdc_id, with_expiry=True)
+    if entry is not None:
+        cached, stale, expires_at = entry
+        macros = FoodMacros.from_list(fdc_id, cached)
+        if stale:
+            logger.info("Cache stale: serving nutrition for FDC ID %s while refreshing", fdc_id)
+            _nutrition_cache.revalidate(fdc_id, lambda: _fetch_food_macros(fdc_id))
+        else:
+            logger.debug("Cache hit: nutrition for FDC ID %s", fdc_id)
+            _macro_table.put(macros, expires_at)
+        macros.stale = stale
+        return macros
+
+    local_index = get_local_index()
+    food_data = local_index.get_food(fdc_id) if local_index is not None else None
+    if food_data is not None:
+        logger.debug("Local index: nutrition for FDC ID %s", fdc_id)
+        return _store_macros(fdc_id, food_data)
+    return None
+
+def get_food_macros(fdc_id):
+    """
+    Get per-serving macros for an FDC ID.
+    Extraction runs once per FDC ID: results live in the in-process macro table and
+    the shared cache stores the compact record rather than the full USDA document.
+    Returns FoodMacros or None if the food could not be retrieved.
+    """
+    macros = _get_known_macros(fdc_id)
+    if macros is not None:
+        return macros
+    return _fetch_food_macros(fdc_id)
+
+def _fetch_food_macros(fdc_id):
+    """Fetch one food from the USDA API and store its macros."""
+    food_data = data_gov_client.make_request(
+        endpoint=f"{USDA_API_URL}/food/{fdc_id}"
+    )
+    if not food_data:
+        return None
+    return _store_macros(fdc_id, food_data)
+
+def get_food_macros_many(fdc_ids):
+    """
+    Get macros for several FDC IDs, fetching every unknown ID with as few
+    multi-ID `POST /foods` requests as possible.
+    Returns: dict fdc_id -> FoodMacros (IDs that could not be retrieved are missing)
+    """
+    results = {}
+    pending = []
+    for fdc_id in dict.fromkeys(fdc_ids):
+        macros = _get_known_macros(fdc_id)
+        if macros is not None:
+            results[fdc_id] = macros
+        else:
+            pending.append(fdc_id)
+
+    if pending:
+        foods = data_gov_client.get_foods(f"{USDA_API_URL}/foods", pending)
+        for fdc_id in pending:
+            food_data = foods.get(str(fdc_id))
+            if food_data:
+                results[fdc_id] = _store_macros(fdc_id, food_data)
+    return results
+
+def prefetch_food_macros(fdc_ids):
+    """Warm the macro table and shared cache for FDC IDs in the background (one bulk request)."""
+    pending = [
+        fdc_id for fdc_id in dict.fromkeys(fdc_ids)
+        if fdc_id is not None and fdc_id not in _macro_table and _nutrition_cache.get(fdc_id) is None
+    ]
+    if not pending:
+        return None
+
+    def store_all(foods):
+        for fdc_id in pending:
+            food_data = foods.get(str(fdc_id))
+            if food_data:
+                _store_macros(fdc_id, food_data)
+
+    return data_gov_client.prefetch_foods(f"{USDA_API_URL}/foods", pending, store_all)
+
+def scale_nutrition(macros, quantity, unit, quantity_in_grams):
+    """Scale per-serving macros to the consumed amount (already converted to grams)."""
+    nutrition_facts = {'carbs': macros.carbs, 'protein': macros.protein, 'fat': macros.fat}
+    serving_size = macros.serving_size
+
+
+    # Scale nutrition values
+    scale_factor = quantity_in_grams / serving_size
+    scaled_nutrition = {}
+    for key, val in nutrition_facts.items():
+        scaled_nutrition[key] = round(val * scale_factor, 2)
+
+    logger.debug("Scaled %s%s (%sg) by %s: %s", quantity, unit, quantity_in_grams, scale_factor, scaled_nutrition)
+
+    return {
+        'food_name': macros.description,
+        'carbs': scaled_nutrition.get('carbs', 0),
+        'protein': scaled_nutrition.get('protein', 0),
+        'fat': scaled_nutrition.get('fat', 0),
+        'quantity': quantity,
+        'unit': unit,
+        'serving_size': serving_size
+    }
+
 def get_food_nutrition(fdc_id, quantity, unit):
     """
     Get detailed nutrition info for a food item using data.gov API client.
@@ -171,175 +343,13 @@ def get_food_nutrition(fdc_id, quantity, unit):
     quantity: amount user consumed
     unit: unit of measurement (g, cup, etc.)
     """
-    # Check cache first (only cache by FDC ID, calculate quantity later)
-    if fdc_id in _nutrition_cache:
-        print(f"[CACHE HIT] Using cached nutrition for FDC ID {fdc_id}")
-        food_data = _nutrition_cache[fdc_id]
-    else:
-        # Make API request if not cached
-        food_data = data_gov_client.make_request(
-            endpoint=f"{USDA_API_URL}/food/{fdc_id}"
-        )
-        if food_data:
-            _nutrition_cache[fdc_id] = food_data
-            print(f"[CACHED] Stored nutrition data for FDC ID {fdc_id}")
-    
-    if food_data:
-        
-        print(f"\n=== USDA API Response for FDC ID {fdc_id} ===")
-        print(f"Food Description: {food_data.get('description', 'N/A')}")
-        print(f"Food Category: {food_data.get('foodCategory', {}).get('description', 'N/A')}")
-        print(f"Data Type: {food_data.get('dataType', 'N/A')}")
-        
-        # Extract nutrition facts - more flexible matching
-        nutrition_facts = {'carbs': 0, 'protein': 0, 'fat': 0}
-        
-        if 'foodNutrients' in food_data:
-            print(f"\nFound {len(food_data['foodNutrients'])} nutrients")
-            for nutrient in food_data['foodNutrients']:
-                # Get nutrient info with different possible structures
-                nutrient_info = nutrient.get('nutrient', {})
-                nutrient_name = nutrient_info.get('name', '').lower()
-                
-                # Try different value fields based on data type
-                value = nutrient.get('amount') or nutrient.get('value', 0)
-                
-                print(f"  - {nutrient_name}: {value}")
-                
-                # Match carbohydrates (more flexible)
-                if 'carbohydrate' in nutrient_name:
-                    if 'by difference' in nutrient_name or 'total' in nutrient_name:
-                        if nutrition_facts['carbs'] == 0:  # Only take first match
-                            nutrition_facts['carbs'] = value
-                            print(f"    ✓ MATCHED as carbs")
-                
-                # Match protein
-                elif 'protein' in nutrient_name:
-                    if nutrition_facts['protein'] == 0:
-                        nutrition_facts['protein'] = value
-                        print(f"    ✓ MATCHED as protein")
-                
-                # Match fat (try multiple variations)
-                elif 'fat' in nutrient_name or 'lipid' in nutrient_name:
-                    if 'total' in nutrient_name or nutrient_name == 'total lipid (fat)':
-                        if nutrition_facts['fat'] == 0:
-                            nutrition_facts['fat'] = value
-                            print(f"    ✓ MATCHED as fat")
-        
-        print(f"\nExtracted nutrition: {nutrition_facts}")
-        
-        # Get serving size - check multiple fields
-        serving_size = 100  # default assumption
-        if 'servingSizeUnit' in food_data and 'servingSize' in food_data:
-            try:
-                if food_data.get('servingSizeUnit', 'g').lower() == 'g':
-                    serving_size = float(food_data['servingSize'])
-                else:
-                    serving_size = 100
-            except:
-                serving_size = 100
-        
-        print(f"Serving size: {serving_size}g")
-        
-        # Convert quantity to grams if needed
-        quantity_in_grams = quantity
-        unit_lower = unit.lower()
-        food_desc = food_data.get('description', '').lower()
-
-        # Descriptive sizes with USDA-style defaults
-        if unit_lower in ['small', 'sm']:
-            if 'egg' in food_desc:
-                quantity_in_grams = quantity * 50
-            elif 'apple' in food_desc:
-                quantity_in_grams = quantity * 149
-            elif 'banana' in food_desc:
-                quantity_in_grams = quantity * 101
-            else:
-                quantity_in_grams = quantity * 100
-
-        elif unit_lower in ['medium', 'med', 'md']:
-            if 'egg' in food_desc:
-                quantity_in_grams = quantity * 60
-            elif 'apple' in food_desc:
-                quantity_in_grams = quantity * 182
-            elif 'banana' in food_desc:
-                quantity_in_grams = quantity * 118
-            elif 'orange' in food_desc:
-                quantity_in_grams = quantity * 131
-            else:
-                quantity_in_grams = quantity * 150
-
-        elif unit_lower in ['large', 'lg', 'big']:
-            if 'egg' in food_desc:
-                quantity_in_grams = quantity * 70
-            elif 'apple' in food_desc:
-                quantity_in_grams = quantity * 223
-            elif 'banana' in food_desc:
-                quantity_in_grams = quantity * 136
-            else:
-                quantity_in_grams = quantity * 200
-
-        # Volume units
-        elif unit_lower in ['cup', 'cups']:
-            quantity_in_grams = quantity * 240
-        elif unit_lower in ['tbsp', 'tablespoon', 'tablespoons']:
-            quantity_in_grams = quantity * 15
-        elif unit_lower in ['tsp', 'teaspoon', 'teaspoons']:
-            quantity_in_grams = quantity * 5
-
-        # Weight units
-        elif unit_lower in ['oz', 'ounce', 'ounces']:
-            quantity_in_grams = quantity * 28.35
-        elif unit_lower in ['lb', 'lbs', 'pound', 'pounds']:
-            quantity_in_grams = quantity * 453.59
-        elif unit_lower in ['g', 'gram', 'grams']:
-            quantity_in_grams = quantity
-
-        # Liquid volume
-        elif unit_lower in ['ml', 'milliliter', 'milliliters']:
-            quantity_in_grams = quantity
-
-        # Countable items default
-        elif unit_lower in ['piece', 'pieces', 'item', 'items', 'unit', 'units', 'egg', 'eggs']:
-            # Use food-specific defaults when counting items
-            default_piece_weight = 150
-            if 'egg' in food_desc:
-                default_piece_weight = 60
-            elif 'banana' in food_desc:
-                default_piece_weight = 118
-            elif 'apple' in food_desc:
-                default_piece_weight = 182
-            elif 'orange' in food_desc:
-                default_piece_weight = 131
-            quantity_in_grams = quantity * default_piece_weight
+    macros = get_food_macros(fdc_id)
 
-        else:
-            # Unknown unit - assume grams
-            print(f"[WARNING] Unknown unit '{unit}' - treating quantity as grams")
-            quantity_in_grams = quantity
-        
-        print(f"Input: {quantity}{unit} = {quantity_in_grams}g")
-        
-        # Scale nutrition values
-        scale_factor = quantity_in_grams / serving_size
-        scaled_nutrition = {}
-        for key, val in nutrition_facts.items():
-            scaled_nutrition[key] = round(val * scale_factor, 2)
-        
-        print(f"Scale factor: {scale_factor}")
-        print(f"Final scaled nutrition: {scaled_nutrition}")
-        print("=" * 50 + "\n")
-        
-        return {
-            'food_name': food_data.get('description', ''),
-            'carbs': scaled_nutrition.get('carbs', 0),
-            'protein': scaled_nutrition.get('protein', 0),
-            'fat': scaled_nutrition.get('fat', 0),
-            'quantity': quantity,
-            'unit': unit,
-            'serving_size': serving_size
-        }
-    print(f"Error: Could not retrieve food nutrition data for FDC ID {fdc_id}")
+    if macros:
+        # Convert quantity to grams (food portions first, then unit tables)
+        quantity_in_grams = convert_quantity_to_grams(quantity, unit, macros.description, macros.portions)
+        return scale_nutrition(macros, quantity, unit, quantity_in_grams)
+    logger.warning("Could not retrieve food nutrition data for FDC ID %s", fdc_id)
     return None
 
 @app.route('/')
@@ -388,238 +398,285 @@ def calculate_daily_calories(rmr, activity_level):
         calories = rmr * 1.725
     return calories
 
-def constraint_func(x): 
-    return x[0] + x[1]
-
-# x, y [5, 10], z in [1, 3]
-def calculate_cube_dimension(volume):
-    x = y = 10
-    z = 3
-
-    for i in np.arange(5.0, 10.0, 1.0):
-        if volume / (i * i) <= 3 and volume / (i * i) >= 1:
-            z = volume / (i * i)
-            x = y = i
-
-    return x * 10.0, y * 10.0, z * 10.0
-
 min_size = np.array([8.0, 8.0, 0.15])  # Minimum dimensions in cm
 max_size = np.array([15.0, 13.0, 2.2])  # Maximum dimensions in cm
 MAX_VOLUME = max_size[0] * max_size[1] * max_size[2] # Dimention is cm
+MIN_VOLUME = min_size[0] * min_size[1] * min_size[2]
 TOLERANCE = 400  # allow feasible solutions even with moderate error
 
+# Candidate footprint sides in 0.1 cm steps (same values the original grid scan visited)
+_GRID_X = np.arange(min_size[0], max_size[0] + 0.1, 0.1)
+_GRID_Y = np.arange(min_size[1], max_size[1] + 0.1, 0.1)
+_GRID_X_LIST = _GRID_X.tolist()
+_GRID_Y_LIST = _GRID_Y.tolist()
+
+def _first_fit(volume, other, grid):
+    """Index of the first grid side s with volume / (other * s) <= max height (clipped to the last index)."""
+    step = grid[1] - grid[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimate = np.ceil((volume / (max_size[2] * other) - grid[0]) / step)
+    i = np.clip(np.nan_to_num(estimate), 0, len(grid) - 1).astype(np.intp)
+    # The estimate is off by at most one step from rounding; settle it with the exact comparison
+    for _ in range(2):
+        back = (i > 0) & (volume / (other * grid[np.maximum(i - 1, 0)]) <= max_size[2])
+        i = np.where(back, i - 1, i)
+        forward = (i < len(grid) - 1) & ~(volume / (other * grid[i]) <= max_size[2])
+        i = np.where(forward, i + 1, i)
+    return i
+
+def _first_fit_scalar(volume, other, grid):
+    """Scalar version of _first_fit over a list of grid sides."""
+    limit = float(max_size[2])
+    i = min(max(math.ceil((volume / (limit * other) - grid[0]) / (grid[1] - grid[0])), 0), len(grid) - 1)
+    while i > 0 and volume / (other * grid[i - 1]) <= limit:
+        i -= 1
+    while i < len(grid) - 1 and not volume / (other * grid[i]) <= limit:
+        i += 1
+    return i
+
 def calculate_cube_dimension(volume):
-    # Define size limits in cm
+    """
+    Block dimensions in mm for a volume in cm^3 (scalar or NumPy array of volumes).
 
-    # Calculate minimum and maximum volume based on maximum dimensions
-    min_volume = min_size[0] * min_size[1] * min_size[2]
-    max_volume = max_size[0] * max_size[1] * max_size[2]
+    Returns the first (x, y) on the 0.1 cm grid, scanning x then y, whose
+    height z = volume / (x * y) is within limits; found in closed form
+    instead of scanning the grid. Volumes outside the size limits get the
+    min/max block and unplaceable volumes get (0, 0, 0).
+    """
+    if np.ndim(volume) == 0:
+        v = float(volume)
+        # Check if the volume is valid
+        if v < MIN_VOLUME: return min_size[0] * 10.0, min_size[1] * 10.0, min_size[2] * 10.0
+        if v > MAX_VOLUME: return max_size[0] * 10.0, max_size[1] * 10.0, max_size[2] * 10.0
+        x = _GRID_X_LIST[_first_fit_scalar(v, _GRID_Y_LIST[-1], _GRID_X_LIST)]
+        y = _GRID_Y_LIST[_first_fit_scalar(v, x, _GRID_Y_LIST)]
+        z = v / (x * y)
+        if min_size[2] <= z <= max_size[2]:
+            return np.float64(x * 10.0), np.float64(y * 10.0), np.float64(z * 10.0)
+        return 0, 0, 0 # Return zero if no valid dimensions are found
+
+    volumes = np.asarray(volume, dtype=np.float64)
+    v = volumes.reshape(-1)
+
+    # Smallest x whose tallest footprint (largest y) fits, then the smallest y for that x
+    i = _first_fit(v, np.full_like(v, _GRID_Y[-1]), _GRID_X)
+    x = _GRID_X[i]
+    y = _GRID_Y[_first_fit(v, x, _GRID_Y)]
+    z = v / (x * y)
+    fits = (min_size[2] <= z) & (z <= max_size[2])
+    dims = np.where(fits[:, None], np.stack([x, y, z], axis=1) * 10.0, 0.0)
 
     # Check if the volume is valid
-    if volume < min_volume: return min_size[0] * 10.0, min_size[1] * 10.0,  min_size[2] * 10.0
-    if volume > max_volume: return max_size[0] * 10.0, max_size[1] * 10.0,  max_size[2] * 10.0  # Return zero if volume is invalid
+    dims[v < MIN_VOLUME] = min_size * 10.0
+    dims[v > MAX_VOLUME] = max_size * 10.0
 
-    # Iterate through possible dimensions
-    for x in np.arange(min_size[0], max_size[0] + 0.1, 0.1):  # Increment by 0.5 cm
-        for y in np.arange(min_size[1], max_size[1] + 0.1, 0.1):  # Increment by 0.5 cm
-            z = volume / (x * y)  # Calculate height based on volume
-            # Check if height is within limits
-            if min_size[2] <= z <= max_size[2]:
-                return x * 10.0, y * 10.0, z * 10.0  # Return dimensions in mm
+    return tuple(dims[:, k].reshape(volumes.shape) for k in range(3))
 
-    return 0, 0, 0 # Return zero if no valid dimensions are found
+# mesh name -> 'recorded' (in the manifest) or 'stored' (also present in storage), as last seen by this process.
+# Names are content-addressed, so a known name never needs to be generated or uploaded again.
+_mesh_state = MemoryCacheBackend(max_entries=MESH_EXISTS_CACHE_SIZE)
 
-def mesh_generation(name, weight, density): #g/cm3
-    x, y, z = calculate_cube_dimension(weight / density) # in mm
-    # print(name, weight, density, weight / density, x, y, z)
-    if (x == 0 or y == 0 or z == 0): return 0, 0, 0
-    # print(x, y, z)
-    # If mesh generation is disabled, just return dimensions without creating STL
-    if MESH_MODE == 'none':
-        return x, y, z
+def _on_mesh_stored(name, stored):
+    if stored:
+        _mesh_state.set(name, 'stored', ttl=MESH_EXISTS_CACHE_TTL, size=1)
 
-    # Lazy import to avoid loading numpy-stl unless needed
-    try:
-        from stl import mesh as stl_mesh
-    except Exception as e:
-        print(f"[WARN] Failed to import numpy-stl: {e}. Skipping STL generation.")
-        return x, y, z
-
-    vertices = np.array([[
-        0, 0, 0],
-        [x, 0, 0],
-        [x, y, 0],
-        [0, y, 0],
-        [0, 0, z],
-        [x, 0, z],
-        [x, y, z],
-        [0, y, z]])
-
-    faces = np.array([[
-        0,3,1],
-        [1,3,2],
-        [0,4,7],
-        [0,7,3],
-        [4,5,6],
-        [4,6,7],
-        [5,1,2],
-        [5,2,6],
-        [2,3,6],
-        [3,7,6],
-        [0,1,5],
-        [0,5,4]])
+def _store_mesh(name, data):
+    """Queue one STL document (bytes) for upload to the mesh store (GCS or the local temp dir)."""
+    return _mesh_uploader.submit(name, data, on_done=_on_mesh_stored)
 
+def _mesh_stored(name):
+    """Whether a mesh is already stored (or being uploaded); checks storage only when this process has not seen it recently."""
+    if _mesh_state.get(name) == 'stored' or _mesh_uploader.pending(name):
+        return True
     try:
-        cube = stl_mesh.Mesh(np.zeros(faces.shape[0], dtype=stl_mesh.Mesh.dtype))
-        for i, f in enumerate(faces):
-            for j in range(3):
-                cube.vectors[i][j] = vertices[f[j],:]
-
-        import tempfile
-        temp_dir = tempfile.gettempdir()
-        tmp_path = os.path.join(temp_dir, name)
-        blob_path = f"meshes/{name}"
-        cube.save(tmp_path)
-
-        if MESH_STORAGE == 'gcs':
-            upload_to_gcs(bucket_name, tmp_path, blob_path)
-            # Remove local temp file after upload
-            try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
-        else:
-            # Keep local file for direct download via /download-stl
-            print(f"[INFO] Stored STL locally at {tmp_path}")
-            # Record manifest to allow on-demand regeneration
-            manifest = _load_manifest()
-            manifest[name] = { 'amount': float(weight), 'density': float(density) }
-            _save_manifest(manifest)
+        exists = _mesh_store.exists(name)
     except Exception as e:
-        print(f"[WARN] STL generation/upload failed for {name}: {e}")
-
-    return x, y, z
-
-def recommend(gender, age, height, weight, carbohydrate, protein, fat, activity, diet, preference):
-    rmr = calculate_rmr(weight, height, age, gender)
-    calories = calculate_daily_calories(rmr, activity)
-    diet_scale = [(0.50 / 4.1, 0.20 / 4.1, 0.30 / 8.8), # balanced
-              (0.60 / 4.1, 0.20 / 4.1, 0.20 / 8.8), # low fat
-              (0.20 / 4.1, 0.30 / 4.1, 0.50 / 8.8), # low carbs,
-              (0.28 / 4.1, 0.39 / 4.1, 0.33 / 8.8)] # high protein
+        logger.warning("Could not check mesh %s in storage: %s", name, e)
+        exists = False
+    if exists:
+        _mesh_state.set(name, 'stored', ttl=MESH_EXISTS_CACHE_TTL, size=1)
+    return exists
+
+@stage_timer('cube_dimension')
+def mesh_dimensions(weights, densities):
+    """Block (x, y, z) in mm for each weight (g) / density (g/cm3), rounded to the 0.01 mm the mesh names encode."""
+    xs, ys, zs = calculate_cube_dimension(np.asarray(weights, dtype=float) / np.asarray(densities, dtype=float))
+    return [(round(float(x), 2), round(float(y), 2), round(float(z), 2)) if x and y and z else (0, 0, 0)
+            for x, y, z in zip(np.atleast_1d(xs), np.atleast_1d(ys), np.atleast_1d(zs))]
+
+def mesh_generation_batch(specs):
+    """
+    Generate and store the STL block of every (name, weight, density) in specs in one pass.
+    weight in g, density in g/cm3. Meshes already in storage are not generated again.
+    Returns: list of (x, y, z) in mm, (0, 0, 0) where the volume cannot be placed
+    """
+    if not specs:
+        return []
+    dims = mesh_dimensions([weight for _, weight, _ in specs], [density for _, _, density in specs])
+    # If mesh generation is disabled, just return dimensions without creating STL
+    if MESH_MODE == 'none':
+        return dims
 
-    carbohydrate_intake, protein_intake, fat_intake = (calories * i for i in diet_scale[diet])
+    # Identical blocks share a name: build and store each missing mesh once
+    missing = list({specs[k][0]: k for k, d in enumerate(dims) if d[0]}.values())
+    missing = [k for k in missing if not _mesh_stored(specs[k][0])]
+    with stage_timer('stl_generation'):
+        stls = cube_stls([dims[k] for k in missing], [specs[k][0] for k in missing])
+    for k, data in zip(missing, stls):
+        _store_mesh(specs[k][0], data)
+    return dims
 
-    carbohydrate_needed = carbohydrate_intake - carbohydrate
-    protein_needed = protein_intake - protein
-    fat_needed = fat_intake - fat
+def mesh_generation(name, weight, density): #g/cm3
+    return mesh_generation_batch([(name, weight, density)])[0]
 
-    # Each row is [carbohydrates, proteins, fats]
-    W_per_hundred = np.array([
-        [17, 1.56, 0.05],  # PSP
-        [11.2, 6.6, 0.61],   # Red Lentils
-        [1.4, 1.38, 12.1],  # Avocado
-        [0.06, 19.8, 1.15]   # Chicken Breast
-    ])
+def mesh_stl_bytes(name, weight, density):
+    """STL document for one ingredient block (without storing it); None if it cannot be placed."""
+    x, y, z = mesh_dimensions([weight], [density])[0]
+    if not (x and y and z):
+        return None
+    with stage_timer('stl_generation'):
+        return cube_stl(x, y, z, name)
 
-    W = W_per_hundred * 0.01
+_recommendation_cache = MemoryCacheBackend(max_entries=RECOMMEND_CACHE_SIZE) if RECOMMEND_CACHE_SIZE else None
 
-    name = ['Purple Sweet Potato', 'Red Lentils', 'Avocado', 'Chicken Breast']
-    density = [0.81, 1.182, 0.63, 0.82]
-    
-    if preference: blocked = 3
-    else: blocked = 1
+def _materialize_meshes(meshes):
+    """
+    Record meshes in the manifest and generate the STLs of those flagged for generation, in one batch.
+    Meshes this process has recently recorded (and, if flagged, stored) are skipped.
+    meshes: [(mesh_name, amount, density, generate_mesh), ...]
+    """
+    pending = []
+    for mesh in meshes:
+        state = _mesh_state.get(mesh[0])
+        if state is None or (mesh[3] and state != 'stored'):
+            pending.append(mesh)
+    if not pending:
+        return
+    # Record manifest for on-demand regeneration, regardless of generation mode (one transaction)
+    try:
+        _mesh_manifest.upsert_many((mesh_name, amount, density) for mesh_name, amount, density, _ in pending)
+    except Exception as mf_err:
+        logger.warning("Failed to update manifest: %s", mf_err)
 
-    y = np.array([carbohydrate_needed, protein_needed, fat_needed]) # [carbohydrates, proteins, fats]
+    mesh_generation_batch([m[:3] for m in pending if m[3]])
+    for mesh_name, _, _, _ in pending:
+        if _mesh_state.get(mesh_name) is None:
+            _mesh_state.set(mesh_name, 'recorded', ttl=MESH_EXISTS_CACHE_TTL, size=1)
 
-    # positive_indices = np.where(y > 0)[0]
-    # positive_y = y[positive_indices]
-    # positive_y = y
-    # positive_y[positive_y <= 0] = 0
-    
-    nonlinear_constraint = NonlinearConstraint(constraint_func, 0.01, np.inf)
+def _build_recommendation(y, preference):
+    """
+    Find the ingredient combinations covering the nutrient gap y and materialize their meshes.
+    Returns: (results, meshes) where meshes lists (mesh_name, amount, density, generated)
+    """
+    # Ingredients come from the catalogue data file; each row of W is [carbohydrates, proteins, fats] per gram
+    catalogue = get_ingredient_catalogue()
+    W = catalogue.W
+    name = catalogue.names
+    density = catalogue.density
 
     solutions = []
-    best_candidate = None  # fallback if nothing meets tolerance
-
-    # def fun(amounts, nutritional_matrix, target):
-    #     amounts = amounts.reshape(-1, 1)
-    #     total_nutrition = np.dot(nutritional_matrix.T, amounts)
-    #     return np.linalg.norm(total_nutrition - target)
-
-    upper_bound = 10           # set None for “no limit”
-    tolerance   = 1e-6
-
-    def solve_pair(selected_nutrition, positive_y):
-        # A = np.array([[nutrients[name1][c], nutrients[name2][c]] for c in cols], dtype=float) #selected_nutrition
-        # Least-squares solution (satisfies A @ x ≈ b in L2 sense)
-        # x, residuals, _, _ = np.linalg.lstsq(selected_nutrition.T, positive_y, rcond=None)
-        x, res_norm = nnls(selected_nutrition.T, positive_y)
-        residual = np.linalg.norm(selected_nutrition.T @ x - positive_y, ord=1)     # total absolute error
-        return x, residual
 
     if np.any(y > 0):
-        mask = y > 0  
-        for indices in combinations(range(4), 2):
-            if (blocked in indices): continue
-            selected_nutrition = W[list(indices)]
-
-            fun = lambda x: np.linalg.norm(selected_nutrition.T[mask, :] @ x - y[mask])
-            res = minimize(fun, np.zeros(len(indices)), method='L-BFGS-B', bounds=[(0., MAX_VOLUME / density[indices[x]]) for x in range(len(indices))])
-
-            print(f"Testing combination {indices}: amounts={res.x}, error={res.fun}")
-            # Track best candidate even if above tolerance
-            if res.x[0] > 0 and res.x[1] > 0:
-                if best_candidate is None or res.fun < best_candidate[2]:
-                    best_candidate = (indices, res.x, res.fun)
-
-            # Accept solution if both amounts are positive and error is reasonable
-            if res.x[0] > 0 and res.x[1] > 0 and res.fun < TOLERANCE:
-                solutions.append((indices, res.x, res.fun))
-                print(f"  -> ACCEPTED")
-            else:
-                print(f"  -> REJECTED (tolerance={TOLERANCE})")
+        # Best combinations of INGREDIENTS_PER_SOLUTION allowed ingredients (bounded least squares)
+        with stage_timer('recommend_solver'):
+            candidates = search_combinations(W, y, catalogue.allowed(1 if preference else 0), INGREDIENTS_PER_SOLUTION,
+                                             MAX_VOLUME / density, MAX_SOLUTIONS)
+        for indices, x, error in candidates:
+            # Accept solution if all amounts are positive and error is reasonable
+            if error < TOLERANCE:
+                solutions.append((indices, x, error))
+            logger.debug("Combination %s: amounts=%s, error=%s -> %s", indices, x, error,
+                         'accepted' if error < TOLERANCE else f'rejected (tolerance={TOLERANCE})')
 
         # If none accepted, use best candidate so we always produce meshes
-        if not solutions and best_candidate:
-            solutions.append(best_candidate)
-            print(f"\nNo solutions under tolerance. Using best available combination with error={best_candidate[2]:.2f}")
+        if not solutions and candidates:
+            solutions.append(candidates[0])
+            logger.info("No solutions under tolerance; using best available combination with error=%.2f", candidates[0][2])
 
-        solutions.sort(key=lambda x: x[2])
-        print(f"\n=== Found {len(solutions)} valid solutions ===")
+        logger.debug("Found %d valid solutions", len(solutions))
     
     # Limit number of solutions to avoid long runtimes / memory use
     solutions = solutions[:MAX_SOLUTIONS]
     results = []
+    meshes = []
 
     for index in range(len(solutions)):
         indices, amounts, norm = solutions[index]
-        material_mesh_list = []
-        carbohydrate_supplement = protein_supplement = fat_supplement = 0
-        # print(amounts)
         for i in range(len(amounts)):             
             amounts[i] = round(amounts[i], 2)
+
+    # Size every block of the recommendation in one batch
+    blocks = [(index, indices[i], amounts[i]) for index, (indices, amounts, _) in enumerate(solutions)
+              for i in range(len(amounts)) if amounts[i] != 0]
+    dims = iter(mesh_dimensions([amount for _, _, amount in blocks], [density[k] for _, k, _ in blocks]))
+
+    for index in range(len(solutions)):
+        indices, amounts, norm = solutions[index]
+        material_mesh_list = []
+        carbohydrate_supplement = protein_supplement = fat_supplement = 0
+        for i in range(len(amounts)):
             if amounts[i] == 0: continue
-            mesh_name = str(index) + "_" + name[indices[i]] + ".stl"
             carbohydrate_supplement += amounts[i] * W[indices[i]][0]
             protein_supplement += amounts[i] * W[indices[i]][1]
             fat_supplement += amounts[i] * W[indices[i]][2]
-            # Record manifest for on-demand regeneration, regardless of generation mode
-            try:
-                manifest = _load_manifest()
-                manifest[mesh_name] = { 'amount': float(amounts[i]), 'density': float(density[indices[i]]) }
-                _save_manifest(manifest)
-            except Exception as mf_err:
-                print(f"[WARN] Failed to update manifest for {mesh_name}: {mf_err}")
-
-            # Decide whether to generate STL based on MESH_MODE
-            generate_mesh = (MESH_MODE == 'all') or (MESH_MODE == 'first' and index == 0)
-            x, y, z = mesh_generation(mesh_name, amounts[i], density[indices[i]]) if generate_mesh else calculate_cube_dimension(amounts[i] / density[indices[i]])
+            x, y, z = next(dims)
             # Show download links when meshes are allowed; on-demand regen will be used if file is missing
-            mesh_field = mesh_name if MESH_MODE != 'none' and x and y and z else ''
+            mesh_field = ''
+            if MESH_MODE == 'lazy' and x and y and z:
+                # /download-stl builds the STL from its token when asked
+                mesh_field = make_mesh_token(name[indices[i]], x, y, z)
+            elif MESH_MODE != 'none' and x and y and z:
+                # Identical blocks share one content-addressed mesh; generate per MESH_MODE
+                mesh_field = content_mesh_name(name[indices[i]], x, y, z)
+                generate_mesh = (MESH_MODE == 'all') or (MESH_MODE == 'first' and index == 0)
+                meshes.append((mesh_field, float(amounts[i]), float(density[indices[i]]), generate_mesh))
             if x and y and z:
                 material_mesh_list.append({'name': name[indices[i]], 'mesh': mesh_field, 'gram': amounts[i], 'x': round(x, 2), 'y': round(y, 2), 'z': round(z, 2)})
-        results.append((material_mesh_list, round(carbohydrate_supplement, 2), round(protein_supplement, 2), round(fat_supplement, 2)))            
+        results.append((material_mesh_list, round(carbohydrate_supplement, 2), round(protein_supplement, 2), round(fat_supplement, 2)))
+
+    # Record, write and store every new mesh of the recommendation in one batch
+    _materialize_meshes(meshes)
+    return results, meshes
+
+def _recommendation_results(y, diet, preference):
+    """
+    Recommendation results for a nutrient gap, memoized by the quantized gap.
+    Near-identical profiles share one entry; on a hit, meshes that have dropped
+    out of this process's mesh state cache are re-recorded/regenerated.
+    """
+    if _recommendation_cache is None:
+        return _build_recommendation(y, preference)[0]
+
+    y = np.round(y / RECOMMEND_CACHE_QUANTUM) * RECOMMEND_CACHE_QUANTUM if RECOMMEND_CACHE_QUANTUM > 0 else y
+    key = f"{diet}|{1 if preference else 0}|{MESH_MODE}|{INGREDIENTS_PER_SOLUTION}|{MAX_SOLUTIONS}|" + ",".join(repr(float(v)) for v in y)
+    cached = _recommendation_cache.get(key)
+    if cached is not None:
+        results, meshes = cached
+        _materialize_meshes(meshes)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Cache hit: recommendation for gap %s", y.tolist())
+        return results
+
+    results, meshes = _build_recommendation(y, preference)
+    _recommendation_cache.set(key, (results, meshes))
+    return results
+
+def recommend(gender, age, height, weight, carbohydrate, protein, fat, activity, diet, preference):
+    rmr = calculate_rmr(weight, height, age, gender)
+    calories = calculate_daily_calories(rmr, activity)
+    diet_scale = [(0.50 / 4.1, 0.20 / 4.1, 0.30 / 8.8), # balanced
+              (0.60 / 4.1, 0.20 / 4.1, 0.20 / 8.8), # low fat
+              (0.20 / 4.1, 0.30 / 4.1, 0.50 / 8.8), # low carbs,
+              (0.28 / 4.1, 0.39 / 4.1, 0.33 / 8.8)] # high protein
+
+    carbohydrate_intake, protein_intake, fat_intake = (calories * i for i in diet_scale[diet])
+
+    carbohydrate_needed = carbohydrate_intake - carbohydrate
+    protein_needed = protein_intake - protein
+    fat_needed = fat_intake - fat
+
+    y = np.array([carbohydrate_needed, protein_needed, fat_needed]) # [carbohydrates, proteins, fats]
+    results = _recommendation_results(y, diet, preference)
 
     # print(results)
 
@@ -680,17 +737,17 @@ def list2dict(info_dict):
 
 @app.route('/download/<path:filename>', methods=['GET', 'POST'])
 def download(filename):
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
+    bucket = get_storage_client().bucket(bucket_name)
     
     blob_path = os.path.join("/meshes", filename)
     blob = bucket.blob(blob_path)
 
-    file_stream = io.BytesIO()
-    blob.download_to_file(file_stream)
-    file_stream.seek(0)
-
-    return send_file(file_stream, as_attachment=True, download_name=filename)
+    # Stream the blob in chunks instead of downloading it into memory first
+    stream = open_blob_stream(blob)
+    if stream is None:
+        abort(404)
+    source, size, last_modified = stream
+    return _send_stl(source, filename, size=size, last_modified=last_modified)
 
 @app.route('/nutrition_recommendation_display', methods=["GET", "POST"])
 def nutrition_recommendation_display():
@@ -734,6 +791,53 @@ def chatbot():
     """Serve the chatbot interface"""
     return render_template("chatbot.html")
 
+def search_top_food(food_name):
+    """
+    Resolve a food name to the FDC ID of its top USDA match.
+    The next USDA_PREFETCH_TOP_N hits are prefetched in the background.
+    Returns: (fdc_id, error, stale) where error is (payload, status) or None
+    and stale tells whether the search results were served past their cache TTL
+    """
+    search_results = search_usda_food(food_name)
+
+    # Handle upstream errors (rate limit / connectivity)
+    if search_results is None:
+        return None, ({
+            'error': 'Upstream nutrition API unavailable (possible rate limit or connectivity issue). Please wait a bit and try again.',
+            'suggestion': 'If this keeps happening, request a higher API limit or try later.'
+        }, 503), False
+
+    if 'foods' not in search_results or len(search_results['foods']) == 0:
+        return None, ({
+            'error': f'No foods found for "{food_name}"',
+            'suggestion': 'Try searching for a more specific food name'
+        }, 404), False
+
+    foods = search_results['foods']
+    if USDA_PREFETCH_TOP_N and search_results.get('source') != 'local':
+        prefetch_food_macros([f.get('fdcId') for f in foods[1:1 + USDA_PREFETCH_TOP_N]])
+    return foods[0].get('fdcId'), None, bool(search_results.get('stale'))
+
+NUTRITION_UNAVAILABLE = ({
+    'error': 'Could not retrieve nutrition information (upstream API may be rate limited).',
+    'suggestion': 'Wait a few minutes and try again, or reduce rapid repeated searches.'
+}, 503)
+
+def lookup_food(food_name):
+    """
+    Resolve a food name to its top USDA match and warm its macros.
+    Returns: (fdc_id, error, stale) where error is (payload, status) or None
+    """
+    fdc_id, error, stale = search_top_food(food_name)
+    if error:
+        return None, error, False
+
+    # Get the first result's detailed nutrition
+    macros = get_food_macros(fdc_id)
+    if macros is None:
+        return None, NUTRITION_UNAVAILABLE, False
+    return fdc_id, None, stale or macros.stale
+
 @app.route('/api/search-food', methods=['POST'])
 def api_search_food():
     """Search for food in USDA database and return parsed nutrition"""
@@ -746,43 +850,119 @@ def api_search_food():
         
         # Parse user input
         food_name, quantity, unit = parse_food_input(food_input)
+        if not food_name:
+            return jsonify({'error': f'No food name in "{food_input}"'}), 400
         
-        # Search USDA API
-        search_results = search_usda_food(food_name)
-
-        # Handle upstream errors (rate limit / connectivity)
-        if search_results is None:
-            return jsonify({
-                'error': 'Upstream nutrition API unavailable (possible rate limit or connectivity issue). Please wait a bit and try again.',
-                'suggestion': 'If this keeps happening, request a higher API limit or try later.'
-            }), 503
-        
-        if 'foods' not in search_results or len(search_results['foods']) == 0:
-            return jsonify({
-                'error': f'No foods found for "{food_name}"',
-                'suggestion': 'Try searching for a more specific food name'
-            }), 404
-        
-        # Get the first result's detailed nutrition
-        top_food = search_results['foods'][0]
-        fdc_id = top_food.get('fdcId')
+        # Search USDA API and fetch the top result's macros
+        fdc_id, error, stale = lookup_food(food_name)
+        if error:
+            payload, status = error
+            return jsonify(payload), status
         
         nutrition = get_food_nutrition(fdc_id, quantity, unit)
         
-        if not nutrition:
-            return jsonify({
-                'error': 'Could not retrieve nutrition information (upstream API may be rate limited).',
-                'suggestion': 'Wait a few minutes and try again, or reduce rapid repeated searches.'
-            }), 503
-        
         return jsonify({
             'success': True,
             'nutrition': nutrition,
-            'original_input': food_input
+            'original_input': food_input,
+            'stale': stale
         }), 200
     
     except Exception as e:
-        print(f"Error in api_search_food: {e}")
+        logger.error("Error in api_search_food: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search-food/batch', methods=['POST'])
+def api_search_food_batch():
+    """
+    Resolve several food inputs (e.g. a whole meal) in one request.
+    Identical food names are looked up once, distinct searches run concurrently and
+    all uncached food details are fetched with one bulk request, so a meal costs
+    about as much as its slowest single lookup.
+    Body: {"food_inputs": ["2 eggs", "1 medium banana", ...]}
+       or {"meal": "2 eggs, a banana and 100g rice"} (split into items server-side)
+    """
+    try:
+        data = request.json or {}
+        meal = data.get('meal')
+        if isinstance(meal, str):
+            with stage_timer('parse_food_input'):
+                food_inputs = [item.text for item in parse_meal(meal)]
+        else:
+            food_inputs = data.get('food_inputs')
+
+        if not isinstance(food_inputs, list):
+            return jsonify({'error': 'food_inputs must be a list of strings'}), 400
+        food_inputs = [str(f).strip() for f in food_inputs if str(f).strip()]
+        if not food_inputs:
+            return jsonify({'error': 'No food input provided'}), 400
+        if len(food_inputs) > MAX_BATCH_ITEMS:
+            return jsonify({'error': f'Too many items (max {MAX_BATCH_ITEMS})'}), 400
+
+        parsed = [parse_food_input(food_input) for food_input in food_inputs]
+
+        # Deduplicate by normalized food name and fan out the lookups
+        unique_names = {}
+        for food_name, _, _ in parsed:
+            if food_name:
+                unique_names.setdefault(food_name.lower().strip(), food_name)
+        futures = {key: _lookup_executor.submit(search_top_food, name) for key, name in unique_names.items()}
+        lookups = {}
+        for key, future in futures.items():
+            try:
+                lookups[key] = future.result()
+            except Exception as lookup_err:
+                logger.warning("Error looking up '%s': %s", unique_names[key], lookup_err)
+                lookups[key] = (None, ({'error': str(lookup_err)}, 500), False)
+        # Items naming no food ("100g") fail on their own
+        lookups[''] = (None, ({'error': 'No food name'}, 400), False)
+
+        # Fetch details for all matched foods together (one bulk request for the uncached ones)
+        fdc_ids = [fdc_id for fdc_id, error, _ in lookups.values() if not error]
+        macros = get_food_macros_many(fdc_ids)
+        for key, (fdc_id, error, stale) in lookups.items():
+            if error:
+                continue
+            if fdc_id not in macros:
+                lookups[key] = (None, NUTRITION_UNAVAILABLE, False)
+            elif macros[fdc_id].stale:
+                lookups[key] = (fdc_id, None, True)
+
+        # Convert every resolved quantity to grams in one vectorized pass
+        resolved = [
+            (i, macros[lookups[food_name.lower().strip()][0]])
+            for i, (food_name, _, _) in enumerate(parsed)
+            if not lookups[food_name.lower().strip()][1]
+        ]
+        grams = convert_many(
+            [parsed[i][1] for i, _ in resolved],
+            [parsed[i][2] for i, _ in resolved],
+            [m.description for _, m in resolved],
+            [m.portions for _, m in resolved],
+        )
+        grams_by_index = {i: float(g) for (i, _), g in zip(resolved, grams)}
+
+        items = []
+        totals = {'carbs': 0, 'protein': 0, 'fat': 0}
+        for i, (food_input, (food_name, quantity, unit)) in enumerate(zip(food_inputs, parsed)):
+            fdc_id, error, stale = lookups[food_name.lower().strip()]
+            if error:
+                payload, status = error
+                items.append({'success': False, 'original_input': food_input, 'status': status, **payload})
+                continue
+            nutrition = scale_nutrition(macros[fdc_id], quantity, unit, grams_by_index[i])
+            for key in totals:
+                totals[key] += nutrition[key]
+            items.append({'success': True, 'original_input': food_input, 'nutrition': nutrition, 'stale': stale})
+
+        return jsonify({
+            'success': any(item['success'] for item in items),
+            'items': items,
+            'totals': {key: round(val, 2) for key, val in totals.items()}
+        }), 200
+
+    except Exception as e:
+        logger.error("Error in api_search_food_batch: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/calculate-recommendation', methods=['POST'])
@@ -886,7 +1066,7 @@ def api_calculate_recommendation():
                 if DIAG_MODE:
                     recommend_dict.update({'error': str(rec_err)})
             except Exception as fb_err:
-                print(f"Fallback generation failed: {fb_err}")
+                logger.warning("Fallback generation failed: %s", fb_err)
                 if DIAG_MODE:
                     return jsonify({'error': f'Fallback failed: {fb_err}'}), 500
                 raise rec_err
@@ -900,79 +1080,166 @@ def api_calculate_recommendation():
         }), 200
     
     except Exception as e:
-        print(f"Error in api_calculate_recommendation: {e}")
+        logger.error("Error in api_calculate_recommendation: %s", e)
         if DIAG_MODE:
             return jsonify({'error': str(e)}), 500
         return jsonify({'error': 'Recommendation failed. Please try again later.'}), 500
 
+def _send_stl(source, download_name, etag=None, size=None, last_modified=None):
+    """
+    Send an STL attachment without buffering it, with HTTP Range and conditional GET support.
+    source: local path (sent with sendfile when the server supports it), BytesIO, or a readable
+    binary file object (e.g. a GCS blob reader, streamed in MESH_DOWNLOAD_CHUNK reads).
+    Immutable meshes (etag given) are cacheable for MESH_CACHE_MAX_AGE and revalidate to 304.
+    """
+    if isinstance(source, (str, io.BytesIO)):
+        response = send_file(
+            source,
+            mimetype='application/octet-stream',
+            as_attachment=True,
+            download_name=download_name,
+            etag=etag if etag is not None else True,
+            max_age=MESH_CACHE_MAX_AGE if etag is not None else None,
+            conditional=True
+        )
+    else:
+        response = app.response_class(
+            wrap_file(request.environ, source, buffer_size=MESH_DOWNLOAD_CHUNK),
+            mimetype='application/octet-stream',
+            direct_passthrough=True
+        )
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        if size is not None:
+            response.content_length = size
+        if last_modified is not None:
+            response.last_modified = last_modified
+        if etag is not None:
+            response.set_etag(etag)
+            response.cache_control.max_age = MESH_CACHE_MAX_AGE
+        else:
+            response.cache_control.no_cache = True
+        response.make_conditional(request, accept_ranges=True, complete_length=size)
+    if etag is not None:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
 @app.route('/download-stl/<path:filename>', methods=['GET'])
 def download_stl(filename):
-    """Download STL file from Google Cloud Storage"""
+    """Download an STL file from the mesh store (GCS or local), regenerating it if missing"""
     try:
-        print(f"[DEBUG] Attempting to download STL file: {filename}")
-        if MESH_STORAGE == 'local':
-            import tempfile
-            temp_dir = tempfile.gettempdir()
-            local_path = os.path.join(temp_dir, filename)
-            if not os.path.exists(local_path):
-                print(f"[DEBUG] Local STL not found at {local_path}, attempting regeneration from manifest")
-                # Try on-demand regeneration if manifest has info
-                manifest = _load_manifest()
-                meta = manifest.get(filename)
-                if meta and 'amount' in meta and 'density' in meta:
-                    try:
-                        # Regenerate STL file
-                        mesh_generation(filename, float(meta['amount']), float(meta['density']))
-                    except Exception as regen_err:
-                        print(f"[WARN] Regeneration failed: {regen_err}")
-                else:
-                    print("[DEBUG] No manifest entry for this file; cannot regenerate")
-                # Re-check existence after regeneration attempt
-                if not os.path.exists(local_path):
-                    return jsonify({'error': f'File not found (local): {filename}'}), 404
-            with open(local_path, 'rb') as f:
-                file_data = io.BytesIO(f.read())
-            file_data.seek(0)
-            print(f"[DEBUG] Serving local STL {filename}, size: {file_data.getbuffer().nbytes} bytes")
-            return send_file(
-                file_data,
-                mimetype='application/octet-stream',
-                as_attachment=True,
-                download_name=filename
-            )
+        logger.debug("Download requested: %s", filename)
+        # Lazy mesh tokens carry the block dimensions; synthesize the STL without any storage I/O
+        token = parse_mesh_token(filename)
+        if token is not None:
+            slug, x, y, z, signature = token
+            return _send_stl(cube_stl_buffer(x, y, z, filename), f"{slug}.stl", etag=signature)
+        # Content-addressed meshes never change: answer revalidation without touching storage
+        content_hash = content_mesh_hash(filename)
+        if content_hash is not None and request.if_none_match.contains(content_hash):
+            return _send_stl(io.BytesIO(), filename, etag=content_hash)
+        # Stream from storage: sendfile for local files, chunked reads for GCS
+        try:
+            stream = _mesh_store.stream(filename)
+        except Exception as read_err:
+            logger.warning("Reading %s from %s storage failed: %s", filename, MESH_STORAGE, read_err)
+            stream = None
+        if stream is not None:
+            source, size, last_modified = stream
+            logger.debug("Streaming STL %s, size: %s bytes", filename, size)
+            return _send_stl(source, filename, etag=content_hash, size=size, last_modified=last_modified)
+
+        # Not stored (yet): the upload may still be queued, or the object was removed
+        logger.debug("STL %s not in %s storage, attempting regeneration from manifest", filename, MESH_STORAGE)
+        # Try on-demand regeneration if manifest has info; serve the in-memory STL directly
+        data = None
+        meta = _mesh_manifest.get(filename)
+        if meta:
+            try:
+                data = mesh_stl_bytes(filename, meta['amount'], meta['density'])
+                if data is not None:
+                    _store_mesh(filename, data)
+            except Exception as regen_err:
+                logger.warning("Regeneration of %s failed: %s", filename, regen_err)
         else:
-            storage_client = storage.Client()
-            bucket = storage_client.bucket(bucket_name)
-            blob_path = f"meshes/{filename}"
-            print(f"[DEBUG] GCS blob path: {blob_path}")
-            blob = bucket.blob(blob_path)
-            
-            # Check if blob exists
-            if not blob.exists():
-                print(f"[DEBUG] Blob does not exist at path: {blob_path}")
-                return jsonify({'error': f'File not found in storage: {filename}'}), 404
-            
-            # Download to memory
-            file_data = io.BytesIO()
-            blob.download_to_file(file_data)
-            file_data.seek(0)
-            print(f"[DEBUG] Successfully downloaded {filename}, size: {file_data.getbuffer().nbytes} bytes")
-            
-            return send_file(
-                file_data,
-                mimetype='application/octet-stream',
-                as_attachment=True,
-                download_name=filename
-            )
+            logger.debug("No manifest entry for %s; cannot regenerate", filename)
+        if data is None:
+            return jsonify({'error': f'File not found in storage: {filename}'}), 404
+        return _send_stl(io.BytesIO(data), filename, etag=content_hash)
+    except HTTPException:
+        # e.g. 416 for a Range past the end of the mesh
+        raise
     except Exception as e:
-        print(f"[ERROR] Error downloading STL: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error downloading STL %s: %s", filename, e)
         return jsonify({'error': f'File not found or download failed: {str(e)}'}), 404
 
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'ok'}), 200
+
+# Request latency, status counts and in-flight gauge per endpoint (see metrics.py)
+@app.before_request
+def _metrics_before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or 'unmatched'
+    REQUESTS_IN_FLIGHT.inc(g.metrics_endpoint)
+
+@app.after_request
+def _metrics_after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def _metrics_teardown_request(exc):
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is None:
+        return
+    REQUESTS_IN_FLIGHT.dec(endpoint)
+    REQUEST_SECONDS.observe(time.perf_counter() - g.pop('metrics_start'), endpoint)
+    REQUESTS_TOTAL.inc(endpoint, str(g.pop('metrics_status', 500)))
+
+def _collect_app_metrics():
+    """Scrape-time metrics: cache hit ratios, upstream quota and mesh upload counters."""
+    families = cache_families({
+        'usda_search': _search_cache.stats(),
+        'usda_macros': _nutrition_cache.stats(),
+        'usda_backend': _search_cache.backend.stats(),
+        'recommendation': _recommendation_cache.stats() if _recommendation_cache is not None else None,
+        'mesh_state': _mesh_state.stats(),
+    })
+
+    quota = data_gov_client.governor.snapshot()
+    families += [
+        ('aiweb_upstream_quota_limit', 'gauge', 'data.gov requests allowed per hour.', [({}, quota['limit'])]),
+        ('aiweb_upstream_quota_remaining', 'gauge', 'data.gov requests remaining as last reported by the API.',
+         [({}, quota['remaining'])]),
+        ('aiweb_upstream_tokens', 'gauge', 'Requests the local rate-limit governor would admit now.',
+         [({}, quota['tokens'])]),
+        ('aiweb_upstream_blocked_seconds', 'gauge', 'Seconds until a 429 Retry-After expires.',
+         [({}, quota['blocked_for'])]),
+        ('aiweb_upstream_shed_total', 'counter', 'Low-priority upstream requests dropped by the governor.',
+         [({}, quota['shed'])]),
+        ('aiweb_upstream_throttled_total', 'counter', 'User-facing upstream requests rejected by the governor.',
+         [({}, quota['throttled'])]),
+    ]
+
+    uploads = _mesh_uploader.stats()
+    families += [
+        ('aiweb_mesh_uploads_total', 'counter', 'Mesh uploads by outcome.',
+         [({'result': 'succeeded'}, uploads['succeeded']), ({'result': 'failed'}, uploads['failed'])]),
+        ('aiweb_mesh_upload_retries_total', 'counter', 'Retried mesh upload attempts.', [({}, uploads['retried'])]),
+        ('aiweb_mesh_uploads_inline_total', 'counter', 'Mesh uploads run inline because the queue was full.',
+         [({}, uploads['inline'])]),
+        ('aiweb_mesh_uploads_pending', 'gauge', 'Mesh uploads queued or in flight.', [({}, uploads['pending'])]),
+    ]
+    return families
+
+REGISTRY.register_collector(_collect_app_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text-format metrics for this worker process."""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
  
 # main driver function
 if __name__ == '__main__':
@@ -0,0 +1,175 @@
+"""
+Mesh Manifest Store
+
+Records (amount, density) for every mesh name a recommendation hands out so
+/download-stl can regenerate an STL that is missing from storage.
+
+Entries live in an indexed SQLite table in WAL mode, shared by all gunicorn
+workers on the host. Each recommendation writes its meshes in one upsert
+transaction, lookups are a primary-key read, and entries not refreshed
+within MESH_MANIFEST_TTL are purged, so the cost per mesh stays constant
+however many meshes have been generated.
+
+Configuration (environment variables):
+    MESH_MANIFEST_PATH   SQLite file path (default: <tempdir>/meshes_manifest.sqlite3)
+    MESH_MANIFEST_TTL    seconds an entry is kept after its last write (default: 7 days)
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from app_logging import get_logger
+
+logger = get_logger('mesh_manifest')
+
+MESH_MANIFEST_PATH = os.getenv('MESH_MANIFEST_PATH', os.path.join(tempfile.gettempdir(), 'meshes_manifest.sqlite3'))
+try:
+    MESH_MANIFEST_TTL = max(60.0, float(os.getenv('MESH_MANIFEST_TTL', str(7 * 24 * 3600))))
+except Exception:
+    MESH_MANIFEST_TTL = 7 * 24 * 3600
+
+# Manifest written by earlier versions (whole-file JSON); imported once into an empty store
+LEGACY_MANIFEST_PATH = os.path.join(tempfile.gettempdir(), 'meshes_manifest.json')
+
+ManifestEntry = Tuple[str, float, float]  # (mesh name, amount in g, density in g/cm3)
+
+
+class SQLiteMeshManifest:
+    """Mesh manifest in a SQLite table (WAL mode, one connection per thread)."""
+
+    def __init__(self, path: str = MESH_MANIFEST_PATH, ttl: float = MESH_MANIFEST_TTL,
+                 purge_interval: float = 600.0):
+        """
+        Args:
+            path: SQLite database file
+            ttl: Seconds an entry is kept after its last upsert
+            purge_interval: Minimum seconds between expiry sweeps
+        """
+        self.path = path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meshes ("
+                " name TEXT PRIMARY KEY,"
+                " amount REAL NOT NULL,"
+                " density REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS meshes_updated_at ON meshes (updated_at)")
+        self._import_legacy()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _import_legacy(self):
+        if not os.path.exists(LEGACY_MANIFEST_PATH):
+            return
+        if self._conn().execute("SELECT 1 FROM meshes LIMIT 1").fetchone() is not None:
+            return
+        try:
+            with open(LEGACY_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            self.upsert_many(
+                (name, float(meta['amount']), float(meta['density']))
+                for name, meta in legacy.items() if 'amount' in meta and 'density' in meta
+            )
+        except Exception as e:
+            logger.warning("Failed to import legacy mesh manifest: %s", e)
+
+    def upsert_many(self, entries: Iterable[ManifestEntry]):
+        """Insert or refresh entries in one transaction (and expire old ones now and then)."""
+        now = time.time()
+        rows = [(name, float(amount), float(density), now) for name, amount, density in entries]
+        if not rows:
+            return
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO meshes (name, amount, density, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET amount = excluded.amount, density = excluded.density, "
+                "updated_at = excluded.updated_at",
+                rows,
+            )
+            if now - self._last_purge >= self.purge_interval:
+                self._last_purge = now
+                conn.execute("DELETE FROM meshes WHERE updated_at < ?", (now - self.ttl,))
+
+    def get(self, name: str) -> Optional[Dict[str, float]]:
+        """Return {'amount', 'density'} for a mesh name, or None if unknown or expired."""
+        row = self._conn().execute(
+            "SELECT amount, density FROM meshes WHERE name = ? AND updated_at >= ?",
+            (name, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        return {'amount': row[0], 'density': row[1]}
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM meshes").fetchone()[0]
+
+
+class MemoryMeshManifest:
+    """
+    In-process fallback when the SQLite file cannot be used (private to one worker).
+
+    Entries are kept in update order, so expired ones are always at the front
+    and each upsert only looks at the entries it removes.
+    """
+
+    def __init__(self, ttl: float = MESH_MANIFEST_TTL):
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[float, float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def upsert_many(self, entries: Iterable[ManifestEntry]):
+        now = time.time()
+        with self._lock:
+            for name, amount, density in entries:
+                self._entries.pop(name, None)
+                self._entries[name] = (float(amount), float(density), now)
+            while self._entries and next(iter(self._entries.values()))[2] < now - self.ttl:
+                self._entries.popitem(last=False)
+
+    def get(self, name: str) -> Optional[Dict[str, float]]:
+        entry = self._entries.get(name)
+        if entry is None or entry[2] < time.time() - self.ttl:
+            return None
+        return {'amount': entry[0], 'density': entry[1]}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_mesh_manifest():
+    """Get (or create) the shared mesh manifest; falls back to memory if SQLite is unavailable."""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                try:
+                    _manifest = SQLiteMeshManifest()
+                except Exception as e:
+                    logger.warning("SQLite mesh manifest unavailable (%s); using in-memory manifest", e)
+                    _manifest = MemoryMeshManifest()
+    return _manifest
@@ -0,0 +1,303 @@
+"""
+Mesh Storage
+
+Where generated STL meshes live, behind one small interface:
+
+1. GCSMeshStore: objects under meshes/ in a Google Cloud Storage bucket,
+   through one lazily created storage.Client shared by the whole process.
+   Point STORAGE_EMULATOR_HOST at a fake-GCS server to run it without GCP.
+2. LocalMeshStore: files in a local directory (default: the temp dir)
+
+Uploads go through MeshUploader, a bounded worker pool that retries failed
+writes with exponential backoff and keeps counters, so a recommendation can
+return while its meshes are still being written. While a mesh is queued or
+in flight, MeshUploader.pending(name) is true and readers can fall back to
+regenerating it.
+
+Downloads stream: stream(name) returns a local file path (served with
+sendfile) or a chunked GCS reader, never the whole object in memory.
+
+Configuration (environment variables):
+    MESH_STORAGE           'gcs' (default) | 'local'
+    MESH_BUCKET            GCS bucket name (default: food-ai)
+    MESH_LOCAL_DIR         directory for local meshes (default: <tempdir>)
+    MESH_UPLOAD_WORKERS    concurrent uploads per worker process (default: 4)
+    MESH_UPLOAD_QUEUE      uploads that may wait in the queue before submit() writes inline (default: 256)
+    MESH_UPLOAD_RETRIES    retries after a failed upload (default: 3)
+    MESH_DOWNLOAD_CHUNK    bytes per GCS read while streaming a download (default: 256 KiB)
+"""
+
+import atexit
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from app_logging import get_logger
+from metrics import stage_timer
+
+try:
+    from google.auth.exceptions import DefaultCredentialsError
+except ImportError:  # local storage only
+    DefaultCredentialsError = ()
+
+logger = get_logger('mesh_storage')
+
+MESH_STORAGE = os.getenv('MESH_STORAGE', 'gcs').strip().lower()
+MESH_BUCKET = os.getenv('MESH_BUCKET', 'food-ai')
+MESH_LOCAL_DIR = os.getenv('MESH_LOCAL_DIR', tempfile.gettempdir())
+try:
+    MESH_UPLOAD_WORKERS = max(1, int(os.getenv('MESH_UPLOAD_WORKERS', '4')))
+except Exception:
+    MESH_UPLOAD_WORKERS = 4
+try:
+    MESH_UPLOAD_QUEUE = max(0, int(os.getenv('MESH_UPLOAD_QUEUE', '256')))
+except Exception:
+    MESH_UPLOAD_QUEUE = 256
+try:
+    MESH_UPLOAD_RETRIES = max(0, int(os.getenv('MESH_UPLOAD_RETRIES', '3')))
+except Exception:
+    MESH_UPLOAD_RETRIES = 3
+try:
+    MESH_DOWNLOAD_CHUNK = max(4096, int(os.getenv('MESH_DOWNLOAD_CHUNK', str(256 * 1024))))
+except Exception:
+    MESH_DOWNLOAD_CHUNK = 256 * 1024
+
+# (source, size in bytes, last-modified timestamp); source is a local path or a readable binary file object
+MeshStream = Tuple[Union[str, Any], Optional[int], Optional[float]]
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_storage_client():
+    """Get (or create) the process-wide google.cloud.storage.Client."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google.cloud import storage
+                _client = storage.Client()
+    return _client
+
+
+def open_blob_stream(blob, chunk_size: int = MESH_DOWNLOAD_CHUNK) -> Optional[MeshStream]:
+    """Chunked, seekable reader over a GCS blob (None if it does not exist)."""
+    from google.api_core.exceptions import NotFound
+    try:
+        blob.reload()
+    except NotFound:
+        return None
+    updated = blob.updated.timestamp() if blob.updated is not None else None
+    return blob.open('rb', chunk_size=chunk_size), blob.size, updated
+
+
+class GCSMeshStore:
+    """Meshes as objects under `prefix` in a GCS bucket."""
+
+    def __init__(self, bucket_name: str = MESH_BUCKET, prefix: str = 'meshes/', make_public: bool = True,
+                 client=None):
+        """
+        Args:
+            bucket_name: GCS bucket holding the meshes
+            prefix: Object name prefix
+            make_public: Make every uploaded object publicly readable
+            client: storage.Client to use instead of the shared one
+        """
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.make_public = make_public
+        self._client = client
+
+    def _blob(self, name: str):
+        client = self._client or get_storage_client()
+        return client.bucket(self.bucket_name).blob(self.prefix + name)
+
+    def put(self, name: str, data: bytes):
+        blob = self._blob(name)
+        blob.upload_from_string(data, content_type='application/octet-stream')
+        if self.make_public:
+            blob.make_public()
+
+    def exists(self, name: str) -> bool:
+        return self._blob(name).exists()
+
+    def read(self, name: str) -> Optional[bytes]:
+        from google.api_core.exceptions import NotFound
+        try:
+            return self._blob(name).download_as_bytes()
+        except NotFound:
+            return None
+
+    def stream(self, name: str) -> Optional[MeshStream]:
+        return open_blob_stream(self._blob(name))
+
+
+class LocalMeshStore:
+    """Meshes as files in a local directory."""
+
+    def __init__(self, directory: str = MESH_LOCAL_DIR):
+        self.directory = directory
+
+    def path(self, name: str) -> str:
+        if not name or os.path.basename(name) != name or name in ('.', '..'):
+            raise ValueError(f"Invalid mesh name: {name!r}")
+        return os.path.join(self.directory, name)
+
+    def put(self, name: str, data: bytes):
+        # Write then rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(name))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def read(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self.path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def stream(self, name: str) -> Optional[MeshStream]:
+        path = self.path(name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return path, stat.st_size, stat.st_mtime
+
+
+class MeshUploader:
+    """Background mesh uploads: bounded worker pool, retries with backoff, counters."""
+
+    def __init__(self, store, workers: int = MESH_UPLOAD_WORKERS, max_queued: int = MESH_UPLOAD_QUEUE,
+                 retries: int = MESH_UPLOAD_RETRIES, backoff: float = 0.5):
+        """
+        Args:
+            store: GCSMeshStore / LocalMeshStore (anything with put(name, data))
+            workers: Uploads running at the same time
+            max_queued: Uploads allowed to wait for a worker; beyond that submit() uploads inline
+            retries: Retries after a failed attempt
+            backoff: Delay before the first retry, doubled for each further one
+        """
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mesh-upload")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.inline = 0
+        self.upload_seconds = 0.0
+
+    def _upload(self, name: str, data: bytes) -> bool:
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    with stage_timer('mesh_upload'):
+                        self.store.put(name, data)
+                    with self._lock:
+                        self.succeeded += 1
+                    return True
+                except Exception as e:
+                    if attempt >= self.retries or isinstance(e, DefaultCredentialsError):
+                        logger.warning("STL upload failed for %s: %s", name, e)
+                        with self._lock:
+                            self.failed += 1
+                        return False
+                    with self._lock:
+                        self.retried += 1
+                    time.sleep(self.backoff * (2 ** attempt))
+            return False
+        finally:
+            with self._lock:
+                self.upload_seconds += time.perf_counter() - start
+                self._pending.pop(name, None)
+
+    def submit(self, name: str, data: bytes, on_done: Optional[Callable[[str, bool], Any]] = None) -> Future:
+        """
+        Queue an upload and return its Future (result: True on success).
+        A name already queued or in flight is not uploaded twice; when the
+        queue is full the upload runs in the calling thread instead.
+        """
+        with self._lock:
+            future = self._pending.get(name)
+            if future is not None:
+                return future
+            self.submitted += 1
+            run_inline = len(self._pending) >= self.workers + self.max_queued
+            if run_inline:
+                self.inline += 1
+                future = Future()
+            else:
+                future = self._executor.submit(self._upload, name, data)
+            self._pending[name] = future
+        if run_inline:
+            future.set_result(self._upload(name, data))
+        if on_done is not None:
+            future.add_done_callback(lambda f: on_done(name, bool(f.result())))
+        return future
+
+    def pending(self, name: str) -> bool:
+        """Whether an upload of `name` is queued or in flight."""
+        return name in self._pending
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pending': len(self._pending),
+                'submitted': self.submitted,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'retried': self.retried,
+                'inline': self.inline,
+                'upload_seconds': round(self.upload_seconds, 3),
+            }
+
+
+_store = None
+_uploader: Optional[MeshUploader] = None
+_store_lock = threading.Lock()
+
+
+def get_mesh_store():
+    """Get (or create) the mesh store selected by MESH_STORAGE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LocalMeshStore() if MESH_STORAGE == 'local' else GCSMeshStore()
+    return _store
+
+
+def get_mesh_uploader() -> MeshUploader:
+    """Get (or create) the background uploader for the shared mesh store."""
+    global _uploader
+    if _uploader is None:
+        store = get_mesh_store()
+        with _store_lock:
+            if _uploader is None:
+                _uploader = MeshUploader(store)
+                # Let queued uploads finish when the worker exits
+                atexit.register(_uploader.shutdown)
+    return _uploader
@@ -0,0 +1,109 @@
+"""
+Signed Mesh Tokens
+
+With MESH_MODE=lazy no STL is generated when a recommendation is computed.
+Each ingredient instead gets a mesh token that encodes everything needed to
+build its STL:
+
+    <slug>_<x>x<y>x<z>_<signature>.stl      e.g. Avocado_150.00x130.00x22.00_3f9c...stl
+
+(x, y, z in mm). The signature is an HMAC-SHA256 over the slug and the
+dimensions, so /download-stl only synthesizes meshes this server issued. The
+same dimensions always give the same token, so the signature doubles as a
+strong ETag for CDN and browser caching.
+
+Meshes that are generated and stored up front (MESH_MODE=all/first) use an
+unsigned content-addressed name instead:
+
+    <slug>_<hash>.stl                        e.g. Avocado_9b1e04c2d7a35f60.stl
+
+where the hash covers the same slug and dimensions. Identical blocks share
+one stored object, different blocks never overwrite each other, and the
+hash serves as the ETag.
+
+Configuration (environment variables):
+    MESH_TOKEN_SECRET   HMAC key shared by all workers; required with MESH_MODE=lazy
+                        (see require_mesh_token_secret), otherwise a per-process key is used
+"""
+
+import hashlib
+import hmac
+import os
+import re
+import secrets
+from typing import Optional, Tuple
+
+
+MESH_TOKEN_SECRET = os.getenv("MESH_TOKEN_SECRET", "")
+# Without a configured secret, tokens only verify in the process that minted them
+MESH_TOKEN_SECRET_CONFIGURED = bool(MESH_TOKEN_SECRET)
+if not MESH_TOKEN_SECRET_CONFIGURED:
+    MESH_TOKEN_SECRET = secrets.token_hex(32)
+
+_SIGNATURE_CHARS = 32
+_CONTENT_HASH_CHARS = 16
+_SLUG_RE = re.compile(r"[^A-Za-z0-9]+")
+_TOKEN_RE = re.compile(
+    r"^(?P<slug>[A-Za-z0-9-]+)_(?P<x>\d+\.\d{2})x(?P<y>\d+\.\d{2})x(?P<z>\d+\.\d{2})_(?P<sig>[0-9a-f]{%d})\.stl$"
+    % _SIGNATURE_CHARS
+)
+_CONTENT_NAME_RE = re.compile(r"^[A-Za-z0-9-]+_(?P<hash>[0-9a-f]{%d})\.stl$" % _CONTENT_HASH_CHARS)
+
+
+def require_mesh_token_secret():
+    """
+    Fail startup when mesh tokens are served without a shared secret.
+
+    A per-process key makes tokens minted by one gunicorn worker (or before a
+    restart) 404 on every other worker, so lazy mode must not run on one.
+
+    Raises:
+        RuntimeError: if MESH_TOKEN_SECRET is not set
+    """
+    if not MESH_TOKEN_SECRET_CONFIGURED:
+        raise RuntimeError("MESH_MODE=lazy needs MESH_TOKEN_SECRET: set it to the same random value "
+                           "(e.g. `python -c 'import secrets; print(secrets.token_hex(32))'`) on every worker")
+
+
+def _slug(name: str) -> str:
+    return _SLUG_RE.sub('-', name).strip('-') or 'mesh'
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(MESH_TOKEN_SECRET.encode('utf-8'), payload.encode('utf-8'), hashlib.sha256)
+    return digest.hexdigest()[:_SIGNATURE_CHARS]
+
+
+def make_mesh_token(name: str, x: float, y: float, z: float) -> str:
+    """Signed, content-addressed STL file name for an x by y by z (mm) block of `name`."""
+    payload = f"{_slug(name)}_{x:.2f}x{y:.2f}x{z:.2f}"
+    return f"{payload}_{_sign(payload)}.stl"
+
+
+def parse_mesh_token(token: str) -> Optional[Tuple[str, float, float, float, str]]:
+    """
+    Verify a mesh token.
+
+    Returns:
+        (slug, x, y, z, signature), or None if the token is malformed or its signature is wrong
+    """
+    match = _TOKEN_RE.match(token)
+    if not match:
+        return None
+    payload = f"{match.group('slug')}_{match.group('x')}x{match.group('y')}x{match.group('z')}"
+    if not hmac.compare_digest(_sign(payload), match.group('sig')):
+        return None
+    return (match.group('slug'), float(match.group('x')), float(match.group('y')),
+            float(match.group('z')), match.group('sig'))
+
+
+def content_mesh_name(name: str, x: float, y: float, z: float) -> str:
+    """Content-addressed STL file name for an x by y by z (mm) block of `name` (dimensions rounded to 0.01)."""
+    payload = f"{_slug(name)}_{x:.2f}x{y:.2f}x{z:.2f}"
+    return f"{_slug(name)}_{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:_CONTENT_HASH_CHARS]}.stl"
+
+
+def content_mesh_hash(filename: str) -> Optional[str]:
+    """The content hash of a content-addressed mesh name, or None for any other file name."""
+    match = _CONTENT_NAME_RE.match(filename)
+    return match.group('hash') if match else None
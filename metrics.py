@@ -0,0 +1,270 @@
+"""
+Request and Stage Metrics
+
+In-process counters, gauges and histograms rendered in the Prometheus text
+exposition format for the /metrics endpoint. No client library is needed.
+
+Hot-path stages are timed with `stage_timer`, used as a context manager or
+decorator:
+
+    with stage_timer('recommend_solver'):
+        ...
+
+Each stage adds one observation to the `aiweb_stage_seconds{stage=...}`
+histogram: two perf_counter() reads and a short locked update. Values that
+other modules already track (cache hit counts, upstream quota, upload
+counters) are pulled when /metrics is scraped by collectors registered with
+`register_collector`, so they add nothing to the request path.
+
+Metrics are per worker process. With several gunicorn workers, each scrape
+is answered by one of them; the worker's pid is exported as a label of
+`aiweb_process_info`.
+"""
+
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; spans sub-millisecond cache lookups up to the 180 s gunicorn timeout
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 180.0)
+
+# (metric name, type, help, [(labels, value), ...]) as returned by collectors
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _labels(self, labelvalues: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, labelvalues))
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+    type_name = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self._labels(k))} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down per label set (e.g. requests in flight)."""
+    type_name = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value: float, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self._labels(k))} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with sum and count per label set."""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._series.items())
+        lines = self.header()
+        for labelvalues, (counts, total, count) in items:
+            labels = self._labels(labelvalues)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Registry:
+    """Named metrics plus scrape-time collectors, rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames=labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames=labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames=labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {type(e).__name__}")
+                continue
+            for name, type_name, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {type_name}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGE_SECONDS = REGISTRY.histogram('aiweb_stage_seconds', 'Time spent in each hot-path stage.', ('stage',))
+REQUEST_SECONDS = REGISTRY.histogram('aiweb_request_seconds', 'HTTP request latency by endpoint.', ('endpoint',))
+REQUESTS_TOTAL = REGISTRY.counter('aiweb_requests_total', 'HTTP requests by endpoint and status code.',
+                                  ('endpoint', 'status'))
+REQUESTS_IN_FLIGHT = REGISTRY.gauge('aiweb_requests_in_flight', 'HTTP requests currently being handled.',
+                                    ('endpoint',))
+REGISTRY.register_collector(lambda: [(
+    'aiweb_process_info', 'gauge', 'Worker process answering this scrape.', [({'pid': str(os.getpid())}, 1)]
+)])
+
+
+class stage_timer:
+    """Time a block or function into aiweb_stage_seconds{stage=name}."""
+
+    __slots__ = ('stage', '_start')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self._start, self.stage)
+        return False
+
+    def __call__(self, func):
+        stage = self.stage
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+        return wrapper
+
+
+def cache_families(caches: Dict[str, Optional[Dict]]) -> List[MetricFamily]:
+    """
+    Metric families for cache stats() dicts (hits, misses, optional stale_hits/entries/bytes).
+
+    Args:
+        caches: cache name -> stats() dict (None entries are skipped)
+    """
+    hits, stale, misses, ratio, entries, size = [], [], [], [], [], []
+    for name, stats in caches.items():
+        if not stats:
+            continue
+        labels = {'cache': name}
+        lookups = stats.get('hits', 0) + stats.get('stale_hits', 0) + stats.get('misses', 0)
+        hits.append((labels, stats.get('hits', 0)))
+        stale.append((labels, stats.get('stale_hits', 0)))
+        misses.append((labels, stats.get('misses', 0)))
+        ratio.append((labels, (stats.get('hits', 0) + stats.get('stale_hits', 0)) / lookups if lookups else 0.0))
+        entries.append((labels, stats.get('entries')))
+        size.append((labels, stats.get('bytes')))
+    return [
+        ('aiweb_cache_hits_total', 'counter', 'Fresh cache hits.', hits),
+        ('aiweb_cache_stale_hits_total', 'counter', 'Expired entries served while refreshing.', stale),
+        ('aiweb_cache_misses_total', 'counter', 'Cache misses.', misses),
+        ('aiweb_cache_hit_ratio', 'gauge', 'Hits (fresh or stale) per lookup since start.', ratio),
+        ('aiweb_cache_entries', 'gauge', 'Entries currently cached.', entries),
+        ('aiweb_cache_bytes', 'gauge', 'Approximate cached bytes.', size),
+    ]
@@ -0,0 +1,187 @@
+"""
+Batched Bounded Least-Squares Solver
+
+recommend() picks ingredient pairs whose amounts x (grams) best cover the
+missing macros y:
+
+    minimize ||A x - y||_2  subject to  0 <= x <= upper
+
+with A the (macros x 2) nutrient matrix of the pair. With only two
+variables the exact optimum is one of a handful of closed-form candidates:
+
+1. the unconstrained minimum-norm solution pinv(A) @ y, if inside the box
+2. one variable fixed at a bound (0 or its upper limit) and the other at
+   its 1-D optimum clipped to its bounds (this also covers the corners)
+
+If the pair's nutrient matrix is rank deficient (e.g. only one macro is
+missing), a whole segment of amounts is optimal. Those pairs are solved with
+L-BFGS-B from zero, as recommend() always did, so users keep getting the
+same point of that segment rather than the one with the smallest amounts.
+
+All candidates for all pairs are built as stacked NumPy arrays and the best
+feasible one per pair is selected in a single pass, replacing one iterative
+scipy.optimize.minimize call per pair.
+
+search_combinations generalizes this to combinations of k ingredients out of
+a large catalogue, pruning with a branch-and-bound.
+"""
+
+from itertools import combinations
+from math import comb
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from scipy.optimize import lsq_linear, minimize
+
+# Slack for treating the unconstrained solution as inside the box
+_FEASIBILITY_EPS = 1e-9
+# Relative Gram determinant below which a pair's 2 columns count as linearly dependent
+_RANK_EPS = 1e-9
+# Searches over k > 2 with up to this many combinations are enumerated instead of branch-and-bound
+EXHAUSTIVE_LIMIT = 5000
+
+
+def solve_pairs(W: np.ndarray, y: np.ndarray, pairs: Sequence[Tuple[int, int]],
+                upper: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Solve the bounded 2-variable least-squares problem for every pair at once.
+
+    Args:
+        W: (n_ingredients, n_macros) nutrients per gram
+        y: (n_macros,) target; only entries with y > 0 are fitted
+        pairs: Ingredient index pairs to solve
+        upper: Per-ingredient upper bound on the amount
+
+    Returns:
+        (amounts, residuals): (n_pairs, 2) optimal amounts and the
+        (n_pairs,) L2 norm of the fitted residual
+    """
+    pairs = np.asarray(pairs, dtype=np.intp).reshape(-1, 2)
+    mask = np.asarray(y) > 0
+    b = np.asarray(y, dtype=np.float64)[mask]                                   # (m,)
+    A = np.transpose(np.asarray(W, dtype=np.float64)[pairs][:, :, mask], (0, 2, 1))  # (P, m, 2)
+    hi = np.asarray(upper, dtype=np.float64)[pairs]                              # (P, 2)
+    n_pairs = len(pairs)
+
+    # Squared column norms and A^T b for the 1-D sub-problems
+    col_sq = np.einsum('pmk,pmk->pk', A, A)                                      # (P, 2)
+    atb = np.einsum('pmk,m->pk', A, b)                                           # (P, 2)
+    cross = np.einsum('pm,pm->p', A[:, :, 0], A[:, :, 1])                        # (P,)
+
+    candidates = np.empty((n_pairs, 5, 2))
+    # 1. Unconstrained minimum-norm solution
+    candidates[:, 0] = np.einsum('pkm,m->pk', np.linalg.pinv(A), b)
+    # 2. Fix one variable at a bound, optimize the other in closed form
+    k = 1
+    for fixed in (0, 1):
+        free = 1 - fixed
+        for bound in (np.zeros(n_pairs), hi[:, fixed]):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_free = np.where(col_sq[:, free] > 0,
+                                  (atb[:, free] - cross * bound) / col_sq[:, free], 0.0)
+            candidates[:, k, fixed] = bound
+            candidates[:, k, free] = np.clip(x_free, 0.0, hi[:, free])
+            k += 1
+
+    residuals = np.linalg.norm(np.einsum('pmk,pck->pcm', A, candidates) - b, axis=2)  # (P, 5)
+    feasible = np.all((candidates >= -_FEASIBILITY_EPS) & (candidates <= hi[:, None, :] + _FEASIBILITY_EPS), axis=2)
+    residuals = np.where(feasible, residuals, np.inf)
+
+    best = np.argmin(residuals, axis=1)
+    rows = np.arange(n_pairs)
+    amounts = np.clip(candidates[rows, best], 0.0, hi)
+    residuals = residuals[rows, best]
+
+    # The optimum is not unique when the columns are linearly dependent (always when only one
+    # macro is missing); settle those pairs where the original per-pair L-BFGS-B solve did
+    gram = col_sq[:, 0] * col_sq[:, 1]
+    for p in np.flatnonzero(gram - cross ** 2 <= _RANK_EPS * gram):
+        amounts[p], residuals[p] = _solve_pair_lbfgsb(A[p], b, hi[p])
+    return amounts, residuals
+
+
+def _solve_pair_lbfgsb(A: np.ndarray, b: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, float]:
+    """One pair solved iteratively from zero amounts (the pre-batching solver)."""
+    res = minimize(lambda x: np.linalg.norm(A @ x - b), np.zeros(2), method='L-BFGS-B',
+                   bounds=[(0., float(upper)) for upper in hi])
+    return res.x, float(res.fun)
+
+
+def solve_bounded(W: np.ndarray, y: np.ndarray, indices: Sequence[int],
+                  upper: Sequence[float]) -> Tuple[np.ndarray, float]:
+    """
+    Bounded least squares for any number of ingredients (exact, via BVLS).
+
+    Returns:
+        (amounts, residual) for the ingredients in `indices`
+    """
+    if len(indices) == 2:
+        amounts, residuals = solve_pairs(W, y, [tuple(indices)], upper)
+        return amounts[0], float(residuals[0])
+    mask = np.asarray(y) > 0
+    b = np.asarray(y, dtype=np.float64)[mask]
+    A = np.asarray(W, dtype=np.float64)[list(indices)][:, mask].T
+    hi = np.asarray(upper, dtype=np.float64)[list(indices)]
+    res = lsq_linear(A, b, bounds=(np.zeros(len(indices)), hi), method='bvls')
+    return res.x, float(np.linalg.norm(A @ res.x - b))
+
+
+def search_combinations(W: np.ndarray, y: np.ndarray, candidates: Sequence[int], k: int,
+                        upper: Sequence[float], max_results: int) -> List[Tuple[Tuple[int, ...], np.ndarray, float]]:
+    """
+    Best `max_results` combinations of `k` ingredients that use every ingredient (all amounts > 0).
+
+    Pairs and small searches are enumerated exhaustively (pairs in one
+    batched solve, which stays cheap for hundreds of ingredients). Larger
+    ones use depth-first branch-and-bound: a node fixing a prefix of
+    the combination can only complete it with ingredients that follow it, and
+    the bounded fit over the prefix plus all of those ingredients is a lower
+    bound on any completion's residual. Nodes whose bound cannot beat the
+    current `max_results`-th best are pruned.
+
+    Returns:
+        List of (indices, amounts, residual), best first; ties keep
+        lexicographic order of the indices
+    """
+    candidates = list(candidates)
+    if k < 1 or len(candidates) < k:
+        return []
+
+    if k == 2 or comb(len(candidates), k) <= EXHAUSTIVE_LIMIT:
+        combos = list(combinations(candidates, k))
+        if k == 2:
+            amounts, residuals = solve_pairs(W, y, combos, upper)
+            solved = list(zip(combos, amounts, residuals))
+        else:
+            solved = [(combo, *solve_bounded(W, y, combo, upper)) for combo in combos]
+        usable = [(combo, x, float(r)) for combo, x, r in solved if np.all(x > 0)]
+        usable.sort(key=lambda s: s[2])
+        return usable[:max_results]
+
+    best: List[Tuple[Tuple[int, ...], np.ndarray, float]] = []
+    slack = _FEASIBILITY_EPS * (1.0 + float(np.linalg.norm(np.clip(y, 0, None))))
+
+    def consider(combo, x, residual):
+        if not np.all(x > 0):
+            return
+        best.append((combo, x, residual))
+        best.sort(key=lambda s: s[2])
+        del best[max_results:]
+
+    def branch(prefix: Tuple[int, ...], start: int):
+        need = k - len(prefix)
+        rest = candidates[start:]
+        if len(rest) < need:
+            return
+        if need == 0:
+            consider(prefix, *solve_bounded(W, y, prefix, upper))
+            return
+        if len(best) >= max_results and len(prefix) + len(rest) > k:
+            _, bound = solve_bounded(W, y, prefix + tuple(rest), upper)
+            if bound >= best[-1][2] - slack:
+                return
+        for offset in range(len(rest) - need + 1):
+            branch(prefix + (rest[offset],), start + offset + 1)
+
+    branch((), 0)
+    return best
@@ -0,0 +1,212 @@
+"""
+Opt-in Request Profiling
+
+Profiles a sample of requests to selected endpoints and keeps the profile
+only when the request turns out slow. This catches rare slow paths, such as
+solver stalls or slow upstream calls, without profiling all traffic.
+
+A request is profiled when either:
+- a random draw falls under PROFILE_SAMPLE_RATE (default 0, i.e. off), or
+- it carries `X-Profile: <PROFILE_TOKEN>` (only when PROFILE_TOKEN is set).
+  These profiles are always written, whatever their latency.
+
+Two profilers are available (PROFILE_MODE):
+- 'cprofile' (default): deterministic cProfile of the request thread,
+  written as a pstats file (`python -m pstats`, snakeviz, ...). Only one
+  cProfile can run at a time, so concurrent candidates are skipped.
+- 'sampling': a helper thread samples the request thread's stack every
+  PROFILE_INTERVAL_MS and writes collapsed stacks
+  ("frame;frame;frame count" lines), which flamegraph.pl and speedscope
+  read directly. Overhead does not depend on call counts.
+
+Work done on other threads, such as background mesh uploads or prefetches,
+is not part of a request's profile.
+
+Profiles go to PROFILE_DIR, which keeps only the newest PROFILE_MAX_FILES
+files.
+
+Configuration (environment variables):
+    PROFILE_SAMPLE_RATE    fraction of requests to profile, 0..1 (default: 0)
+    PROFILE_TOKEN          secret enabling the X-Profile request header (default: unset, header ignored)
+    PROFILE_THRESHOLD_MS   keep sampled profiles of requests at least this slow (default: 1000)
+    PROFILE_MODE           'cprofile' (default) | 'sampling'
+    PROFILE_INTERVAL_MS    stack sampling interval in sampling mode (default: 5)
+    PROFILE_DIR            output directory (default: <tempdir>/aiweb-profiles)
+    PROFILE_MAX_FILES      profiles kept in PROFILE_DIR (default: 50)
+    PROFILE_ENDPOINTS      comma-separated Flask endpoints
+                           (default: api_calculate_recommendation,api_search_food,api_search_food_batch)
+"""
+
+import cProfile
+import hmac
+import itertools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from flask import g, request
+
+from app_logging import get_logger
+
+logger = get_logger('profiling')
+
+try:
+    PROFILE_SAMPLE_RATE = min(1.0, max(0.0, float(os.getenv('PROFILE_SAMPLE_RATE', '0'))))
+except Exception:
+    PROFILE_SAMPLE_RATE = 0.0
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+try:
+    PROFILE_THRESHOLD_MS = max(0.0, float(os.getenv('PROFILE_THRESHOLD_MS', '1000')))
+except Exception:
+    PROFILE_THRESHOLD_MS = 1000.0
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'cprofile').strip().lower()
+try:
+    PROFILE_INTERVAL_MS = max(0.5, float(os.getenv('PROFILE_INTERVAL_MS', '5')))
+except Exception:
+    PROFILE_INTERVAL_MS = 5.0
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'aiweb-profiles'))
+try:
+    PROFILE_MAX_FILES = max(1, int(os.getenv('PROFILE_MAX_FILES', '50')))
+except Exception:
+    PROFILE_MAX_FILES = 50
+PROFILE_ENDPOINTS = frozenset(
+    e.strip() for e in os.getenv(
+        'PROFILE_ENDPOINTS', 'api_calculate_recommendation,api_search_food,api_search_food_batch'
+    ).split(',') if e.strip()
+)
+
+PROFILE_HEADER = 'X-Profile'
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float):
+        """
+        Args:
+            thread_id: threading.get_ident() of the thread to sample
+            interval: Seconds between samples
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# Only one cProfile profiler may be active in the process at a time
+_cprofile_lock = threading.Lock()
+# Distinguishes profiles finished within the same second
+_sequence = itertools.count()
+
+
+def _wants_profile() -> Optional[bool]:
+    """None: do not profile; True: profile and always keep; False: profile, keep if slow."""
+    if request.endpoint not in PROFILE_ENDPOINTS:
+        return None
+    if PROFILE_TOKEN:
+        header = request.headers.get(PROFILE_HEADER)
+        if header and hmac.compare_digest(header, PROFILE_TOKEN):
+            return True
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return False
+    return None
+
+
+def _rotate():
+    """Delete the oldest profiles beyond PROFILE_MAX_FILES."""
+    try:
+        entries = [os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR)]
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:-PROFILE_MAX_FILES]:
+            os.remove(path)
+    except OSError as e:
+        logger.warning("Profile rotation in %s failed: %s", PROFILE_DIR, e)
+
+
+def _start_profile():
+    forced = _wants_profile()
+    if forced is None:
+        return
+    if PROFILE_MODE == 'sampling':
+        profiler = SamplingProfiler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000.0)
+        profiler.start()
+    else:
+        if not _cprofile_lock.acquire(blocking=False):
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:  # another profiler or debugger owns the hook
+            _cprofile_lock.release()
+            logger.warning("cProfile unavailable: %s", e)
+            return
+    g.profile = (profiler, forced, time.perf_counter())
+
+
+def _finish_profile(exc):
+    state = g.pop('profile', None)
+    if state is None:
+        return
+    profiler, forced, start = state
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    if isinstance(profiler, SamplingProfiler):
+        profiler.stop()
+    else:
+        profiler.disable()
+        _cprofile_lock.release()
+    if not forced and elapsed_ms < PROFILE_THRESHOLD_MS:
+        return
+
+    extension = 'collapsed' if isinstance(profiler, SamplingProfiler) else 'prof'
+    name = (f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}-{next(_sequence)}_{request.endpoint}"
+            f"_{elapsed_ms:.0f}ms.{extension}")
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, name)
+        if isinstance(profiler, SamplingProfiler):
+            profiler.dump(path)
+        else:
+            profiler.dump_stats(path)
+        logger.info("Profiled %s %s in %.0f ms -> %s", request.method, request.path, elapsed_ms, path)
+        _rotate()
+    except OSError as e:
+        logger.warning("Writing profile %s failed: %s", name, e)
+
+
+def init_profiling(app):
+    """Register the profiling hooks on a Flask app (no-op unless sampling or the header is enabled)."""
+    if PROFILE_SAMPLE_RATE <= 0 and not PROFILE_TOKEN:
+        return
+    app.before_request(_start_profile)
+    app.teardown_request(_finish_profile)
+    logger.info("Request profiling enabled (mode=%s, rate=%s, threshold=%.0f ms, dir=%s)",
+                PROFILE_MODE, PROFILE_SAMPLE_RATE, PROFILE_THRESHOLD_MS, PROFILE_DIR)
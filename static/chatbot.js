@@ -1,5 +1,16 @@
 // Chatbot JavaScript - handles food input, API calls, and UI updates
 
+// Newline, or a comma (not a thousands separator), ';', '&', '+' or 'and' followed by a quantity.
+// "a"/"an"/"half" only count before another word, and after 'and' only before a unit
+// (MEAL_UNITS mirrors unit_conversion.UNIT_ALIASES).
+const MEAL_UNITS = 'tablespoons|milliliters|tablespoon|milliliter|teaspoons|teaspoon|medium|ounces|pounds|pieces|small|large|ounce|pound|grams|piece|items|units|cups|tbsp|gram|item|unit|eggs|med|big|cup|tsp|lbs|egg|sm|md|lg|ml|oz|lb|g';
+const MEAL_NEXT_QUANTITY = String.raw`\.?\d|[½⅓⅔¼¾⅕⅛⅜⅝⅞]|(?:three|seven|eight|dozen|four|five|nine|one|two|six|ten)\s+[a-z]`;
+const MEAL_SEPARATOR_RE = new RegExp(
+    String.raw`\n|(?:,(?!\d{3}(?!\d))|;|&|\+)\s*(?=${MEAL_NEXT_QUANTITY}|(?:a|an|half)\s+(?!and\b)[a-z])`
+    + String.raw`|\band\b\s*(?=${MEAL_NEXT_QUANTITY}|(?:a|an|half)\s+(?:a\s+)?(?:${MEAL_UNITS})\b)`,
+    'i'
+);
+
 class NutritionChatbot {
     constructor() {
         this.dailyNutrition = {
@@ -296,6 +307,14 @@ Your daily totals have been updated. Keep tracking!`;
             return;
         }
 
+        // Whole meals ("2 eggs, a banana and 100g rice") go to the batch endpoint in one request.
+        // Same rule as the server's meal splitter (food_parser._SPLIT_RE): a separator only starts
+        // a new item when a quantity follows it, so "chicken, grilled" stays one food.
+        if (MEAL_SEPARATOR_RE.test(foodInput.trim())) {
+            await this.handleMealInput(foodInput);
+            return;
+        }
+
         // Show loading state
         const loadingMsg = this.addMessage('🔍 Searching USDA database...', 'bot', true);
 
@@ -354,6 +373,51 @@ Your daily totals have been updated. Keep tracking!`;
         }
     }
 
+    async handleMealInput(foodInput) {
+        const loadingMsg = this.addMessage('🔍 Searching USDA database...', 'bot', true);
+
+        try {
+            const response = await fetch('/api/search-food/batch', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ meal: foodInput })
+            });
+
+            const result = await response.json();
+
+            if (!response.ok) {
+                this.updateMessage(loadingMsg, `❌ ${result.error || 'Unable to find food information'}`);
+                return;
+            }
+
+            const messages = [];
+            for (const item of result.items) {
+                if (!item.success) {
+                    messages.push(`❌ ${item.original_input}: ${item.error || 'Unable to find food information'}`);
+                    continue;
+                }
+                const nutrition = item.nutrition;
+                this.addFoodToDaily(nutrition);
+                messages.push(this.generateFoodResponse(nutrition));
+                this.conversationHistory.push({
+                    input: item.original_input,
+                    nutrition: nutrition,
+                    timestamp: new Date()
+                });
+            }
+            this.updateMessage(loadingMsg, messages.join('\n'));
+
+            this.updateAnalyzeButtonStatus();
+            this.saveData();
+
+        } catch (error) {
+            console.error('Error:', error);
+            this.updateMessage(loadingMsg, '❌ Error processing food. Please try again.');
+        }
+    }
+
     generateFoodResponse(nutrition) {
         return `
 ✅ <strong>${nutrition.food_name}</strong>
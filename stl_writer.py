@@ -0,0 +1,110 @@
+"""
+Binary STL Writer for Cuboid Meshes
+
+Every recommended ingredient is printed as an axis-aligned block, so all
+meshes are the same 12-triangle unit cube scaled by (x, y, z). The unit
+cube's triangles and normals are precomputed once; building any number of
+meshes is one broadcast multiply into a NumPy structured array laid out
+exactly like binary STL records, which is then written to bytes.
+
+Binary STL layout (little endian):
+    80-byte header | uint32 triangle count |
+    per triangle: float32 normal[3], float32 vertices[3][3], uint16 attribute
+"""
+
+import io
+import struct
+from typing import List, Sequence
+
+import numpy as np
+
+STL_RECORD_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vectors', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+
+_UNIT_CUBE_VERTICES = np.array([
+    [0, 0, 0],
+    [1, 0, 0],
+    [1, 1, 0],
+    [0, 1, 0],
+    [0, 0, 1],
+    [1, 0, 1],
+    [1, 1, 1],
+    [0, 1, 1],
+], dtype=np.float64)
+
+_UNIT_CUBE_FACES = np.array([
+    [0, 3, 1],
+    [1, 3, 2],
+    [0, 4, 7],
+    [0, 7, 3],
+    [4, 5, 6],
+    [4, 6, 7],
+    [5, 1, 2],
+    [5, 2, 6],
+    [2, 3, 6],
+    [3, 7, 6],
+    [0, 1, 5],
+    [0, 5, 4],
+])
+
+# (12, 3, 3) triangles of the unit cube and their unit normals. Scaling by a
+# positive (x, y, z) keeps the faces axis-aligned, so the normals never change.
+UNIT_CUBE_TRIANGLES = _UNIT_CUBE_VERTICES[_UNIT_CUBE_FACES]
+_edges = np.cross(UNIT_CUBE_TRIANGLES[:, 1] - UNIT_CUBE_TRIANGLES[:, 0],
+                  UNIT_CUBE_TRIANGLES[:, 2] - UNIT_CUBE_TRIANGLES[:, 0])
+UNIT_CUBE_NORMALS = _edges / np.linalg.norm(_edges, axis=1, keepdims=True)
+del _edges
+
+TRIANGLES_PER_CUBE = len(_UNIT_CUBE_FACES)
+STL_CUBE_SIZE = 80 + 4 + TRIANGLES_PER_CUBE * STL_RECORD_DTYPE.itemsize
+
+
+def _header(name: str) -> bytes:
+    return f"binary STL {name}".encode('ascii', 'replace')[:80].ljust(80, b' ')
+
+
+def cube_records(dims) -> np.ndarray:
+    """
+    STL triangle records for cuboids with the given dimensions.
+
+    Args:
+        dims: (n, 3) array of (x, y, z) sizes, or a single (x, y, z)
+
+    Returns:
+        (n, 12) structured array with STL_RECORD_DTYPE
+    """
+    dims = np.asarray(dims, dtype=np.float64).reshape(-1, 3)
+    records = np.zeros((len(dims), TRIANGLES_PER_CUBE), dtype=STL_RECORD_DTYPE)
+    records['vectors'] = UNIT_CUBE_TRIANGLES[None] * dims[:, None, None, :]
+    records['normal'] = UNIT_CUBE_NORMALS
+    return records
+
+
+def cube_stls(dims, names: Sequence[str] = ()) -> List[bytes]:
+    """
+    Binary STL documents for a batch of cuboids, built in one pass.
+
+    Args:
+        dims: (n, 3) array of (x, y, z) sizes
+        names: Optional per-mesh names written into the STL headers
+
+    Returns:
+        List of n STL documents (bytes)
+    """
+    records = cube_records(dims)
+    names = list(names) or [''] * len(records)
+    count = struct.pack('<I', TRIANGLES_PER_CUBE)
+    return [_header(name) + count + row.tobytes() for name, row in zip(names, records)]
+
+
+def cube_stl(x: float, y: float, z: float, name: str = '') -> bytes:
+    """Binary STL document for one x by y by z cuboid."""
+    return cube_stls([(x, y, z)], [name])[0]
+
+
+def cube_stl_buffer(x: float, y: float, z: float, name: str = '') -> io.BytesIO:
+    """Binary STL for one cuboid in a rewound in-memory file (e.g. for send_file)."""
+    return io.BytesIO(cube_stl(x, y, z, name))
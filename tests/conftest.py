@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Keep main.py off GCS, the shared caches and any local USDA index
+_scratch = tempfile.mkdtemp(prefix='aiweb-tests-')
+os.environ.setdefault('MESH_MODE', 'none')
+os.environ.setdefault('MESH_STORAGE', 'local')
+os.environ.setdefault('MESH_LOCAL_DIR', _scratch)
+os.environ.setdefault('MESH_MANIFEST_PATH', os.path.join(_scratch, 'meshes_manifest.sqlite3'))
+os.environ.setdefault('FOOD_CACHE_BACKEND', 'memory')
+os.environ.setdefault('USDA_INDEX_PATH', os.path.join(_scratch, 'no_usda_index.sqlite3'))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
@@ -0,0 +1,113 @@
+"""/api/search-food/batch: meal splitting, deduplicated lookups, one bulk detail fetch and per-item errors."""
+
+import threading
+
+import pytest
+
+import main
+from food_cache import FoodCache, MemoryCacheBackend
+from food_macros import MacroTable
+
+FOODS = {
+    'eggs': {'fdcId': 1, 'description': 'Egg, whole, raw',
+             'foodNutrients': [{'nutrient': {'name': 'Carbohydrate, by difference'}, 'amount': 1.0},
+                               {'nutrient': {'name': 'Protein'}, 'amount': 12.0},
+                               {'nutrient': {'name': 'Total lipid (fat)'}, 'amount': 10.0}],
+             'foodPortions': [{'gramWeight': 50.0, 'measureUnit': {'name': 'large'}, 'modifier': 'large'}]},
+    'rice': {'fdcId': 2, 'description': 'Rice, white, cooked',
+             'foodNutrients': [{'nutrient': {'name': 'Carbohydrate, by difference'}, 'amount': 28.0},
+                               {'nutrient': {'name': 'Protein'}, 'amount': 3.0},
+                               {'nutrient': {'name': 'Total lipid (fat)'}, 'amount': 0.5}]},
+}
+
+
+class USDAClient:
+    """Search and bulk detail lookups against FOODS; 'offline' searches fail upstream."""
+
+    def __init__(self):
+        self.searches = []
+        self.bulk_requests = []
+        self._lock = threading.Lock()
+
+    def make_request(self, endpoint, params=None, **kwargs):
+        query = params['query']
+        with self._lock:
+            self.searches.append(query)
+        if query == 'offline':
+            return None
+        food = FOODS.get(query)
+        return {'foods': [{'fdcId': food['fdcId'], 'description': food['description']}] if food else []}
+
+    def get_foods(self, endpoint, fdc_ids, **kwargs):
+        self.bulk_requests.append(list(fdc_ids))
+        by_id = {food['fdcId']: food for food in FOODS.values()}
+        return {str(i): by_id[i] for i in fdc_ids if i in by_id}
+
+
+@pytest.fixture
+def usda(monkeypatch):
+    client = USDAClient()
+    backend = MemoryCacheBackend()
+    monkeypatch.setattr(main, 'data_gov_client', client)
+    monkeypatch.setattr(main, '_search_cache', FoodCache(backend, 'search', 3600))
+    monkeypatch.setattr(main, '_nutrition_cache', FoodCache(backend, 'macros', 3600))
+    monkeypatch.setattr(main, '_macro_table', MacroTable(capacity=16))
+    monkeypatch.setattr(main, 'USDA_PREFETCH_TOP_N', 0)
+    return client
+
+
+@pytest.fixture
+def post():
+    client = main.app.test_client()
+
+    def post(body):
+        response = client.post('/api/search-food/batch', json=body)
+        return response.status_code, response.get_json()
+
+    return post
+
+
+def test_meal_is_split_and_resolved(usda, post):
+    status, body = post({'meal': '2 eggs and 100g rice'})
+    assert status == 200 and body['success']
+    eggs, rice = body['items']
+    assert eggs['original_input'] == '2 eggs' and eggs['nutrition']['food_name'] == 'Egg, whole, raw'
+    assert rice['nutrition']['carbs'] == 28.0
+    assert body['totals'] == {key: round(eggs['nutrition'][key] + rice['nutrition'][key], 2)
+                              for key in ('carbs', 'protein', 'fat')}
+
+
+def test_identical_foods_are_looked_up_once_with_one_bulk_fetch(usda, post):
+    status, body = post({'food_inputs': ['2 eggs', '3 eggs', '100g rice', 'Eggs']})
+    assert status == 200 and all(item['success'] for item in body['items'])
+    assert sorted(usda.searches) == ['eggs', 'rice']
+    assert len(usda.bulk_requests) == 1 and sorted(usda.bulk_requests[0]) == [1, 2]
+
+    # Everything is cached now
+    post({'food_inputs': ['1 eggs', '50g rice']})
+    assert len(usda.searches) == 2 and len(usda.bulk_requests) == 1
+
+
+def test_failing_items_do_not_fail_the_batch(usda, post):
+    status, body = post({'food_inputs': ['100g rice', '100g', '1 cup unobtainium', 'offline']})
+    assert status == 200 and body['success']
+    rice, no_name, not_found, upstream = body['items']
+    assert rice['success']
+    assert (no_name['success'], no_name['status']) == (False, 400)
+    assert (not_found['success'], not_found['status']) == (False, 404)
+    assert (upstream['success'], upstream['status']) == (False, 503)
+    assert body['totals']['carbs'] == 28.0
+    assert '' not in usda.searches
+
+
+@pytest.mark.parametrize('body', [{}, {'food_inputs': 'eggs'}, {'food_inputs': ['  ', '']}, {'meal': ''}])
+def test_requests_without_items_are_rejected(usda, post, body):
+    status, payload = post(body)
+    assert status == 400 and 'error' in payload
+
+
+def test_batches_are_capped(usda, post, monkeypatch):
+    monkeypatch.setattr(main, 'MAX_BATCH_ITEMS', 2)
+    status, payload = post({'food_inputs': ['1 egg', '2 eggs', '3 eggs']})
+    assert status == 400 and 'max 2' in payload['error']
+    assert usda.searches == []
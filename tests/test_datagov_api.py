@@ -0,0 +1,130 @@
+"""Request coalescing in DataGovAPIClient."""
+
+import asyncio
+import threading
+import time
+import weakref
+
+import pytest
+
+from datagov_api import DataGovAPIClient, HTTPXTransport, httpx
+
+
+def test_high_priority_requests_do_not_join_low_priority_flights(monkeypatch):
+    client = DataGovAPIClient('test-key')
+    calls = []
+    low_started = threading.Event()
+
+    def send(endpoint, method, use_query_param, priority, **kwargs):
+        calls.append(priority)
+        if priority == 'low':
+            low_started.set()
+            time.sleep(0.2)
+            return None  # shed by the governor
+        return {'ok': True}
+
+    monkeypatch.setattr(client, '_send', send)
+    low = threading.Thread(target=client.make_request, args=('/foods',), kwargs={'priority': 'low'})
+    low.start()
+    low_started.wait(1)
+    assert client.make_request('/foods') == {'ok': True}
+    low.join()
+    assert sorted(calls) == ['high', 'low']
+
+
+def test_identical_requests_are_coalesced(monkeypatch):
+    client = DataGovAPIClient('test-key')
+    calls = []
+    started = threading.Event()
+
+    def send(endpoint, method, use_query_param, priority, **kwargs):
+        calls.append(priority)
+        started.set()
+        time.sleep(0.2)
+        return {'ok': True}
+
+    monkeypatch.setattr(client, '_send', send)
+    results = []
+    first = threading.Thread(target=lambda: results.append(client.make_request('/foods', params={'q': 'egg'})))
+    first.start()
+    started.wait(1)
+    results.append(client.make_request('/foods', params={'q': 'egg'}))
+    first.join()
+    assert results == [{'ok': True}, {'ok': True}]
+    assert calls == ['high']
+
+
+@pytest.mark.skipif(httpx is None, reason='httpx not installed')
+def test_async_clients_close_with_their_event_loop():
+    transport = HTTPXTransport(http2=False)
+    clients = []
+
+    async def use():
+        clients.append(await transport._async_client())
+        assert await transport._async_client() is clients[-1]
+
+    asyncio.run(use())
+    asyncio.run(use())
+    assert clients[0] is not clients[1]
+    assert all(client.is_closed for client in clients)
+    assert len(transport._async_clients) == 0
+
+
+@pytest.mark.skipif(httpx is None, reason='httpx not installed')
+def test_aclose_closes_the_running_loops_client():
+    transport = HTTPXTransport(http2=False)
+
+    async def use():
+        client = await transport._async_client()
+        await transport.aclose()
+        assert client.is_closed
+        assert await transport._async_client() is not client
+
+    asyncio.run(use())
+
+
+@pytest.mark.skipif(httpx is None, reason='httpx not installed')
+def test_clients_of_loops_closed_without_shutdown_are_dropped():
+    transport = HTTPXTransport(http2=False)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(transport._async_client())
+    loop.close()
+
+    asyncio.run(transport._async_client())
+    assert len(transport._async_clients) == 0
+
+
+@pytest.mark.skipif(httpx is None, reason='httpx not installed')
+def test_transport_does_not_keep_finished_loops_alive():
+    transport = HTTPXTransport(http2=False)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(transport._async_client())
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    loop.close()
+    finished = weakref.ref(loop)
+    del loop
+    assert finished() is None
+
+
+def test_prefetch_shares_one_executor_and_close_stops_it(monkeypatch):
+    client = DataGovAPIClient('test-key')
+    monkeypatch.setattr(client, 'get_foods', lambda endpoint, ids, **kwargs: {str(i): {} for i in ids})
+    executor = client._background
+    results = []
+    barrier = threading.Barrier(8)
+
+    def prefetch(i):
+        barrier.wait()
+        client.prefetch_foods('/foods', [i], results.append).result()
+
+    threads = [threading.Thread(target=prefetch, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert client._background is executor
+    assert len(results) == 8
+
+    client.close()
+    with pytest.raises(RuntimeError):
+        client.prefetch_foods('/foods', [1], results.append)
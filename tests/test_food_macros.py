@@ -0,0 +1,133 @@
+"""Macro table expiry and stale-while-revalidate of USDA nutrition."""
+
+import threading
+import time
+
+import pytest
+
+import food_cache
+import main
+from food_cache import FoodCache, MemoryCacheBackend
+from food_macros import FoodMacros, MacroTable
+
+TTL = 100.0
+STALE_TTL = 50.0
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class SyncExecutor:
+    def submit(self, fn):
+        fn()
+
+
+class FoodClient:
+    """Serves /food/{id}; protein grows by one per successful fetch."""
+
+    def __init__(self):
+        self.requests = 0
+        self.fail = False
+
+    def make_request(self, endpoint, **kwargs):
+        self.requests += 1
+        if self.fail:
+            return None
+        return {'description': 'Egg', 'foodNutrients': [
+            {'nutrient': {'name': 'Protein'}, 'amount': float(self.requests)},
+        ]}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def usda(monkeypatch, clock):
+    client = FoodClient()
+    monkeypatch.setattr(main, 'data_gov_client', client)
+    monkeypatch.setattr(main, 'USDA_FOOD_CACHE_TTL', TTL)
+    monkeypatch.setattr(main, '_nutrition_cache', FoodCache(MemoryCacheBackend(), 'macros', TTL, STALE_TTL))
+    monkeypatch.setattr(main, '_macro_table', MacroTable(capacity=8))
+    monkeypatch.setattr(food_cache, '_get_refresh_executor', SyncExecutor)
+    return client
+
+
+def test_table_rows_read_as_missing_after_expiry(clock):
+    table = MacroTable(capacity=2)
+    table.put(FoodMacros(1, 'Egg', 1, 12, 10), expires_at=clock.now + 10)
+    table.put(FoodMacros(2, 'Rice', 28, 3, 0))
+    assert table.get(1).protein == 12 and 1 in table
+    clock.now += 10
+    assert table.get(1) is None and 1 not in table
+    assert table.get(2).carbs == 28  # no expiry
+
+
+def test_expired_macros_are_served_stale_then_revalidated(usda, clock):
+    assert main.get_food_macros(1).protein == 1
+    clock.now += TTL / 2
+    assert main.get_food_macros(1).stale is False
+    assert usda.requests == 1
+
+    # Past the TTL: the stale value is served once and refreshed in the background
+    clock.now += TTL / 2 + 1
+    macros = main.get_food_macros(1)
+    assert (macros.protein, macros.stale) == (1, True)
+    assert usda.requests == 2
+
+    macros = main.get_food_macros(1)
+    assert (macros.protein, macros.stale) == (2, False)
+    assert usda.requests == 2
+
+
+def test_failed_refresh_keeps_serving_stale_until_the_grace_period_ends(usda, clock):
+    main.get_food_macros(1)
+    usda.fail = True
+    clock.now += TTL + 1
+    for _ in range(3):
+        assert main.get_food_macros(1).stale is True
+    # Every stale read retries the refresh; none of them is promoted to fresh
+    assert usda.requests == 4
+
+    clock.now += STALE_TTL
+    assert main.get_food_macros(1) is None
+
+
+def test_reads_never_mix_rows_while_slots_are_reused():
+    # Two slots shared by many foods: every put reuses a slot another reader may be copying
+    table = MacroTable(capacity=2)
+    stop = threading.Event()
+    torn = []
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            table.put(FoodMacros(i % 50, f'food {i % 50}', i % 50, i % 50, i % 50, 100, {'piece': i % 50}))
+            i += 1
+
+    def reader():
+        while not stop.is_set():
+            for fdc_id in range(50):
+                macros = table.get(fdc_id)
+                if macros is not None and not (
+                    macros.description == f'food {fdc_id}' and macros.carbs == fdc_id
+                    and macros.portions == {'piece': fdc_id}
+                ):
+                    torn.append(macros)
+
+    threads = [threading.Thread(target=writer) for _ in range(2)] + [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert torn == []
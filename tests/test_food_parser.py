@@ -0,0 +1,105 @@
+"""Parser checks for food_parser.parse_item and parse_meal."""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from food_parser import ParsedFood, parse_item, parse_meal
+from unit_conversion import UNIT_ALIASES
+
+
+@pytest.mark.parametrize('text, quantity, unit, food_name', [
+    ("100g chicken breast", 100.0, 'g', 'chicken breast'),
+    ("1 medium apple", 1.0, 'medium', 'apple'),
+    ("two eggs", 2.0, 'unit', 'eggs'),
+    ("2 eggs", 2.0, 'unit', 'eggs'),
+    ("1 1/2 cups oats", 1.5, 'cups', 'oats'),
+    ("1/2 cup milk", 0.5, 'cup', 'milk'),
+    ("3/4 lb beef", 0.75, 'lb', 'beef'),
+    ("½ cup milk", 0.5, 'cup', 'milk'),
+    ("1½ cups rice", 1.5, 'cups', 'rice'),
+    ("1,000g rice", 1000.0, 'g', 'rice'),
+    ("a cup of milk", 1.0, 'cup', 'milk'),
+    ("2 boiled eggs", 2.0, 'unit', 'boiled eggs'),
+    ("mac and cheese", 1.0, 'unit', 'mac and cheese'),
+])
+def test_parse_item(text, quantity, unit, food_name):
+    item = parse_item(text)
+    assert item.quantity == pytest.approx(quantity)
+    assert (item.unit, item.food_name) == (unit, food_name)
+
+
+@pytest.mark.parametrize('text', ["100g", "100 g", "2 cups", "a cup", "g", ""])
+def test_parse_item_without_food_name(text):
+    assert parse_item(text).food_name == ''
+
+
+def test_parse_meal():
+    assert parse_meal("2 eggs, 1/2 cup milk and 3/4 lb beef") == (
+        ParsedFood('2 eggs', 2.0, 'unit', 'eggs'),
+        ParsedFood('1/2 cup milk', 0.5, 'cup', 'milk'),
+        ParsedFood('3/4 lb beef', 0.75, 'lb', 'beef'),
+    )
+    assert [item.text for item in parse_meal("mac and cheese and 2 eggs")] == ['mac and cheese', '2 eggs']
+
+
+@pytest.mark.parametrize('text', ["chicken, grilled", "salt & pepper chicken", "mac and cheese", "1,000g rice"])
+def test_parse_meal_keeps_single_foods(text):
+    assert [item.text for item in parse_meal(text)] == [text]
+
+
+@pytest.mark.parametrize('text', [
+    "coffee with half and half", "coffee, half and half", "toast and a coffee", "rice and two",
+])
+def test_parse_meal_ignores_articles_without_a_quantity(text):
+    assert [item.text for item in parse_meal(text)] == [text]
+
+
+@pytest.mark.parametrize('text, parts', [
+    ("toast and a cup of coffee", ['toast', 'a cup of coffee']),
+    ("eggs and half a cup of milk", ['eggs', 'half a cup of milk']),
+    ("rice and two eggs", ['rice', 'two eggs']),
+    ("rice, .5 cup milk", ['rice', '.5 cup milk']),
+])
+def test_parse_meal_splits_before_quantities(text, parts):
+    assert [item.text for item in parse_meal(text)] == parts
+
+
+@pytest.mark.parametrize('text, quantity, unit, food_name', [
+    (".5 cup rice", 0.5, 'cup', 'rice'),
+    ("half a cup of milk", 0.5, 'cup', 'milk'),
+    ("half an apple", 0.5, 'unit', 'apple'),
+])
+def test_parse_item_fractional_quantities(text, quantity, unit, food_name):
+    item = parse_item(text)
+    assert (item.quantity, item.unit, item.food_name) == (quantity, unit, food_name)
+
+
+CHATBOT_JS = os.path.join(os.path.dirname(__file__), '..', 'static', 'chatbot.js')
+SEPARATOR_CASES = [
+    "2 eggs, a banana and 100g rice", "mac and cheese", "chicken, grilled", "salt & pepper chicken",
+    "1,000g rice", "coffee with half and half", "coffee, half and half", "toast and a coffee",
+    "toast and a cup of coffee", "rice and two eggs", "rice and two", "rice, .5 cup milk", "tea; 1 biscuit",
+    "eggs\nbacon",
+]
+
+
+def test_chatbot_units_mirror_unit_aliases():
+    with open(CHATBOT_JS, encoding='utf-8') as f:
+        units = re.search(r"const MEAL_UNITS = '([^']*)';", f.read()).group(1)
+    assert set(units.split('|')) == set(UNIT_ALIASES)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_chatbot_meal_detection_matches_the_server_split():
+    with open(CHATBOT_JS, encoding='utf-8') as f:
+        source = f.read()
+    constants = source[:source.index('class NutritionChatbot')]
+    script = constants + "\nconsole.log(JSON.stringify(JSON.parse(process.argv[1]).map(t => MEAL_SEPARATOR_RE.test(t.trim()))));"
+    result = subprocess.run(['node', '-e', script, json.dumps(SEPARATOR_CASES)],
+                            capture_output=True, text=True, timeout=60, check=True)
+    assert json.loads(result.stdout) == [len(parse_meal(text)) > 1 for text in SEPARATOR_CASES]
@@ -0,0 +1,65 @@
+"""Content-addressed mesh names and deduplicated mesh generation."""
+
+import pytest
+
+import main
+from food_cache import MemoryCacheBackend
+from mesh_storage import LocalMeshStore, MeshUploader
+from mesh_tokens import content_mesh_hash, content_mesh_name
+
+
+def test_content_names_depend_only_on_food_and_rounded_dimensions():
+    name = content_mesh_name('Chicken Breast', 150, 130, 22.5)
+    assert name == content_mesh_name('Chicken Breast', 150.001, 129.999, 22.5)
+    assert name.startswith('Chicken-Breast_') and name.endswith('.stl')
+    assert len({name, content_mesh_name('Chicken Breast', 150, 130, 22.51),
+                content_mesh_name('Avocado', 150, 130, 22.5)}) == 3
+
+
+def test_content_hash_is_read_back_from_content_names_only():
+    name = content_mesh_name('Avocado', 10, 20, 30)
+    assert content_mesh_hash(name) == name[len('Avocado_'):-len('.stl')]
+    assert content_mesh_hash('Avocado.stl') is None
+    assert content_mesh_hash('Avocado_10.00x20.00x30.00_' + '0' * 32 + '.stl') is None
+
+
+@pytest.fixture
+def meshes(monkeypatch, tmp_path):
+    """Mesh generation into a scratch store; returns the names of generated STLs."""
+    store = LocalMeshStore(str(tmp_path))
+    uploader = MeshUploader(store, workers=1)
+    monkeypatch.setattr(main, 'MESH_MODE', 'all')
+    monkeypatch.setattr(main, '_mesh_store', store)
+    monkeypatch.setattr(main, '_mesh_uploader', uploader)
+    monkeypatch.setattr(main, '_mesh_state', MemoryCacheBackend(max_entries=100))
+    generated = []
+    cube_stls = main.cube_stls
+
+    def spy(dims, names=()):
+        generated.extend(names)
+        return cube_stls(dims, names)
+
+    monkeypatch.setattr(main, 'cube_stls', spy)
+    yield generated, store
+    uploader.shutdown()
+
+
+def test_identical_blocks_are_generated_and_stored_once(meshes):
+    generated, store = meshes
+    same = content_mesh_name('Avocado', 1, 1, 1)
+    other = content_mesh_name('Avocado', 2, 2, 2)
+    dims = main.mesh_generation_batch([(same, 100, 0.63), (same, 100, 0.63), (other, 200, 0.63)])
+    assert dims[0] == dims[1] != dims[2]
+    assert sorted(generated) == sorted([same, other])
+    main._mesh_uploader.shutdown()
+    assert store.exists(same) and store.exists(other)
+
+
+def test_meshes_already_in_storage_are_not_generated_again(meshes):
+    generated, store = meshes
+    name = content_mesh_name('Avocado', 1, 1, 1)
+    store.put(name, b'solid existing\nendsolid existing\n')
+    main.mesh_generation_batch([(name, 100, 0.63)])
+    assert generated == []
+    assert store.read(name).startswith(b'solid existing')
+
@@ -0,0 +1,68 @@
+"""Mesh manifest stores: upserts, lookups and expiry."""
+
+import time
+
+import pytest
+
+import mesh_manifest
+from mesh_manifest import MemoryMeshManifest, SQLiteMeshManifest
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def manifest(request, tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(mesh_manifest, 'LEGACY_MANIFEST_PATH', str(tmp_path / 'no_legacy.json'))
+    if request.param == 'memory':
+        return MemoryMeshManifest(ttl=100)
+    return SQLiteMeshManifest(str(tmp_path / 'manifest.sqlite3'), ttl=100, purge_interval=0)
+
+
+def test_upserts_refresh_entries(manifest, clock):
+    manifest.upsert_many([('a.stl', 10, 1.0), ('b.stl', 20, 0.5)])
+    assert manifest.get('a.stl') == {'amount': 10.0, 'density': 1.0}
+    clock.now += 60
+    manifest.upsert_many([('a.stl', 11, 1.1)])
+    assert manifest.get('a.stl') == {'amount': 11.0, 'density': 1.1}
+    assert manifest.get('missing.stl') is None
+
+
+def test_entries_expire_after_their_last_upsert(manifest, clock):
+    manifest.upsert_many([('a.stl', 10, 1.0), ('b.stl', 20, 0.5)])
+    clock.now += 60
+    manifest.upsert_many([('a.stl', 10, 1.0)])
+    clock.now += 60
+    assert manifest.get('b.stl') is None
+    assert manifest.get('a.stl') is not None
+
+    # The next write purges what expired
+    manifest.upsert_many([('c.stl', 30, 0.9)])
+    assert len(manifest) == 2
+    clock.now += 101
+    manifest.upsert_many([('d.stl', 40, 1.2)])
+    assert len(manifest) == 1
+
+
+def test_memory_upserts_only_visit_expired_entries(clock):
+    manifest = MemoryMeshManifest(ttl=100)
+    manifest.upsert_many((f'{i}.stl', i, 1.0) for i in range(1000))
+    clock.now += 50
+    manifest.upsert_many([('0.stl', 0, 1.0)])
+    # Refreshed entries move to the back, so the oldest entry is always first
+    assert next(iter(manifest._entries)) == '1.stl'
+    clock.now += 51
+    manifest.upsert_many([('new.stl', 1, 1.0)])
+    assert list(manifest._entries) == ['0.stl', 'new.stl']
@@ -0,0 +1,129 @@
+"""Mesh stores and the background MeshUploader: retries, overflow to inline uploads and counters."""
+
+import threading
+
+import pytest
+
+from mesh_storage import GCSMeshStore, LocalMeshStore, MeshUploader
+
+
+class FlakyStore:
+    """put() fails `failures` times per name before it succeeds; `gate` can hold uploads."""
+
+    def __init__(self, failures=0, gate=None):
+        self.failures = failures
+        self.gate = gate
+        self.attempts = {}
+        self.data = {}
+        self.threads = {}
+
+    def put(self, name, data):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.attempts[name] = self.attempts.get(name, 0) + 1
+        self.threads[name] = threading.current_thread().name
+        if self.attempts[name] <= self.failures:
+            raise ConnectionError('upload failed')
+        self.data[name] = data
+
+
+def test_failed_uploads_are_retried_with_backoff():
+    store = FlakyStore(failures=2)
+    uploader = MeshUploader(store, workers=1, retries=3, backoff=0.001)
+    done = []
+    assert uploader.submit('a.stl', b'x', on_done=lambda name, ok: done.append((name, ok))).result(5) is True
+    assert store.attempts['a.stl'] == 3 and store.data['a.stl'] == b'x'
+    assert done == [('a.stl', True)]
+    stats = uploader.stats()
+    assert (stats['submitted'], stats['succeeded'], stats['failed'], stats['retried']) == (1, 1, 0, 2)
+
+
+def test_uploads_give_up_after_the_last_retry():
+    store = FlakyStore(failures=10)
+    uploader = MeshUploader(store, workers=1, retries=2, backoff=0.001)
+    done = []
+    assert uploader.submit('a.stl', b'x', on_done=lambda name, ok: done.append(ok)).result(5) is False
+    assert store.attempts['a.stl'] == 3
+    assert done == [False]
+    assert uploader.stats()['failed'] == 1
+    assert not uploader.pending('a.stl')
+
+
+def test_a_name_in_flight_is_uploaded_once():
+    gate = threading.Event()
+    store = FlakyStore(gate=gate)
+    uploader = MeshUploader(store, workers=1)
+    first = uploader.submit('a.stl', b'x')
+    assert uploader.pending('a.stl')
+    assert uploader.submit('a.stl', b'x') is first
+    gate.set()
+    assert first.result(5) is True
+    assert store.attempts['a.stl'] == 1
+    assert uploader.stats()['submitted'] == 1
+    assert not uploader.pending('a.stl')
+
+
+def test_full_queue_uploads_inline():
+    gate = threading.Event()
+    store = FlakyStore(gate=gate)
+    uploader = MeshUploader(store, workers=1, max_queued=1)
+    queued = [uploader.submit('a.stl', b'a'), uploader.submit('b.stl', b'b')]
+
+    # One running plus one queued: the next upload runs in this thread
+    store.gate = None
+    inline = uploader.submit('c.stl', b'c')
+    assert inline.done() and inline.result() is True
+    assert store.threads['c.stl'] == threading.current_thread().name
+    gate.set()
+    assert all(future.result(5) for future in queued)
+    stats = uploader.stats()
+    assert (stats['submitted'], stats['inline'], stats['succeeded'], stats['pending']) == (3, 1, 3, 0)
+
+
+def test_local_store_writes_reads_and_streams(tmp_path):
+    store = LocalMeshStore(str(tmp_path))
+    assert not store.exists('a.stl') and store.read('a.stl') is None and store.stream('a.stl') is None
+    store.put('a.stl', b'solid a\nendsolid a\n')
+    assert store.exists('a.stl') and store.read('a.stl') == b'solid a\nendsolid a\n'
+    path, size, modified = store.stream('a.stl')
+    assert path == str(tmp_path / 'a.stl') and size == 19 and modified > 0
+    assert [p.name for p in tmp_path.iterdir()] == ['a.stl']  # no partial files left
+
+
+@pytest.mark.parametrize('name', ['', '.', '..', '../a.stl', 'dir/a.stl'])
+def test_local_store_rejects_paths(tmp_path, name):
+    with pytest.raises(ValueError):
+        LocalMeshStore(str(tmp_path)).put(name, b'x')
+
+
+def test_gcs_store_uploads_under_the_prefix_with_the_given_client():
+    calls = []
+
+    class Blob:
+        def __init__(self, name):
+            self.name = name
+
+        def upload_from_string(self, data, content_type):
+            calls.append(('upload', self.name, data, content_type))
+
+        def make_public(self):
+            calls.append(('public', self.name))
+
+    class Bucket:
+        def __init__(self, name):
+            self.name = name
+
+        def blob(self, name):
+            return Blob(f'{self.name}/{name}')
+
+    class Client:
+        def bucket(self, name):
+            return Bucket(name)
+
+    GCSMeshStore('bucket', client=Client()).put('a.stl', b'x')
+    GCSMeshStore('bucket', make_public=False, client=Client()).put('b.stl', b'y')
+    assert calls == [
+        ('upload', 'bucket/meshes/a.stl', b'x', 'application/octet-stream'),
+        ('public', 'bucket/meshes/a.stl'),
+        ('upload', 'bucket/meshes/b.stl', b'y', 'application/octet-stream'),
+    ]
@@ -0,0 +1,72 @@
+"""Signed mesh tokens and the MESH_MODE=lazy secret requirement."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import mesh_tokens
+from mesh_tokens import make_mesh_token, parse_mesh_token
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SECRET = 'a' * 64
+
+
+def run_python(code, **env):
+    """Run `code` in a fresh interpreter (another worker); returns the CompletedProcess."""
+    full_env = {key: value for key, value in os.environ.items() if key != 'MESH_TOKEN_SECRET'}
+    full_env.update(env)
+    return subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, env=full_env,
+                          capture_output=True, text=True, timeout=60)
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setattr(mesh_tokens, 'MESH_TOKEN_SECRET', SECRET)
+    monkeypatch.setattr(mesh_tokens, 'MESH_TOKEN_SECRET_CONFIGURED', True)
+
+
+def test_minted_tokens_verify(secret):
+    token = make_mesh_token('Chicken Breast', 150, 130.004, 22.5)
+    assert token.startswith('Chicken-Breast_150.00x130.00x22.50_') and token.endswith('.stl')
+    assert token == make_mesh_token('Chicken Breast', 150, 130.004, 22.5)
+    slug, x, y, z, signature = parse_mesh_token(token)
+    assert (slug, x, y, z) == ('Chicken-Breast', 150.0, 130.0, 22.5)
+    assert token == f"Chicken-Breast_150.00x130.00x22.50_{signature}.stl"
+
+
+@pytest.mark.parametrize('tamper', [
+    lambda token: token.replace('150.00', '151.00'),
+    lambda token: token.replace('Chicken-Breast', 'Beef'),
+    lambda token: token[:-5] + ('0' if token[-5] != '0' else '1') + '.stl',
+    lambda token: token.replace('.stl', '.obj'),
+    lambda token: '../' + token,
+])
+def test_tampered_tokens_are_rejected(secret, tamper):
+    assert parse_mesh_token(tamper(make_mesh_token('Chicken Breast', 150, 130, 22.5))) is None
+
+
+def test_tokens_verify_across_processes_with_the_same_secret(secret):
+    minted = run_python("from mesh_tokens import make_mesh_token; print(make_mesh_token('Avocado', 10, 20, 30))",
+                        MESH_TOKEN_SECRET=SECRET)
+    assert minted.returncode == 0, minted.stderr
+    token = minted.stdout.strip()
+    assert parse_mesh_token(token) is not None
+
+    other = run_python(f"from mesh_tokens import parse_mesh_token; print(parse_mesh_token({token!r}) is not None)",
+                       MESH_TOKEN_SECRET='b' * 64)
+    assert other.stdout.strip() == 'False'
+
+
+def test_lazy_mode_refuses_to_start_without_a_secret():
+    result = run_python('import main', MESH_MODE='lazy')
+    assert result.returncode != 0
+    assert 'MESH_TOKEN_SECRET' in result.stderr
+
+    result = run_python('import main', MESH_MODE='lazy', MESH_TOKEN_SECRET=SECRET)
+    assert result.returncode == 0, result.stderr
+
+
+def test_other_modes_start_without_a_secret():
+    assert run_python('import main', MESH_MODE='none').returncode == 0
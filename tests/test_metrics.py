@@ -0,0 +1,133 @@
+"""Metric rendering, stage timers and the /metrics endpoint."""
+
+import re
+
+import pytest
+
+import main
+from metrics import CONTENT_TYPE, STAGE_SECONDS, Registry, cache_families, stage_timer
+
+SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[^}]*\})? \S+$')
+
+
+def samples(text):
+    """Sample line -> value, skipping comments."""
+    result = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            key, value = line.rsplit(' ', 1)
+            result[key] = value
+    return result
+
+
+def stage_count(stage):
+    return int(samples('\n'.join(STAGE_SECONDS.render())).get(
+        f'aiweb_stage_seconds_count{{stage="{stage}"}}', 0))
+
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+
+def test_registry_renders_counters_and_gauges_with_escaped_labels():
+    registry = Registry()
+    counter = registry.counter('t_total', 'Things.', ('kind',))
+    counter.inc('a "quoted"\nvalue')
+    counter.inc('plain', amount=2)
+    registry.gauge('t_level', 'Level.').set(1.5)
+
+    text = registry.render()
+    assert '# HELP t_total Things.\n# TYPE t_total counter' in text
+    values = samples(text)
+    assert values['t_total{kind="a \\"quoted\\"\\nvalue"}'] == '1'
+    assert values['t_total{kind="plain"}'] == '2'
+    assert values['t_level'] == '1.5'
+    assert registry.counter('t_total', 'ignored', ('kind',)) is counter
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    registry = Registry()
+    histogram = registry.histogram('t_seconds', 'Latency.', ('stage',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, 'x')
+
+    values = samples(registry.render())
+    assert values['t_seconds_bucket{stage="x",le="0.1"}'] == '2'
+    assert values['t_seconds_bucket{stage="x",le="1.0"}'] == '3'
+    assert values['t_seconds_bucket{stage="x",le="+Inf"}'] == '4'
+    assert float(values['t_seconds_sum{stage="x"}']) == pytest.approx(3.65)
+    assert values['t_seconds_count{stage="x"}'] == '4'
+
+
+def test_failing_collector_is_reported_and_others_still_render():
+    registry = Registry()
+
+    def broken():
+        raise ValueError('boom')
+
+    registry.register_collector(broken)
+    registry.register_collector(lambda: [('t_up', 'gauge', 'Up.', [({}, 1), ({'skip': 'x'}, None)])])
+
+    text = registry.render()
+    assert '# collector broken failed: ValueError' in text
+    assert samples(text) == {'t_up': '1'}
+
+
+def test_stage_timer_as_context_manager_and_decorator():
+    before = stage_count('test_block'), stage_count('test_func')
+
+    with stage_timer('test_block'):
+        pass
+
+    @stage_timer('test_func')
+    def work(x):
+        if x < 0:
+            raise ValueError(x)
+        return x * 2
+
+    assert work(2) == 4
+    with pytest.raises(ValueError):
+        work(-1)
+    assert work.__name__ == 'work'
+
+    assert (stage_count('test_block'), stage_count('test_func')) == (before[0] + 1, before[1] + 2)
+
+
+def test_cache_families_ratio_counts_stale_hits_and_skips_missing_caches():
+    families = {name: samples for name, _, _, samples in cache_families({
+        'a': {'hits': 2, 'stale_hits': 1, 'misses': 1, 'entries': 3},
+        'b': {'hits': 0, 'misses': 0},
+        'off': None,
+    })}
+    assert families['aiweb_cache_hit_ratio'] == [({'cache': 'a'}, 0.75), ({'cache': 'b'}, 0.0)]
+    assert families['aiweb_cache_entries'] == [({'cache': 'a'}, 3), ({'cache': 'b'}, None)]
+
+
+def test_metrics_endpoint_counts_requests_and_exposes_app_families(client):
+    def health_count(text):
+        return int(samples(text).get('aiweb_requests_total{endpoint="health",status="200"}', 0))
+
+    before = health_count(client.get('/metrics').get_data(as_text=True))
+    assert client.get('/health').status_code == 200
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == CONTENT_TYPE
+    text = response.get_data(as_text=True)
+
+    assert health_count(text) == before + 1
+    assert 'aiweb_request_seconds_count{endpoint="health"}' in text
+    assert re.search(r'^aiweb_process_info\{pid="\d+"\} 1$', text, re.M)
+    for family in ('aiweb_cache_hits_total', 'aiweb_upstream_quota_limit', 'aiweb_mesh_uploads_pending'):
+        assert f'# TYPE {family} ' in text
+    assert 'aiweb_cache_hits_total{cache="usda_search"}' in text
+    assert '# collector' not in text
+    for line in text.splitlines():
+        assert line.startswith('#') or SAMPLE_RE.match(line), line
+
+
+def test_unmatched_requests_are_counted_under_one_label(client):
+    assert client.get('/no-such-page').status_code == 404
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'aiweb_requests_total{endpoint="unmatched",status="404"}' in text
@@ -0,0 +1,42 @@
+"""recommend() regression checks against the recommendations of the original per-pair L-BFGS-B solver."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+import main
+from nutrient_solver import solve_pairs
+
+# recommend() results of the original solver (scipy.optimize.minimize per pair) for one person
+# across 12 intakes x 4 diets x 2 preferences: [args, [[[[name, grams], ...], carbs, protein, fat], ...]]
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'recommend_baseline.json'), encoding='utf-8') as f:
+    BASELINE = json.load(f)
+
+# L-BFGS-B stopped up to ~1% short of the exact optimum on a few unique-optimum pairs
+REL_TOL = 0.015
+ABS_TOL = 0.05
+
+
+@pytest.mark.parametrize('case', BASELINE, ids=lambda case: '-'.join(str(a) for a in case['args'][4:]))
+def test_recommend_matches_original_solver(case, monkeypatch):
+    monkeypatch.setattr(main, '_recommendation_cache', None)
+    results = main.recommend(*case['args'])['results']
+    assert len(results) == len(case['results'])
+    for (meshes, *_), (expected, *_) in zip(results, case['results']):
+        assert [m['name'] for m in meshes] == [name for name, _ in expected]
+        for m, (_, grams) in zip(meshes, expected):
+            assert float(m['gram']) == pytest.approx(grams, rel=REL_TOL, abs=ABS_TOL)
+
+
+def test_single_missing_macro_keeps_useful_amounts():
+    # Only carbohydrates missing: every split between the two foods is optimal, and the
+    # original solver did not shrink Chicken Breast to a sliver of a gram
+    W = np.array([[17, 1.56, 0.05], [11.2, 6.6, 0.61], [1.4, 1.38, 12.1], [0.06, 19.8, 1.15]]) * 0.01
+    y = np.array([51.0, -3.0, -35.0])
+    upper = [main.MAX_VOLUME / d for d in (0.81, 1.182, 0.63, 0.82)]
+    amounts, residuals = solve_pairs(W, y, [(0, 3)], upper)
+    assert residuals[0] < 1e-3
+    assert W[0, 0] * amounts[0, 0] + W[3, 0] * amounts[0, 1] == pytest.approx(51.0, abs=1e-3)
+    assert amounts[0, 1] > 5.0
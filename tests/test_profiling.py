@@ -0,0 +1,130 @@
+"""Profiling triggers: sample rate, X-Profile token, latency threshold, modes and rotation."""
+
+import os
+import time
+
+import pytest
+from flask import Flask
+
+import profiling
+
+TOKEN = 'profile-secret'
+
+
+@pytest.fixture
+def profile_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(profiling, 'PROFILE_ENDPOINTS', frozenset({'slow'}))
+    monkeypatch.setattr(profiling, 'PROFILE_SAMPLE_RATE', 0.0)
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', '')
+    monkeypatch.setattr(profiling, 'PROFILE_THRESHOLD_MS', 1000.0)
+    monkeypatch.setattr(profiling, 'PROFILE_MODE', 'cprofile')
+    return tmp_path
+
+
+def make_client():
+    app = Flask(__name__)
+
+    @app.route('/slow')
+    def slow():
+        time.sleep(0.03)
+        return 'ok'
+
+    @app.route('/other')
+    def other():
+        return 'ok'
+
+    profiling.init_profiling(app)
+    return app.test_client()
+
+
+def profiles(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_disabled_profiling_registers_no_hooks(profile_dir):
+    app = Flask(__name__)
+    profiling.init_profiling(app)
+    assert not app.before_request_funcs and not app.teardown_request_funcs
+
+
+def test_token_header_profiles_fast_requests(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', TOKEN)
+    client = make_client()
+
+    assert client.get('/slow').status_code == 200
+    assert client.get('/slow', headers={'X-Profile': 'wrong'}).status_code == 200
+    assert profiles(profile_dir) == []
+
+    assert client.get('/slow', headers={'X-Profile': TOKEN}).status_code == 200
+    [name] = profiles(profile_dir)
+    assert name.endswith('.prof') and '_slow_' in name
+
+
+def test_header_is_ignored_without_a_configured_token(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_SAMPLE_RATE', 1e-9)
+    monkeypatch.setattr(profiling.random, 'random', lambda: 0.5)
+    client = make_client()
+    client.get('/slow', headers={'X-Profile': ''})
+    client.get('/slow', headers={'X-Profile': 'anything'})
+    assert profiles(profile_dir) == []
+
+
+def test_sampled_requests_are_kept_only_when_slow(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_SAMPLE_RATE', 1.0)
+    client = make_client()
+
+    client.get('/slow')
+    assert profiles(profile_dir) == []
+
+    monkeypatch.setattr(profiling, 'PROFILE_THRESHOLD_MS', 10.0)
+    client.get('/slow')
+    client.get('/other')
+    [name] = profiles(profile_dir)
+    assert '_slow_' in name
+
+
+def test_cprofile_candidates_are_skipped_while_another_is_running(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', TOKEN)
+    client = make_client()
+
+    with profiling._cprofile_lock:
+        client.get('/slow', headers={'X-Profile': TOKEN})
+    assert profiles(profile_dir) == []
+
+    client.get('/slow', headers={'X-Profile': TOKEN})
+    assert len(profiles(profile_dir)) == 1
+    assert not profiling._cprofile_lock.locked()
+
+
+def test_sampling_mode_writes_collapsed_stacks(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', TOKEN)
+    monkeypatch.setattr(profiling, 'PROFILE_MODE', 'sampling')
+    monkeypatch.setattr(profiling, 'PROFILE_INTERVAL_MS', 1.0)
+    client = make_client()
+
+    client.get('/slow', headers={'X-Profile': TOKEN})
+    [name] = profiles(profile_dir)
+    assert name.endswith('.collapsed')
+    with open(profile_dir / name, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+    assert any('slow (test_profiling.py:' in line for line in lines)
+
+
+def test_rotation_keeps_only_the_newest_profiles(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', TOKEN)
+    monkeypatch.setattr(profiling, 'PROFILE_MAX_FILES', 2)
+    for age, name in enumerate(('old-a.prof', 'old-b.prof')):
+        path = profile_dir / name
+        path.write_bytes(b'')
+        os.utime(path, (1000 + age, 1000 + age))
+    client = make_client()
+
+    client.get('/slow', headers={'X-Profile': TOKEN})
+    names = profiles(profile_dir)
+    assert len(names) == 2
+    assert 'old-a.prof' not in names and 'old-b.prof' in names
@@ -0,0 +1,136 @@
+"""Memoized recommendations: quantized cache key, LRU eviction, mesh reuse and RECOMMEND_CACHE_SIZE=0."""
+
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+import main
+from food_cache import MemoryCacheBackend
+from mesh_manifest import MemoryMeshManifest
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# gender, age, height, weight, carbohydrate, protein, fat, activity, diet, preference
+PROFILE = (0, 30, 175, 70, 40.2, 30.1, 10.4, 1, 0, 0)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = MemoryCacheBackend(max_entries=2)
+    monkeypatch.setattr(main, '_recommendation_cache', cache)
+    monkeypatch.setattr(main, 'RECOMMEND_CACHE_QUANTUM', 1.0)
+    return cache
+
+
+@pytest.fixture
+def solver_gaps(monkeypatch):
+    """Nutrient gaps handed to the solver, one per cache miss."""
+    gaps = []
+    search = main.search_combinations
+
+    def spy(W, y, *args):
+        gaps.append(np.array(y))
+        return search(W, y, *args)
+
+    monkeypatch.setattr(main, 'search_combinations', spy)
+    return gaps
+
+
+def with_intake(carbohydrate, protein, fat, diet=0):
+    return PROFILE[:4] + (carbohydrate, protein, fat) + PROFILE[7:8] + (diet,) + PROFILE[9:]
+
+
+def test_solver_runs_on_the_gap_rounded_to_the_quantum(cache, solver_gaps):
+    result = main.recommend(*PROFILE)
+    needed = np.array([result['carbohydrate_needed'], result['protein_needed'], result['fat_needed']])
+    assert len(solver_gaps) == 1
+    assert np.array_equal(solver_gaps[0], np.round(solver_gaps[0]))
+    assert np.all(np.abs(solver_gaps[0] - needed) <= 0.5 + 0.01)
+
+
+def test_profiles_within_the_quantum_share_an_entry(cache, solver_gaps):
+    first = main.recommend(*with_intake(40.2, 30.1, 10.4))['results']
+    second = main.recommend(*with_intake(40.21, 30.09, 10.41))['results']
+    assert second == first
+    assert len(solver_gaps) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    main.recommend(*with_intake(45.0, 30.1, 10.4))
+    assert len(solver_gaps) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_without_quantum_the_exact_gap_is_solved(cache, solver_gaps, monkeypatch):
+    monkeypatch.setattr(main, 'RECOMMEND_CACHE_QUANTUM', 0.0)
+    main.recommend(*with_intake(40.2, 30.1, 10.4))
+    main.recommend(*with_intake(40.3, 30.0, 10.35))
+    assert len(solver_gaps) == 2
+    assert not np.array_equal(solver_gaps[0], np.round(solver_gaps[0]))
+
+
+def test_least_recently_used_entries_are_evicted(cache, solver_gaps):
+    first, second, third = (with_intake(c, 30, 10) for c in (10, 50, 90))
+    main.recommend(*first)
+    main.recommend(*second)
+    main.recommend(*first)      # hit: `second` is now the least recently used
+    main.recommend(*third)      # evicts `second`
+    assert (cache.hits, cache.misses, cache.evictions, len(cache)) == (1, 3, 1, 2)
+
+    main.recommend(*first)
+    assert len(solver_gaps) == 3
+    main.recommend(*second)
+    assert len(solver_gaps) == 4
+    assert cache.evictions == 2
+
+
+def test_cache_hits_reuse_the_stored_meshes(cache, monkeypatch):
+    monkeypatch.setattr(main, 'MESH_MODE', 'all')
+    monkeypatch.setattr(main, '_mesh_state', MemoryCacheBackend(max_entries=100))
+    monkeypatch.setattr(main, '_mesh_manifest', MemoryMeshManifest())
+    generated = []
+    cube_stls = main.cube_stls
+
+    def spy(dims, names=()):
+        generated.extend(names)
+        return cube_stls(dims, names)
+
+    monkeypatch.setattr(main, 'cube_stls', spy)
+
+    def wait_for_uploads():
+        while main._mesh_uploader.stats()['pending']:
+            time.sleep(0.01)
+
+    results = main.recommend(*PROFILE)['results']
+    names = [mesh['mesh'] for meshes, *_ in results for mesh in meshes]
+    assert names and sorted(generated) == sorted(set(names))
+    wait_for_uploads()
+
+    assert main.recommend(*PROFILE)['results'] == results
+    assert sorted(generated) == sorted(set(names))  # nothing regenerated
+
+    # A hit after this process forgot its meshes re-records them and finds them in storage
+    main._mesh_state.clear()
+    assert main.recommend(*PROFILE)['results'] == results
+    assert sorted(generated) == sorted(set(names))
+    assert all(main._mesh_manifest.get(name) is not None for name in names)
+
+
+def test_disabled_cache_solves_every_request(monkeypatch, solver_gaps):
+    monkeypatch.setattr(main, '_recommendation_cache', None)
+    main.recommend(*PROFILE)
+    main.recommend(*PROFILE)
+    assert len(solver_gaps) == 2
+    assert not np.array_equal(solver_gaps[0], np.round(solver_gaps[0]))
+
+
+def test_recommend_cache_size_zero_disables_the_cache():
+    code = ("import main; print(main._recommendation_cache is None, "
+            "bool(main.recommend(0, 30, 175, 70, 0, 0, 0, 1, 0, 0)['results']))")
+    env = dict(os.environ, RECOMMEND_CACHE_SIZE='0')
+    result = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, env=env, capture_output=True, text=True,
+                            timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ['True', 'True']
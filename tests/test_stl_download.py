@@ -0,0 +1,117 @@
+"""/download-stl: streaming, HTTP Range, conditional GET and regeneration of missing meshes."""
+
+import struct
+
+import pytest
+
+import main
+import mesh_tokens
+from mesh_manifest import MemoryMeshManifest
+from mesh_storage import LocalMeshStore, MeshUploader
+from mesh_tokens import content_mesh_name, make_mesh_token
+
+DATA = b'solid mesh\n' + b'facet normal 0 0 1\n' * 100 + b'endsolid mesh\n'
+
+
+class ReaderStore(LocalMeshStore):
+    """Serves stored meshes as file objects, like the chunked GCS reader."""
+
+    def stream(self, name):
+        stream = super().stream(name)
+        if stream is None:
+            return None
+        path, size, modified = stream
+        return open(path, 'rb'), size, modified
+
+
+def is_binary_stl(data):
+    """80-byte header, triangle count, 50 bytes per triangle."""
+    return len(data) > 84 and len(data) == 84 + 50 * struct.unpack('<I', data[80:84])[0]
+
+
+@pytest.fixture(params=['path', 'reader'])
+def store(request, monkeypatch, tmp_path):
+    store = LocalMeshStore(str(tmp_path)) if request.param == 'path' else ReaderStore(str(tmp_path))
+    uploader = MeshUploader(store, workers=1)
+    monkeypatch.setattr(main, '_mesh_store', store)
+    monkeypatch.setattr(main, '_mesh_uploader', uploader)
+    monkeypatch.setattr(main, '_mesh_manifest', MemoryMeshManifest())
+    yield store
+    uploader.shutdown()
+
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+
+def stored_mesh(store):
+    name = content_mesh_name('Avocado', 150, 130, 22)
+    store.put(name, DATA)
+    return name, name[len('Avocado_'):-len('.stl')]
+
+
+def test_stored_meshes_are_sent_whole_and_cacheable(store, client):
+    name, content_hash = stored_mesh(store)
+    response = client.get(f'/download-stl/{name}')
+    assert response.status_code == 200
+    assert response.data == DATA
+    assert response.headers['ETag'] == f'"{content_hash}"'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert {'public', 'immutable'} <= {d.strip() for d in response.headers['Cache-Control'].split(',')}
+    response.close()
+
+
+def test_ranges_return_partial_content(store, client):
+    name, _ = stored_mesh(store)
+    response = client.get(f'/download-stl/{name}', headers={'Range': 'bytes=11-29'})
+    assert response.status_code == 206
+    assert response.data == DATA[11:30]
+    assert response.headers['Content-Range'] == f'bytes 11-29/{len(DATA)}'
+    response.close()
+
+    response = client.get(f'/download-stl/{name}', headers={'Range': f'bytes={len(DATA) + 10}-'})
+    assert response.status_code == 416
+    response.close()
+
+
+def test_revalidation_is_answered_without_storage(store, client, monkeypatch):
+    name, content_hash = stored_mesh(store)
+
+    def no_storage(name):
+        raise AssertionError('storage read')
+
+    monkeypatch.setattr(store, 'stream', no_storage)
+    response = client.get(f'/download-stl/{name}', headers={'If-None-Match': f'"{content_hash}"'})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_missing_meshes_are_regenerated_from_the_manifest(store, client):
+    name = content_mesh_name('Avocado', 150, 130, 22)
+    main._mesh_manifest.upsert_many([(name, 300.0, 0.63)])
+    response = client.get(f'/download-stl/{name}')
+    assert response.status_code == 200
+    assert is_binary_stl(response.data)
+    # ...and written back to storage for the next download
+    main._mesh_uploader.shutdown()
+    assert store.read(name) == response.data
+
+
+def test_unknown_meshes_are_not_found(store, client):
+    response = client.get(f"/download-stl/{content_mesh_name('Avocado', 1, 2, 3)}")
+    assert response.status_code == 404
+
+
+def test_lazy_tokens_are_synthesized_and_verified(store, client, monkeypatch):
+    monkeypatch.setattr(mesh_tokens, 'MESH_TOKEN_SECRET', 'secret')
+    token = make_mesh_token('Avocado', 150, 130, 22)
+    response = client.get(f'/download-stl/{token}')
+    assert response.status_code == 200
+    assert is_binary_stl(response.data)
+    assert response.headers['ETag'] == f'"{token[-36:-4]}"'
+    assert store.read(token) is None  # nothing stored
+
+    tampered = token.replace('150.00', '151.00')
+    assert client.get(f'/download-stl/{tampered}').status_code == 404
@@ -0,0 +1,118 @@
+"""Streaming reads of FoodData Central JSON and CSV dumps."""
+
+import csv
+import json
+
+import pytest
+
+from usda_index import LocalFoodIndex, build_index, iter_csv_foods, iter_json_foods
+
+FOODS = [
+    {'fdcId': 1, 'description': 'Egg, whole, raw', 'foodNutrients': [{'nutrient': {'name': 'Protein'}, 'amount': 12.56}]},
+    {'fdcId': 22, 'description': 'Rice "white", cooked é', 'foodNutrients': []},
+    {'fdcId': 333, 'description': 'Oats', 'foodNutrients': [{'amount': 1234567.5}], 'servingSize': 40},
+]
+
+
+@pytest.mark.parametrize('document', [
+    FOODS,
+    {'SRLegacyFoods': FOODS},
+    {'BrandedFoods': FOODS[:1], 'version': '2024-04', 'meta': {'n': [1, 2]}, 'more': FOODS[1:]},
+    {'FoundationFoods': []},
+])
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+def test_iter_json_foods_streams_any_dump_shape(tmp_path, document, chunk_size):
+    path = tmp_path / 'dump.json'
+    path.write_text(json.dumps(document, indent=1), encoding='utf-8')
+    expected = document if isinstance(document, list) else [
+        food for value in document.values() if isinstance(value, list) for food in value
+    ]
+    assert list(iter_json_foods(str(path), chunk_size=chunk_size)) == expected
+
+
+def test_iter_json_foods_rejects_truncated_dumps(tmp_path):
+    path = tmp_path / 'dump.json'
+    path.write_text(json.dumps({'SRLegacyFoods': FOODS})[:-30], encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(iter_json_foods(str(path), chunk_size=16))
+
+
+def write_csv(directory, name, header, rows):
+    with open(directory / name, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def csv_dump(tmp_path):
+    dump = tmp_path / 'dump'
+    dump.mkdir()
+    write_csv(dump, 'food.csv', ['fdc_id', 'data_type', 'description', 'food_category_id'], [
+        ['11', 'sr_legacy_food', 'Egg, whole, raw', '1'],
+        ['12', 'branded_food', 'GRANOLA BAR', ''],
+        ['13', 'foundation_food', 'Water', '2'],
+    ])
+    write_csv(dump, 'food_category.csv', ['id', 'description'], [['1', 'Dairy and Egg Products'], ['2', 'Beverages']])
+    write_csv(dump, 'measure_unit.csv', ['id', 'name'], [['1000', 'cup'], ['1001', 'large']])
+    write_csv(dump, 'nutrient.csv', ['id', 'name', 'unit_name'], [
+        ['1003', 'Protein', 'G'], ['1004', 'Total lipid (fat)', 'G'], ['1008', 'Energy', 'KCAL'],
+    ])
+    write_csv(dump, 'food_nutrient.csv', ['id', 'fdc_id', 'nutrient_id', 'amount'], [
+        ['1', '12', '1003', '10.5'],
+        ['2', '11', '1004', '9.51'],
+        ['3', '11', '1008', '143'],      # not a kept nutrient
+        ['4', '11', '1003', '12.56'],
+        ['5', '11', '1003', 'n/a'],      # unparsable amount
+    ])
+    write_csv(dump, 'food_portion.csv',
+              ['id', 'fdc_id', 'amount', 'measure_unit_id', 'portion_description', 'modifier', 'gram_weight'], [
+                  ['1', '11', '1', '1001', '', 'large', '50'],
+                  ['2', '11', '', '1000', '1 cup', '', '243'],
+                  ['3', '11', '1', '1000', '', '', ''],   # no weight
+              ])
+    write_csv(dump, 'branded_food.csv', ['fdc_id', 'serving_size', 'serving_size_unit'], [
+        ['12', '35', 'g'], ['13', '', 'ml'],
+    ])
+    return dump
+
+
+def test_iter_csv_foods_joins_the_per_food_tables(csv_dump, tmp_path):
+    staging = tmp_path / 'staging'
+    staging.mkdir()
+    foods = list(iter_csv_foods(str(csv_dump), staging_dir=str(staging)))
+    assert foods == [
+        {
+            'fdcId': 11, 'description': 'Egg, whole, raw', 'dataType': 'SR Legacy',
+            'foodCategory': {'description': 'Dairy and Egg Products'},
+            'foodNutrients': [
+                {'nutrient': {'name': 'Total lipid (fat)', 'unitName': 'G'}, 'amount': 9.51},
+                {'nutrient': {'name': 'Protein', 'unitName': 'G'}, 'amount': 12.56},
+            ],
+            'foodPortions': [
+                {'amount': 1.0, 'gramWeight': 50.0, 'modifier': 'large', 'portionDescription': '',
+                 'measureUnit': {'name': 'large'}},
+                {'amount': None, 'gramWeight': 243.0, 'modifier': '', 'portionDescription': '1 cup',
+                 'measureUnit': {'name': 'cup'}},
+            ],
+        },
+        {
+            'fdcId': 12, 'description': 'GRANOLA BAR', 'dataType': 'Branded', 'foodCategory': {'description': ''},
+            'foodNutrients': [{'nutrient': {'name': 'Protein', 'unitName': 'G'}, 'amount': 10.5}],
+            'foodPortions': [], 'servingSize': 35.0, 'servingSizeUnit': 'g',
+        },
+        {
+            'fdcId': 13, 'description': 'Water', 'dataType': 'Foundation', 'foodCategory': {'description': 'Beverages'},
+            'foodNutrients': [], 'foodPortions': [],
+        },
+    ]
+    # The staging database is removed once the dump has been read
+    assert list(staging.iterdir()) == []
+
+
+def test_csv_dump_builds_a_searchable_index(csv_dump, tmp_path):
+    db_path = str(tmp_path / 'index.sqlite3')
+    assert build_index(str(csv_dump), db_path) == 3
+    index = LocalFoodIndex(db_path)
+    assert index.search('eggs')['foods'][0]['fdcId'] == 11
+    assert index.get_food(12)['servingSize'] == 35.0
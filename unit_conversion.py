@@ -0,0 +1,183 @@
+"""
+Unit Conversion Engine
+
+Table-driven conversion of "quantity unit" pairs to grams for a given food.
+
+1. UNIT_ALIASES maps every accepted spelling to a canonical unit in one hash
+   lookup (e.g. 'tablespoons' -> 'tbsp', 'md' -> 'medium').
+2. Fixed units ('g', 'oz', 'cup', ...) convert through GRAMS_PER_UNIT.
+3. Food-dependent units ('small', 'medium', 'large', 'piece') use the food's
+   own USDA `foodPortions` weights when available (see
+   extract_portion_weights), else the keyword defaults in PORTION_DEFAULTS.
+
+Resolved (unit, food) factors are memoized, and convert_many converts many
+quantities at once for batch endpoints.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app_logging import get_logger
+
+logger = get_logger('unit_conversion')
+
+UNIT_ALIASES = {
+    # Descriptive sizes
+    'small': 'small', 'sm': 'small',
+    'medium': 'medium', 'med': 'medium', 'md': 'medium',
+    'large': 'large', 'lg': 'large', 'big': 'large',
+    # Volume
+    'cup': 'cup', 'cups': 'cup',
+    'tbsp': 'tbsp', 'tablespoon': 'tbsp', 'tablespoons': 'tbsp',
+    'tsp': 'tsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'ml': 'ml', 'milliliter': 'ml', 'milliliters': 'ml',
+    # Weight
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz',
+    'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+    'g': 'g', 'gram': 'g', 'grams': 'g',
+    # Countable items
+    'piece': 'piece', 'pieces': 'piece', 'item': 'piece', 'items': 'piece',
+    'unit': 'piece', 'units': 'piece', 'egg': 'piece', 'eggs': 'piece',
+}
+
+# Units with a fixed gram weight regardless of food
+GRAMS_PER_UNIT = {
+    'cup': 240.0,
+    'tbsp': 15.0,
+    'tsp': 5.0,
+    'ml': 1.0,
+    'oz': 28.35,
+    'lb': 453.59,
+    'g': 1.0,
+}
+
+# Food-dependent units: (keyword in food description, grams) checked in order, then the default
+PORTION_DEFAULTS = {
+    'small': ((('egg', 50.0), ('apple', 149.0), ('banana', 101.0)), 100.0),
+    'medium': ((('egg', 60.0), ('apple', 182.0), ('banana', 118.0), ('orange', 131.0)), 150.0),
+    'large': ((('egg', 70.0), ('apple', 223.0), ('banana', 136.0)), 200.0),
+    'piece': ((('egg', 60.0), ('banana', 118.0), ('apple', 182.0), ('orange', 131.0)), 150.0),
+}
+
+# Words in a USDA portion description that identify a canonical unit
+_PORTION_WORDS = {
+    'small': 'small', 'medium': 'medium', 'large': 'large',
+    'cup': 'cup', 'tbsp': 'tbsp', 'tablespoon': 'tbsp', 'tsp': 'tsp', 'teaspoon': 'tsp',
+    'piece': 'piece', 'each': 'piece', 'whole': 'piece', 'fruit': 'piece', 'egg': 'piece',
+}
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def canonical_unit(unit: str) -> Optional[str]:
+    """Return the canonical unit for an alias, or None if unknown."""
+    return UNIT_ALIASES.get(unit.strip().lower())
+
+
+def extract_portion_weights(food_data: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Build the per-food portion-weight index from USDA `foodPortions`.
+
+    Each portion's measure unit, modifier and description are scanned for a
+    unit word ('medium', 'cup', 'tablespoon', ...). The first portion found
+    for a unit wins, matching USDA's own ordering.
+
+    Returns:
+        Dictionary canonical unit -> grams per one unit
+    """
+    weights: Dict[str, float] = {}
+    for portion in food_data.get('foodPortions') or ():
+        try:
+            gram_weight = float(portion.get('gramWeight') or 0)
+            amount = float(portion.get('amount') or 1)
+        except (TypeError, ValueError):
+            continue
+        if gram_weight <= 0 or amount <= 0:
+            continue
+        unit = portion.get('measureUnit') or {}
+        text = ' '.join((
+            unit.get('name', '') if isinstance(unit, dict) else str(unit),
+            portion.get('modifier') or '',
+            portion.get('portionDescription') or '',
+        )).lower()
+        for word in _WORD_RE.findall(text):
+            canonical = _PORTION_WORDS.get(word)
+            if canonical and canonical not in weights:
+                weights[canonical] = round(gram_weight / amount, 3)
+                break
+    return weights
+
+
+@lru_cache(maxsize=4096)
+def _resolve(unit: str, food_description: str, portions: Tuple[Tuple[str, float], ...]) -> Optional[float]:
+    canonical = UNIT_ALIASES.get(unit)
+    if canonical is None:
+        return None
+    for name, grams in portions:
+        if name == canonical:
+            return grams
+    if canonical in GRAMS_PER_UNIT:
+        return GRAMS_PER_UNIT[canonical]
+    keywords, default = PORTION_DEFAULTS[canonical]
+    for keyword, grams in keywords:
+        if keyword in food_description:
+            return grams
+    return default
+
+
+def grams_per_unit(unit: str, food_description: str = '',
+                   portions: Optional[Dict[str, float]] = None) -> Optional[float]:
+    """
+    Grams in one `unit` of the given food (memoized).
+
+    Args:
+        unit: Unit as typed by the user (any alias, any case)
+        food_description: USDA food description, used for size/count defaults
+        portions: Per-food portion weights from extract_portion_weights
+
+    Returns:
+        Grams per unit, or None if the unit is unknown
+    """
+    return _resolve(
+        unit.strip().lower(),
+        food_description.lower(),
+        tuple(sorted(portions.items())) if portions else (),
+    )
+
+
+def convert_quantity_to_grams(quantity: float, unit: str, food_description: str = '',
+                              portions: Optional[Dict[str, float]] = None) -> float:
+    """
+    Convert a quantity in any supported unit to grams.
+
+    Unknown units are treated as grams (with a warning).
+    """
+    factor = grams_per_unit(unit, food_description, portions)
+    if factor is None:
+        logger.warning("Unknown unit '%s' - treating quantity as grams", unit)
+        return quantity
+    return quantity * factor
+
+
+def convert_many(quantities: Sequence[float], units: Sequence[str],
+                 food_descriptions: Iterable[str],
+                 portions: Optional[Iterable[Optional[Dict[str, float]]]] = None) -> np.ndarray:
+    """
+    Vectorized conversion of many quantities to grams.
+
+    Factors are resolved once per distinct (unit, food) pair and applied with
+    a single array multiply. Unknown units get a factor of 1 (grams).
+
+    Returns:
+        NumPy array of grams, one per input quantity
+    """
+    descriptions = list(food_descriptions)
+    portions = list(portions) if portions is not None else [None] * len(descriptions)
+    factors = np.fromiter(
+        (grams_per_unit(u, d, p) or 1.0 for u, d, p in zip(units, descriptions, portions)),
+        dtype=np.float64,
+        count=len(descriptions),
+    )
+    return np.asarray(quantities, dtype=np.float64) * factors
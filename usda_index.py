@@ -0,0 +1,508 @@
+"""
+Local USDA FoodData Central Index
+
+Offline, full-text searchable index of FoodData Central foods built from the
+bulk downloads at https://fdc.nal.usda.gov/download-datasets.html
+
+The index is a single SQLite file with an FTS5 table over food descriptions
+and categories (porter-stemmed, so "eggs" matches "egg"), ranked with BM25.
+It also stores a compact food-detail document per FDC ID shaped like the
+`/food/{fdcId}` API response, so lookups need no network round trip.
+
+Supported inputs:
+1. JSON dumps (FoundationFoods, SRLegacyFoods, SurveyFoods, BrandedFoods)
+2. CSV dump directories (food.csv, nutrient.csv, food_nutrient.csv, ...)
+
+Usage:
+    python usda_index.py import FoodData_Central_sr_legacy_food_json_2021-10-28.json
+    python usda_index.py import FoodData_Central_foundation_food_csv_2024-04-18/
+    python usda_index.py search "chicken breast"
+
+Configuration (environment variables):
+    USDA_INDEX_PATH   index file (default: usda_index.sqlite3 next to this module)
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from app_logging import get_logger
+
+logger = get_logger('usda_index')
+
+USDA_INDEX_PATH = os.getenv(
+    'USDA_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'usda_index.sqlite3')
+)
+
+# Only the nutrients we use are kept in the local detail documents
+NUTRIENT_KEYWORDS = ('carbohydrate', 'protein', 'lipid', 'fat')
+
+# Generic (non-branded) data types rank ahead of branded products at equal relevance
+DATA_TYPE_PENALTY = {
+    'Foundation': 0.0,
+    'SR Legacy': 0.0,
+    'Survey (FNDDS)': 0.5,
+    'Branded': 2.0,
+}
+
+# data_type values used in the CSV dumps -> dataType strings used by the API
+CSV_DATA_TYPES = {
+    'foundation_food': 'Foundation',
+    'sr_legacy_food': 'SR Legacy',
+    'survey_fndds_food': 'Survey (FNDDS)',
+    'branded_food': 'Branded',
+    'experimental_food': 'Experimental',
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS foods (
+    fdc_id INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    data_type TEXT,
+    category TEXT,
+    penalty REAL NOT NULL DEFAULT 0,
+    detail TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+    description, category,
+    content='foods', content_rowid='fdc_id',
+    tokenize='porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _keep_nutrient(name: str) -> bool:
+    name = name.lower()
+    return any(k in name for k in NUTRIENT_KEYWORDS)
+
+
+def _compact_food(food: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a full FDC food document to the fields get_food_nutrition reads."""
+    category = food.get('foodCategory') or food.get('wweiaFoodCategory') or {}
+    if isinstance(category, dict):
+        category_name = category.get('description') or category.get('wweiaFoodCategoryDescription') or ''
+    else:
+        category_name = str(category)
+    nutrients = []
+    for n in food.get('foodNutrients', []):
+        info = n.get('nutrient', {})
+        name = info.get('name', '')
+        if not _keep_nutrient(name):
+            continue
+        amount = n.get('amount')
+        if amount is None:
+            amount = n.get('value', 0)
+        nutrients.append({'nutrient': {'name': name, 'unitName': info.get('unitName', '')}, 'amount': amount})
+    portions = []
+    for p in food.get('foodPortions', []):
+        unit = p.get('measureUnit', {})
+        portions.append({
+            'amount': p.get('amount'),
+            'gramWeight': p.get('gramWeight'),
+            'modifier': p.get('modifier', ''),
+            'portionDescription': p.get('portionDescription', ''),
+            'measureUnit': {'name': unit.get('name', '') if isinstance(unit, dict) else str(unit)},
+        })
+    doc = {
+        'fdcId': int(food['fdcId']),
+        'description': food.get('description', ''),
+        'dataType': food.get('dataType', ''),
+        'foodCategory': {'description': category_name},
+        'foodNutrients': nutrients,
+    }
+    if portions:
+        doc['foodPortions'] = portions
+    if food.get('servingSize') is not None:
+        doc['servingSize'] = food.get('servingSize')
+        doc['servingSizeUnit'] = food.get('servingSizeUnit', '')
+    return doc
+
+
+class _JSONStream:
+    """Incremental reader of JSON values from a text file, one value at a time."""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+
+    def _fill(self) -> bool:
+        data = self.f.read(self.chunk_size)
+        if not data:
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of file), without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON dump, found {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value, reading more of the file as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+                # A value ending exactly at the buffer end may be a cut-off number
+                if end < len(self.buf) or not self._fill():
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+
+    def array_items(self) -> Iterator[Any]:
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect(']')
+                return
+
+
+def iter_json_foods(path: str, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """
+    Yield food documents from an FDC JSON dump (any data type).
+
+    Dumps are a top-level array of foods or an object whose array values hold
+    them ({"BrandedFoods": [...]}). Foods are decoded one at a time while the
+    file is read in `chunk_size` pieces, so memory stays at about one food
+    plus one chunk even for the multi-GB Branded Foods dump.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JSONStream(f, chunk_size)
+        if stream.peek() == '[':
+            yield from stream.array_items()
+            return
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            stream.value()  # key
+            stream.expect(':')
+            if stream.peek() == '[':
+                yield from stream.array_items()
+            else:
+                stream.value()
+            if stream.peek() == ',':
+                stream.pos += 1
+            else:
+                stream.expect('}')
+                return
+
+
+_STAGING_SCHEMA = """
+CREATE TABLE food_nutrient (fdc_id TEXT, name TEXT, unit_name TEXT, amount REAL);
+CREATE TABLE food_portion (fdc_id TEXT, amount REAL, gram_weight REAL, modifier TEXT,
+                           portion_description TEXT, unit_name TEXT);
+CREATE TABLE branded_food (fdc_id TEXT, serving_size TEXT, serving_size_unit TEXT);
+"""
+
+
+def iter_csv_foods(directory: str, staging_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield food documents assembled from an FDC CSV dump directory.
+
+    The per-food tables (food_nutrient.csv, food_portion.csv, branded_food.csv)
+    are copied into a temporary SQLite file indexed by fdc_id and joined one
+    food at a time, so memory stays bounded even for the Branded dump, whose
+    food_nutrient.csv alone is several GB. Only the small lookup tables
+    (categories, units, nutrients) are held in memory.
+
+    Args:
+        directory: CSV dump directory
+        staging_dir: Where to put the temporary staging database (default: system temp dir)
+    """
+    def rows(name):
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            yield from csv.DictReader(f)
+
+    categories = {r['id']: r['description'] for r in rows('food_category.csv')}
+    units = {r['id']: r['name'] for r in rows('measure_unit.csv')}
+    nutrients = {
+        r['id']: (r['name'], r.get('unit_name', ''))
+        for r in rows('nutrient.csv') if _keep_nutrient(r['name'])
+    }
+
+    def nutrient_rows():
+        for r in rows('food_nutrient.csv'):
+            info = nutrients.get(r['nutrient_id'])
+            if info is None:
+                continue
+            try:
+                amount = float(r['amount'])
+            except (TypeError, ValueError):
+                continue
+            yield r['fdc_id'], info[0], info[1], amount
+
+    def portion_rows():
+        for r in rows('food_portion.csv'):
+            try:
+                gram_weight = float(r['gram_weight'])
+            except (TypeError, ValueError):
+                continue
+            yield (r['fdc_id'], float(r['amount']) if r.get('amount') else None, gram_weight,
+                   r.get('modifier', ''), r.get('portion_description', ''),
+                   units.get(r.get('measure_unit_id'), ''))
+
+    with tempfile.TemporaryDirectory(prefix='usda-import-', dir=staging_dir) as tmp:
+        staging = sqlite3.connect(os.path.join(tmp, 'staging.sqlite3'))
+        try:
+            staging.execute("PRAGMA journal_mode = OFF")
+            staging.execute("PRAGMA synchronous = OFF")
+            staging.executescript(_STAGING_SCHEMA)
+            # executemany consumes the generators row by row
+            staging.executemany("INSERT INTO food_nutrient VALUES (?, ?, ?, ?)", nutrient_rows())
+            staging.executemany("INSERT INTO food_portion VALUES (?, ?, ?, ?, ?, ?)", portion_rows())
+            staging.executemany(
+                "INSERT INTO branded_food VALUES (?, ?, ?)",
+                ((r['fdc_id'], r.get('serving_size'), r.get('serving_size_unit'))
+                 for r in rows('branded_food.csv'))
+            )
+            staging.executescript(
+                "CREATE INDEX food_nutrient_fdc_id ON food_nutrient (fdc_id);"
+                "CREATE INDEX food_portion_fdc_id ON food_portion (fdc_id);"
+                "CREATE INDEX branded_food_fdc_id ON branded_food (fdc_id);"
+            )
+            staging.commit()
+
+            for r in rows('food.csv'):
+                fdc_id = r['fdc_id']
+                food = {
+                    'fdcId': int(fdc_id),
+                    'description': r.get('description', ''),
+                    'dataType': CSV_DATA_TYPES.get(r.get('data_type', ''), r.get('data_type', '')),
+                    'foodCategory': {'description': categories.get(r.get('food_category_id'), '')},
+                    'foodNutrients': [
+                        {'nutrient': {'name': name, 'unitName': unit_name}, 'amount': amount}
+                        for name, unit_name, amount in staging.execute(
+                            "SELECT name, unit_name, amount FROM food_nutrient WHERE fdc_id = ? ORDER BY rowid",
+                            (fdc_id,))
+                    ],
+                    'foodPortions': [
+                        {'amount': amount, 'gramWeight': gram_weight, 'modifier': modifier,
+                         'portionDescription': description, 'measureUnit': {'name': unit_name}}
+                        for amount, gram_weight, modifier, description, unit_name in staging.execute(
+                            "SELECT amount, gram_weight, modifier, portion_description, unit_name "
+                            "FROM food_portion WHERE fdc_id = ? ORDER BY rowid", (fdc_id,))
+                    ],
+                }
+                serving = staging.execute(
+                    "SELECT serving_size, serving_size_unit FROM branded_food WHERE fdc_id = ? "
+                    "ORDER BY rowid DESC LIMIT 1", (fdc_id,)
+                ).fetchone()
+                if serving and serving[0]:
+                    try:
+                        food['servingSize'] = float(serving[0])
+                        food['servingSizeUnit'] = serving[1] or ''
+                    except ValueError:
+                        pass
+                yield food
+        finally:
+            staging.close()
+
+
+def build_index(source: str, db_path: str = USDA_INDEX_PATH, batch_size: int = 5000) -> int:
+    """
+    Import an FDC bulk dump into the local index (upserting existing FDC IDs).
+
+    Args:
+        source: Path to an FDC JSON file or CSV dump directory
+        db_path: Index file to create or update
+        batch_size: Rows per insert transaction
+
+    Returns:
+        Number of foods imported
+    """
+    foods = iter_csv_foods(source) if os.path.isdir(source) else iter_json_foods(source)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    count = 0
+    batch = []
+
+    def flush():
+        ids = [(row[0],) for row in batch]
+        # Keep the external-content FTS table in sync: remove old rows before replacing them
+        conn.executemany(
+            "INSERT INTO foods_fts (foods_fts, rowid, description, category) "
+            "SELECT 'delete', fdc_id, description, category FROM foods WHERE fdc_id = ?", ids
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO foods (fdc_id, description, data_type, category, penalty, detail) "
+            "VALUES (?, ?, ?, ?, ?, ?)", batch
+        )
+        conn.executemany(
+            "INSERT INTO foods_fts (rowid, description, category) VALUES (?, ?, ?)",
+            [(row[0], row[1], row[3]) for row in batch]
+        )
+        conn.commit()
+        batch.clear()
+
+    for food in foods:
+        if not food.get('fdcId') or not food.get('description'):
+            continue
+        doc = _compact_food(food)
+        category = doc['foodCategory']['description']
+        batch.append((
+            doc['fdcId'], doc['description'], doc['dataType'], category,
+            DATA_TYPE_PENALTY.get(doc['dataType'], 1.0),
+            json.dumps(doc, separators=(',', ':')),
+        ))
+        count += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    conn.execute("INSERT INTO foods_fts (foods_fts) VALUES ('optimize')")
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('imported_at', ?)", (str(time.time()),))
+    conn.commit()
+    conn.close()
+    return count
+
+
+def _fts_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: all tokens required, last one as a prefix."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return None
+    terms = [f'"{t}"' for t in tokens[:-1]]
+    terms.append(f'"{tokens[-1]}"*')
+    return ' AND '.join(terms)
+
+
+class LocalFoodIndex:
+    """Read-only view of the local index with one SQLite connection per thread."""
+
+    def __init__(self, db_path: str = USDA_INDEX_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def search(self, query: str, page_size: int = 10) -> Optional[Dict[str, Any]]:
+        """
+        Ranked full-text search, returned in the shape of the `foods/search` API.
+
+        Returns:
+            Search response dict, or None when nothing matches
+        """
+        fts = _fts_query(query)
+        if fts is None:
+            return None
+        rows = self._conn().execute(
+            "SELECT f.fdc_id, f.description, f.data_type, f.category "
+            "FROM foods_fts JOIN foods f ON f.fdc_id = foods_fts.rowid "
+            "WHERE foods_fts MATCH ? "
+            "ORDER BY bm25(foods_fts, 10.0, 1.0) + f.penalty, length(f.description) "
+            "LIMIT ?",
+            (fts, page_size)
+        ).fetchall()
+        if not rows:
+            return None
+        return {
+            'totalHits': len(rows),
+            'source': 'local',
+            'foods': [
+                {'fdcId': r[0], 'description': r[1], 'dataType': r[2], 'foodCategory': r[3]}
+                for r in rows
+            ],
+        }
+
+    def get_food(self, fdc_id: Any) -> Optional[Dict[str, Any]]:
+        """Return the stored detail document for an FDC ID, or None."""
+        try:
+            key = int(fdc_id)
+        except (TypeError, ValueError):
+            return None
+        row = self._conn().execute("SELECT detail FROM foods WHERE fdc_id = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+_index = None
+_index_checked = False
+
+
+def get_local_index() -> Optional[LocalFoodIndex]:
+    """
+    Return the shared local index, or None if no index file has been built.
+    """
+    global _index, _index_checked
+    if not _index_checked:
+        _index_checked = True
+        if os.path.exists(USDA_INDEX_PATH):
+            try:
+                _index = LocalFoodIndex(USDA_INDEX_PATH)
+                _index._conn().execute("SELECT 1 FROM foods LIMIT 1")
+            except Exception as e:
+                logger.warning("Local USDA index at %s is unusable: %s", USDA_INDEX_PATH, e)
+                _index = None
+    return _index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the local USDA FoodData Central index")
+    parser.add_argument('--db', default=USDA_INDEX_PATH, help="index file path")
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help="import an FDC JSON file or CSV directory")
+    imp.add_argument('sources', nargs='+')
+    srch = sub.add_parser('search', help="run a search against the index")
+    srch.add_argument('query')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        for source in args.sources:
+            start = time.perf_counter()
+            n = build_index(source, args.db)
+            print(f"Imported {n} foods from {source} in {time.perf_counter() - start:.1f}s")
+    else:
+        index = LocalFoodIndex(args.db)
+        start = time.perf_counter()
+        result = index.search(args.query)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for food in (result or {}).get('foods', []):
+            print(f"{food['fdcId']:>8}  {food['dataType']:<16} {food['description']}")
+        print(f"({elapsed_ms:.3f} ms)")